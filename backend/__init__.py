@@ -0,0 +1,5 @@
+import time
+
+# First import of the package in this process: the reference for the
+# startup timings reported by backend.main
+STARTED = time.perf_counter()
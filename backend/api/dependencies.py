@@ -0,0 +1,49 @@
+from fastapi import Depends, Request
+
+from backend.services.catalog import DocumentCatalog
+from backend.services.container import ServiceContainer
+from backend.services.document_service import DocumentService
+from backend.services.health_monitor import HealthMonitor
+from backend.services.ingest_jobs import IngestJobQueue
+from backend.services.model_residency import ModelResidency
+from backend.services.ollama_client import OllamaClient
+from backend.services.rag_service import RAGService
+from backend.services.vector_store import VectorStore
+
+
+def get_services(request: Request) -> ServiceContainer:
+    return request.app.state.services
+
+
+def get_ollama(services: ServiceContainer = Depends(get_services)) -> OllamaClient:
+    return services.ollama
+
+
+def get_vector_store(services: ServiceContainer = Depends(get_services)) -> VectorStore:
+    return services.vector_store
+
+
+def get_catalog(services: ServiceContainer = Depends(get_services)) -> DocumentCatalog:
+    return services.catalog
+
+
+def get_document_service(
+    services: ServiceContainer = Depends(get_services),
+) -> DocumentService:
+    return services.document_service
+
+
+def get_rag_service(services: ServiceContainer = Depends(get_services)) -> RAGService:
+    return services.rag_service
+
+
+def get_ingest_jobs(services: ServiceContainer = Depends(get_services)) -> IngestJobQueue:
+    return services.ingest_jobs
+
+
+def get_health_monitor(services: ServiceContainer = Depends(get_services)) -> HealthMonitor:
+    return services.health_monitor
+
+
+def get_residency(services: ServiceContainer = Depends(get_services)) -> ModelResidency:
+    return services.residency
@@ -1,46 +1,82 @@
-import json
-
-from fastapi import APIRouter
+import httpx
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
+from backend.api.dependencies import get_rag_service
+from backend.api.sse import sse_stream
 from backend.models.schemas import ChatRequest, ChatResponse
 from backend.services.rag_service import RAGService
+from backend.services.scheduler import QueueFullError
+from backend.services.vector_store import RetrievalFilter
+from config.settings import get_settings
 
 router = APIRouter()
 
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, rag: RAGService = Depends(get_rag_service)):
     """Chat endpoint with SSE streaming."""
-    rag = RAGService()
-
-    async def event_stream():
-        try:
-            async for chunk in rag.query_stream(request.message, model=request.model, think=request.think):
-                data = json.dumps(chunk, ensure_ascii=False)
-                yield f"data: {data}\n\n"
-            yield f"data: {json.dumps({'done': True})}\n\n"
-        except Exception as e:
-            error_data = json.dumps({"error": str(e)}, ensure_ascii=False)
-            yield f"data: {error_data}\n\n"
+    try:
+        stream = await rag.query_stream(
+            request.message, model=request.model, think=request.think,
+            session_id=request.session_id, filters=_filters(request),
+        )
+    except QueueFullError as e:
+        raise _busy(e)
+    except httpx.HTTPError as e:
+        # Embedding and retrieval run before the stream starts
+        raise _unavailable(e)
 
     return StreamingResponse(
-        event_stream(),
+        sse_stream(stream),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
         },
+        # Runs after the response ends, including on client disconnect:
+        # stops the Ollama generation (unless others share it) and frees
+        # the slot right away
+        background=BackgroundTask(stream.aclose),
     )
 
 
 @router.post("/chat/sync", response_model=ChatResponse)
-async def chat_sync(request: ChatRequest):
+async def chat_sync(request: ChatRequest, rag: RAGService = Depends(get_rag_service)):
     """Non-streaming chat endpoint for testing."""
-    rag = RAGService()
-    result = await rag.query(request.message, model=request.model)
+    try:
+        result = await rag.query(
+            request.message, model=request.model, session_id=request.session_id, filters=_filters(request),
+        )
+    except QueueFullError as e:
+        raise _busy(e)
+    except httpx.HTTPError as e:
+        raise _unavailable(e)
     return ChatResponse(
         response=result["response"],
         sources=result["sources"],
     )
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def end_session(session_id: str, rag: RAGService = Depends(get_rag_service)):
+    """Forget a conversation (new chat in the UI)."""
+    return {"deleted": rag.sessions.drop(session_id)}
+
+
+def _filters(request: ChatRequest) -> RetrievalFilter | None:
+    return RetrievalFilter.create(request.sources, request.formats, request.tags)
+
+
+def _busy(error: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(get_settings().generation_retry_after)},
+    )
+
+
+def _unavailable(error: httpx.HTTPError) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"No se pudo contactar con Ollama: {error}")
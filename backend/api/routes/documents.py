@@ -1,41 +1,48 @@
-import shutil
+import asyncio
+import os
 from pathlib import Path
+from uuid import uuid4
 
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
-from backend.models.schemas import DocumentInfo
-from backend.services.document_service import DocumentService, SUPPORTED_EXTENSIONS
-from backend.services.vector_store import VectorStore
+from backend.api.dependencies import get_catalog, get_ingest_jobs
+from backend.models.schemas import DocumentInfo, IngestJobStatus
+from backend.services.catalog import DocumentCatalog
+from backend.services.document_service import SUPPORTED_EXTENSIONS
+from backend.services.ingest_jobs import IngestJob, IngestJobQueue
 from config.settings import get_settings
 
 router = APIRouter()
 
 
 @router.get("/documents", response_model=list[DocumentInfo])
-async def list_documents():
+async def list_documents(catalog: DocumentCatalog = Depends(get_catalog)):
     """List all ingested documents."""
-    vector_store = VectorStore()
-    doc_service = DocumentService()
-    settings = get_settings()
-
-    documents = []
-    for name in vector_store.get_document_names():
-        # Count chunks for this document
-        all_data = vector_store._collection.get(
-            where={"source": name},
-            include=["metadatas"],
+    return [
+        DocumentInfo(
+            filename=doc["source"],
+            format=doc["format"],
+            chunks=doc["chunks"],
+            pages=doc["pages"],
+            ingested_at=doc["ingested_at"],
+            tags=doc["tags"],
         )
-        documents.append(DocumentInfo(
-            filename=name,
-            format=Path(name).suffix.lower(),
-            chunks=len(all_data["metadatas"]),
-        ))
-    return documents
+        for doc in catalog.documents()
+    ]
 
 
 @router.post("/documents/upload")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and ingest a document."""
+async def upload_document(
+    file: UploadFile = File(...),
+    tags: str | None = Form(None),
+    jobs: IngestJobQueue = Depends(get_ingest_jobs),
+):
+    """Upload a document and queue it for ingestion.
+
+    ``tags`` (comma-separated) replace the document's tags; without it a
+    re-uploaded document keeps its current ones. Returns immediately
+    with a job ID; poll /documents/jobs/{job_id}.
+    """
     ext = Path(file.filename).suffix.lower()
     if ext not in SUPPORTED_EXTENSIONS:
         return {
@@ -43,18 +50,64 @@ async def upload_document(file: UploadFile = File(...)):
         }
 
     settings = get_settings()
-    dest = Path(settings.documents_dir) / file.filename
-
-    # Save file
-    with open(dest, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    dest = Path(settings.documents_dir) / Path(file.filename).name
 
-    # Ingest
-    doc_service = DocumentService()
-    num_chunks = await doc_service.ingest_file(dest)
+    await _save_upload(file, dest, settings.upload_chunk_size)
+    job = jobs.submit(dest, tags=tags.split(",") if tags is not None else None)
 
     return {
-        "filename": file.filename,
-        "chunks": num_chunks,
-        "message": f"Documento procesado: {num_chunks} chunks creados",
+        "job_id": job.id,
+        "filename": job.filename,
+        "stage": job.stage,
+        "message": f"Documento recibido, procesando en segundo plano: {job.filename}",
     }
+
+
+@router.get("/documents/jobs", response_model=list[IngestJobStatus])
+async def list_ingest_jobs(jobs: IngestJobQueue = Depends(get_ingest_jobs)):
+    """Recent upload ingestion jobs, newest first."""
+    return [_job_status(job) for job in jobs.recent()]
+
+
+@router.get("/documents/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(job_id: str, jobs: IngestJobQueue = Depends(get_ingest_jobs)):
+    """Progress of an upload ingestion job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return _job_status(job)
+
+
+async def _save_upload(file: UploadFile, dest: Path, chunk_size: int) -> None:
+    """Stream the upload to disk without blocking the event loop.
+
+    Written to a hidden temporary name first so a half-written file is
+    never picked up by a directory ingest. The name is unique, so two
+    uploads of the same file never write to the same temporary; the
+    rename is atomic and the last one wins.
+    """
+    tmp = dest.with_name(f".{dest.name}.{uuid4().hex}.part")
+    f = await asyncio.to_thread(open, tmp, "wb")
+    try:
+        try:
+            while chunk := await file.read(chunk_size):
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, tmp, dest)
+    except BaseException:
+        await asyncio.to_thread(tmp.unlink, missing_ok=True)
+        raise
+
+
+def _job_status(job: IngestJob) -> IngestJobStatus:
+    return IngestJobStatus(
+        id=job.id,
+        filename=job.filename,
+        stage=job.stage,
+        chunks_done=job.chunks_done,
+        chunks_total=job.chunks_total,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
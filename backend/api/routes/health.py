@@ -1,18 +1,67 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Response
 
-from backend.models.schemas import HealthStatus
+from backend.api.dependencies import (
+    get_catalog,
+    get_health_monitor,
+    get_ollama,
+    get_rag_service,
+    get_vector_store,
+)
+from backend.models.schemas import HealthStatus, ReadinessStatus
+from backend.services.catalog import DocumentCatalog
+from backend.services.health_monitor import HealthMonitor
 from backend.services.ollama_client import OllamaClient
+from backend.services.rag_service import RAGService
 from backend.services.vector_store import VectorStore
 from config.settings import get_settings
 
 router = APIRouter()
 
 
+@router.get("/health/live")
+async def liveness():
+    """The process is up and the event loop is responsive. No I/O."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", response_model=ReadinessStatus)
+async def readiness(response: Response, monitor: HealthMonitor = Depends(get_health_monitor)):
+    """Last background probe of Ollama and the vector store. 503 if not ready."""
+    snapshot = monitor.snapshot
+    ready = monitor.is_ready()
+    if not ready:
+        response.status_code = 503
+
+    age = snapshot.age()
+    if snapshot.checked_at is None:
+        status = "starting"
+    elif age > monitor.stale_after:
+        status = "stale"
+    else:
+        status = "ok" if ready else "degraded"
+
+    return ReadinessStatus(
+        status=status,
+        ollama=snapshot.ollama,
+        models_loaded=snapshot.models_loaded,
+        vector_store=snapshot.vector_store,
+        documents_count=snapshot.documents_count,
+        chunks_count=snapshot.chunks_count,
+        checked_at=snapshot.checked_at,
+        age_seconds=round(age, 3) if age is not None else None,
+        error=snapshot.error,
+    )
+
+
 @router.get("/health", response_model=HealthStatus)
-async def health_check():
+async def health_check(
+    ollama: OllamaClient = Depends(get_ollama),
+    vector_store: VectorStore = Depends(get_vector_store),
+    rag: RAGService = Depends(get_rag_service),
+    catalog: DocumentCatalog = Depends(get_catalog),
+):
+    """Detailed status, checked on demand."""
     settings = get_settings()
-    ollama = OllamaClient()
-    vector_store = VectorStore()
 
     ollama_ok = await ollama.health_check()
 
@@ -21,6 +70,8 @@ async def health_check():
         ollama=ollama_ok,
         ollama_model=settings.llm_model,
         embedding_model=settings.embedding_model,
-        documents_count=len(vector_store.get_document_names()),
+        documents_count=catalog.count(),
         chunks_count=vector_store.chunks_count,
+        embedding_cache=ollama.embedding_cache.stats() if ollama.embedding_cache else None,
+        answer_cache=rag.answer_cache.stats() if rag.answer_cache else None,
     )
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from backend.api.dependencies import get_ollama, get_rag_service, get_residency
+from backend.services.metrics import (
+    CACHE_EVENTS, GENERATION_SLOTS, MODEL_RESIDENT, OLLAMA_HOSTS, REGISTRY, SESSIONS_ACTIVE,
+)
+from backend.services.model_residency import ModelResidency
+from backend.services.ollama_client import OllamaClient
+from backend.services.rag_service import RAGService
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(
+    ollama: OllamaClient = Depends(get_ollama),
+    rag: RAGService = Depends(get_rag_service),
+    residency: ModelResidency = Depends(get_residency),
+):
+    """Prometheus text exposition of the in-process metrics."""
+    if ollama.embedding_cache is not None:
+        stats = ollama.embedding_cache.stats()
+        for result in ("memory_hits", "disk_hits", "misses"):
+            CACHE_EVENTS.set(stats[result], cache="embedding", result=result)
+    if rag.answer_cache is not None:
+        stats = rag.answer_cache.stats()
+        for result in ("hits", "misses"):
+            CACHE_EVENTS.set(stats[result], cache="answer", result=result)
+    for model, slots in rag.scheduler.stats().items():
+        GENERATION_SLOTS.set(slots["in_flight"], model=model, state="in_flight")
+        GENERATION_SLOTS.set(slots["queued"], model=model, state="queued")
+    SESSIONS_ACTIVE.set(len(rag.sessions))
+    for pool in (ollama.generate_pool, ollama.embed_pool):
+        for host in pool.stats():
+            OLLAMA_HOSTS.set(int(host["healthy"]), pool=pool.name, host=host["url"], state="healthy")
+            OLLAMA_HOSTS.set(host["outstanding"], pool=pool.name, host=host["url"], state="outstanding")
+    for model, hosts in residency.resident().items():
+        MODEL_RESIDENT.set(hosts, model=model)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
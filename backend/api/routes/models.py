@@ -1,7 +1,9 @@
-import httpx
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
+from backend.api.dependencies import get_ollama, get_residency
+from backend.services.model_residency import ModelResidency
 from backend.services.ollama_client import OllamaClient
+from backend.services.ollama_pool import model_name
 from config.settings import get_settings
 
 router = APIRouter()
@@ -10,14 +12,21 @@ EMBEDDING_MODELS = {"bge-m3", "nomic-embed-text", "all-minilm", "mxbai-embed-lar
 
 
 @router.get("/models")
-async def list_models():
-    """List available LLM models from Ollama (excluding embedding models)."""
+async def list_models(
+    ollama: OllamaClient = Depends(get_ollama),
+    residency: ModelResidency = Depends(get_residency),
+):
+    """List available LLM models from Ollama (excluding embedding models).
+
+    ``loaded`` tells whether a host had the model in memory at the last poll.
+    """
     settings = get_settings()
-    ollama = OllamaClient()
     all_models = await ollama.list_models()
+    resident = residency.resident()
 
     llm_models = [
-        m for m in all_models
+        {**m, "loaded": resident.get(model_name(m["name"]), 0) > 0}
+        for m in all_models
         if not any(m["name"].startswith(emb) for emb in EMBEDDING_MODELS)
     ]
 
@@ -28,24 +37,25 @@ async def list_models():
 
 
 @router.post("/models/warmup")
-async def warmup_model(request: dict):
-    """Pre-load a model into Ollama memory."""
+async def warmup_model(
+    request: dict,
+    residency: ModelResidency = Depends(get_residency),
+):
+    """Pre-load a model into Ollama memory, with the context window chat uses.
+
+    Returns at once if a host already has it loaded.
+    """
     model = request.get("model")
     if not model:
         return {"ok": False}
-    ollama = OllamaClient()
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{ollama.base_url}/api/chat",
-                json={
-                    "model": model,
-                    "messages": [],
-                    "keep_alive": "30m",
-                },
-                timeout=60.0,
-            )
-            resp.raise_for_status()
+        await residency.warm(model)
         return {"ok": True}
     except Exception:
         return {"ok": False}
+
+
+@router.get("/models/residency")
+async def model_residency(residency: ModelResidency = Depends(get_residency)):
+    """Pin policy, models loaded per host and recent load/unload events."""
+    return residency.stats()
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+
+from config.settings import get_settings
+
+# orjson is optional (pip install orjson): several times faster than json
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+TOKEN_TYPES = ("thinking", "response")
+
+
+def frame(obj) -> bytes:
+    return b"data: " + dumps(obj) + b"\n\n"
+
+
+async def sse_stream(
+    chunks: AsyncIterator[dict], window: float | None = None, max_chars: int | None = None,
+) -> AsyncIterator[bytes]:
+    """SSE frames for a chat stream, with consecutive tokens coalesced.
+
+    Tokens of the same type are merged into one frame (``count`` holds
+    how many) that is sent ``window`` seconds after its first token, or
+    once it reaches ``max_chars``. The first token of the answer goes out
+    alone so time to first token is unchanged; any other chunk flushes
+    the pending tokens and is sent as is. ``window=0`` sends every token
+    in its own frame. Ends with ``{"done": true}`` or ``{"error": ...}``.
+    """
+    settings = get_settings()
+    window = settings.sse_coalesce_window if window is None else window
+    max_chars = max_chars or settings.sse_coalesce_max_chars
+
+    kind = None
+    parts: list[str] = []
+    size = 0
+    deadline = 0.0
+    first = True
+    pending: asyncio.Task | None = None
+
+    def flush() -> bytes:
+        nonlocal kind, size
+        data = {"token": "".join(parts), "type": kind}
+        if len(parts) > 1:
+            data["count"] = len(parts)
+        parts.clear()
+        kind, size = None, 0
+        return frame(data)
+
+    iterator = aiter(chunks)
+    try:
+        while True:
+            if pending is None and not parts:
+                try:
+                    chunk = await anext(iterator)
+                except StopAsyncIteration:
+                    break
+            else:
+                # Tokens are waiting: wait for the next chunk only until
+                # their window closes, without cancelling the read
+                if pending is None:
+                    pending = asyncio.ensure_future(anext(iterator))
+                timeout = deadline - time.monotonic() if parts else None
+                if timeout is None or timeout > 0:
+                    await asyncio.wait((pending,), timeout=timeout)
+                if not pending.done():
+                    yield flush()
+                    continue
+                try:
+                    chunk = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+
+            if chunk.get("type") in TOKEN_TYPES and window > 0 and not first:
+                if parts and chunk["type"] != kind:
+                    yield flush()
+                if not parts:
+                    kind = chunk["type"]
+                    deadline = time.monotonic() + window
+                parts.append(chunk["token"])
+                size += len(chunk["token"])
+                if size >= max_chars:
+                    yield flush()
+                continue
+
+            if chunk.get("type") in TOKEN_TYPES:
+                first = False
+            yield (flush() if parts else b"") + frame(chunk)
+
+        yield (flush() if parts else b"") + frame({"done": True})
+    except Exception as e:
+        yield (flush() if parts else b"") + frame({"error": str(e)})
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
@@ -1,16 +1,52 @@
+import logging
 import sys
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Ensure project root is in path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Before anything heavy, so the startup timings cover every import
+from backend import STARTED
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from backend.api.routes import chat, documents, health, models
+from backend.api.routes import chat, documents, health, metrics, models
+from backend.services.container import ServiceContainer
+from backend.services.metrics import STARTUP_SECONDS
 from config.settings import get_settings
 
+IMPORT_SECONDS = time.perf_counter() - STARTED
+logger = logging.getLogger("uvicorn.error")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services (vector store, Ollama pool, splitter) live as long as the app
+    started = time.perf_counter()
+    services = ServiceContainer()
+    await services.startup()
+    services_seconds = time.perf_counter() - started
+    warmup = await services.warmup() if get_settings().startup_warmup else {}
+    warmup_seconds = time.perf_counter() - started - services_seconds
+    app.state.services = services
+
+    ready = time.perf_counter() - STARTED
+    STARTUP_SECONDS.set(IMPORT_SECONDS, phase="import")
+    STARTUP_SECONDS.set(services_seconds, phase="services")
+    STARTUP_SECONDS.set(warmup_seconds, phase="warmup")
+    STARTUP_SECONDS.set(ready, phase="ready")
+    logger.info(
+        "Listo en %.2f s (imports %.2f s, servicios %.2f s%s)",
+        ready, IMPORT_SECONDS, services_seconds,
+        "".join(f", {step} {seconds:.2f} s" for step, seconds in warmup.items()),
+    )
+    yield
+    await services.aclose()
+
 
 def create_app() -> FastAPI:
     settings = get_settings()
@@ -19,6 +55,7 @@ def create_app() -> FastAPI:
         title="RÖS'S IA Assistant",
         description="Asistente virtual de RÖS'S con RAG sobre documentos de la empresa",
         version="1.0.0",
+        lifespan=lifespan,
     )
 
     app.add_middleware(
@@ -33,6 +70,8 @@ def create_app() -> FastAPI:
     app.include_router(chat.router, prefix="/api", tags=["chat"])
     app.include_router(documents.router, prefix="/api", tags=["documents"])
     app.include_router(models.router, prefix="/api", tags=["models"])
+    # Prometheus scrapes /metrics by default, so it lives outside /api
+    app.include_router(metrics.router, tags=["metrics"])
 
     # Serve frontend static files
     frontend_dir = Path(__file__).parent.parent / "frontend"
@@ -46,12 +85,26 @@ app = create_app()
 
 
 if __name__ == "__main__":
+    import argparse
+
     import uvicorn
 
     settings = get_settings()
+    parser = argparse.ArgumentParser(description="Servidor del asistente RÖS'S IA")
+    parser.add_argument(
+        "--workers", type=int, default=settings.workers,
+        help=f"Procesos que atienden peticiones (por defecto {settings.workers}, ROSS_WORKERS)",
+    )
+    parser.add_argument(
+        "--reload", action="store_true",
+        help="Reinicia al cambiar el código (desarrollo; un solo proceso)",
+    )
+    args = parser.parse_args()
+
     uvicorn.run(
         "backend.main:app",
         host=settings.host,
         port=settings.port,
-        reload=True,
+        workers=None if args.reload else args.workers,
+        reload=args.reload,
     )
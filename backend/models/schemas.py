@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -5,6 +7,13 @@ class ChatRequest(BaseModel):
     message: str
     model: str | None = None
     think: bool = True
+    # Same ID on every message of a conversation to answer in its context
+    session_id: str | None = None
+    # Only search these documents (names), formats (".pdf") or tags;
+    # a chunk must match every field given
+    sources: list[str] | None = None
+    formats: list[str] | None = None
+    tags: list[str] | None = None
 
 
 class ChatResponse(BaseModel):
@@ -16,6 +25,32 @@ class DocumentInfo(BaseModel):
     filename: str
     format: str
     chunks: int
+    pages: int | None = None
+    ingested_at: str | None = None
+    tags: list[str] = []
+
+
+class IngestJobStatus(BaseModel):
+    id: str
+    filename: str
+    stage: str
+    chunks_done: int
+    chunks_total: int
+    error: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+
+
+class ReadinessStatus(BaseModel):
+    status: str
+    ollama: bool
+    models_loaded: list[str] = []
+    vector_store: bool
+    documents_count: int
+    chunks_count: int
+    checked_at: datetime | None = None
+    age_seconds: float | None = None
+    error: str | None = None
 
 
 class HealthStatus(BaseModel):
@@ -25,3 +60,5 @@ class HealthStatus(BaseModel):
     embedding_model: str
     documents_count: int
     chunks_count: int
+    embedding_cache: dict | None = None
+    answer_cache: dict | None = None
@@ -19,3 +19,20 @@ USER_PROMPT_TEMPLATE = """Contexto:
 {context}
 
 Pregunta del usuario: {question}"""
+
+CONDENSE_PROMPT_TEMPLATE = """Conversación hasta ahora:
+{history}
+
+Pregunta de seguimiento: {question}
+
+Reescribe la pregunta de seguimiento como una pregunta independiente, que se entienda sin leer la conversación, conservando nombres de productos, modelos y códigos. Si ya se entiende sola, repítela sin cambios. Responde solo con la pregunta reescrita."""
+
+SUMMARY_PROMPT_TEMPLATE = """Resumen anterior:
+{summary}
+
+Nuevos turnos de la conversación:
+{conversation}
+
+Escribe un resumen breve y actualizado de toda la conversación: qué productos, modelos, códigos o problemas se han tratado y qué se ha respondido. Responde solo con el resumen."""
+
+SESSION_SUMMARY_PREFIX = "Resumen de la conversación anterior con este usuario:\n"
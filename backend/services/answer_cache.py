@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from collections.abc import Hashable
+from functools import lru_cache
+from itertools import count
+
+import numpy as np
+
+from config.settings import get_settings
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    chunks: list[dict]
+    sources: list[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def response(self) -> str:
+        return "".join(c["token"] for c in self.chunks if c.get("type") == "response")
+
+
+class AnswerCache:
+    """Semantic cache of full LLM answers.
+
+    A question matches an earlier one when the cosine similarity of their
+    query embeddings is above ``threshold``. Entries are scoped to
+    (model, think, corpus_version, filters), so any ingestion invalidates
+    them and a question scoped to some documents only matches questions
+    with the same scope.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl: float = 86400.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # scope -> OrderedDict[entry_id, (unit vector, CachedAnswer)]
+        self._scopes: dict[tuple, OrderedDict[int, tuple[np.ndarray, CachedAnswer]]] = {}
+        # scope -> (ids, matrix) built lazily for vectorized lookups
+        self._matrices: dict[tuple, tuple[list[int], np.ndarray]] = {}
+        # entry_id -> scope, least recently used first, across all scopes
+        self._lru: OrderedDict[int, tuple] = OrderedDict()
+        self._ids = count()
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self, embedding: list[float], model: str, think: bool, corpus_version: str,
+        filters: Hashable = None,
+    ) -> CachedAnswer | None:
+        scope = (model, think, corpus_version, filters)
+        self._drop_stale_versions(corpus_version)
+        entries = self._scopes.get(scope)
+        if not entries:
+            self.misses += 1
+            return None
+
+        ids, matrix = self._matrix(scope)
+        scores = matrix @ _normalize(embedding)
+        best = int(np.argmax(scores))
+        entry_id = ids[best]
+        answer = entries[entry_id][1]
+
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+        if time.monotonic() - answer.created_at > self.ttl:
+            self._remove(scope, entry_id)
+            self.misses += 1
+            return None
+
+        self._lru.move_to_end(entry_id)
+        self.hits += 1
+        return answer
+
+    def store(
+        self,
+        embedding: list[float],
+        model: str,
+        think: bool,
+        corpus_version: str,
+        answer: CachedAnswer,
+        filters: Hashable = None,
+    ) -> None:
+        scope = (model, think, corpus_version, filters)
+        self._drop_stale_versions(corpus_version)
+        entry_id = next(self._ids)
+        self._scopes.setdefault(scope, OrderedDict())[entry_id] = (_normalize(embedding), answer)
+        self._lru[entry_id] = scope
+        self._matrices.pop(scope, None)
+        while len(self._lru) > self.max_entries:
+            self._evict_least_recent()
+
+    def clear(self) -> None:
+        self._scopes.clear()
+        self._matrices.clear()
+        self._lru.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _matrix(self, scope: tuple) -> tuple[list[int], np.ndarray]:
+        cached = self._matrices.get(scope)
+        if cached is None:
+            entries = self._scopes[scope]
+            ids = list(entries)
+            cached = (ids, np.stack([entries[i][0] for i in ids]))
+            self._matrices[scope] = cached
+        return cached
+
+    def _remove(self, scope: tuple, entry_id: int) -> None:
+        entries = self._scopes[scope]
+        del entries[entry_id]
+        del self._lru[entry_id]
+        self._matrices.pop(scope, None)
+        if not entries:
+            del self._scopes[scope]
+
+    def _evict_least_recent(self) -> None:
+        entry_id, scope = next(iter(self._lru.items()))
+        self._remove(scope, entry_id)
+
+    def _drop_stale_versions(self, corpus_version: str) -> None:
+        for scope in [s for s in self._scopes if s[2] != corpus_version]:
+            for entry_id in self._scopes.pop(scope):
+                del self._lru[entry_id]
+            self._matrices.pop(scope, None)
+
+
+def _normalize(embedding: list[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@lru_cache
+def get_answer_cache() -> AnswerCache | None:
+    settings = get_settings()
+    if not settings.answer_cache_enabled:
+        return None
+    return AnswerCache(
+        threshold=settings.answer_cache_threshold,
+        max_entries=settings.answer_cache_max_entries,
+        ttl=settings.answer_cache_ttl,
+    )
@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from backend.services.vector_store import TAG_PREFIX
+from config.settings import get_settings
+
+
+class DocumentCatalog:
+    """One row per ingested document, maintained at ingest time.
+
+    Holds what the API needs about each document (format, chunk and page
+    counts, ingest time) plus what incremental ingestion needs (content
+    hash, source directory, chunk IDs), so none of it has to be recomputed
+    from chunk metadata. Stored in SQLite next to the vector store.
+    """
+
+    def __init__(self, path: Path | None = None):
+        settings = get_settings()
+        path = path or settings.vectorstore_path / "catalog.sqlite3"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " source TEXT PRIMARY KEY,"
+            " format TEXT NOT NULL,"
+            " directory TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " chunks INTEGER NOT NULL,"
+            " pages INTEGER NOT NULL,"
+            " chunk_ids TEXT NOT NULL,"
+            " ingested_at TEXT NOT NULL,"
+            " tags TEXT NOT NULL DEFAULT '[]')"
+        )
+        # Catalogs created before tags existed
+        columns = {r["name"] for r in self._db.execute("PRAGMA table_info(documents)")}
+        if "tags" not in columns:
+            self._db.execute("ALTER TABLE documents ADD COLUMN tags TEXT NOT NULL DEFAULT '[]'")
+
+    def get(self, name: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM documents WHERE source = ?", (name,)).fetchone()
+        return _entry(row) if row else None
+
+    def set(
+        self,
+        name: str,
+        content_hash: str,
+        directory: Path,
+        chunk_ids: list[str],
+        pages: int,
+        ingested_at: str,
+        tags: tuple[str, ...] = (),
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents"
+                " (source, format, directory, content_hash, chunks, pages, chunk_ids, ingested_at, tags)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name, Path(name).suffix.lower(), str(directory.resolve()), content_hash,
+                    len(chunk_ids), pages, json.dumps(chunk_ids), ingested_at, json.dumps(list(tags)),
+                ),
+            )
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE source = ?", (name,))
+
+    def names_in(self, directory: Path) -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT source FROM documents WHERE directory = ? ORDER BY source",
+                (str(directory.resolve()),),
+            ).fetchall()
+        return [r["source"] for r in rows]
+
+    def documents(self) -> list[dict]:
+        """Every document, without chunk IDs, sorted by name."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT source, format, chunks, pages, content_hash, ingested_at, tags"
+                " FROM documents ORDER BY source"
+            ).fetchall()
+        return [{**dict(r), "tags": json.loads(r["tags"])} for r in rows]
+
+    def names(self) -> list[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT source FROM documents ORDER BY source").fetchall()
+        return [r["source"] for r in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM documents")
+
+    def rebuild(self, chunk_metadatas: dict[str, dict], directory: Path) -> None:
+        """Recreate the catalog from the chunk metadata of an existing store.
+
+        Used once for stores ingested before the catalog existed. Content
+        hashes are unknown, so the next directory ingest refreshes them.
+        """
+        by_source: dict[str, list[tuple[str, dict]]] = {}
+        for chunk_id, meta in chunk_metadatas.items():
+            by_source.setdefault(meta.get("source", "unknown"), []).append((chunk_id, meta))
+        for name, chunks in by_source.items():
+            chunks.sort(key=lambda c: c[1].get("chunk_index", 0))
+            self.set(
+                name, "", directory,
+                [chunk_id for chunk_id, _ in chunks],
+                pages=len({m.get("page", 0) for _, m in chunks}),
+                ingested_at=max(m.get("ingested_at", "") for _, m in chunks),
+                tags=tuple(sorted(
+                    k[len(TAG_PREFIX):] for k in chunks[0][1] if k.startswith(TAG_PREFIX)
+                )),
+            )
+
+    def import_manifest(self, path: Path) -> int:
+        """Take content hashes and directories from a JSON ingest manifest.
+
+        The catalog replaced ``manifest.json``; importing it after
+        ``rebuild`` spares the next directory ingest from refreshing
+        every file. The manifest is renamed to ``manifest.json.migrated``.
+        Returns the number of documents updated.
+        """
+        entries = json.loads(path.read_text(encoding="utf-8"))
+        updated = 0
+        with self._lock:
+            for name, entry in entries.items():
+                cursor = self._db.execute(
+                    "UPDATE documents SET content_hash = ?, directory = ? WHERE source = ?",
+                    (entry["hash"], entry["directory"], name),
+                )
+                updated += cursor.rowcount
+        os.replace(path, path.with_name(path.name + ".migrated"))
+        return updated
+
+
+def _entry(row: sqlite3.Row) -> dict:
+    return {
+        "hash": row["content_hash"],
+        "directory": row["directory"],
+        "chunk_ids": json.loads(row["chunk_ids"]),
+        "chunks": row["chunks"],
+        "pages": row["pages"],
+        "format": row["format"],
+        "ingested_at": row["ingested_at"],
+        "tags": json.loads(row["tags"]),
+    }
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from backend.services.document_service import DocumentService
+from backend.services.health_monitor import HealthMonitor
+from backend.services.ingest_jobs import IngestJobQueue
+from backend.services.model_residency import ModelResidency
+from backend.services.ollama_client import OllamaClient, close_http_client, get_http_client
+from backend.services.rag_service import RAGService
+from backend.services.scheduler import GenerationScheduler
+from backend.services.vector_store import VectorStore
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ServiceContainer:
+    """Long-lived services shared by every request.
+
+    Created once when the app starts so the persistent vector store, its
+    collection and the text splitter are opened a single time.
+    """
+
+    def __init__(self):
+        self.ollama = OllamaClient()
+        self.vector_store = VectorStore(ollama=self.ollama)
+        self.document_service = DocumentService(vector_store=self.vector_store)
+        self.catalog = self.document_service.catalog
+        self.scheduler = GenerationScheduler()
+        self.rag_service = RAGService(
+            ollama=self.ollama, vector_store=self.vector_store, catalog=self.catalog,
+            scheduler=self.scheduler,
+        )
+        self.ingest_jobs = IngestJobQueue(self.document_service)
+        self.health_monitor = HealthMonitor(self.ollama, self.vector_store, self.catalog)
+        self.residency = ModelResidency(self.ollama, self.rag_service.prompt_builder)
+
+    async def startup(self) -> None:
+        get_http_client()
+        await self.ingest_jobs.start()
+        await self.health_monitor.start()
+        await self.residency.start()
+
+    async def warmup(self) -> dict[str, float]:
+        """Preload the vector index and load the default models into Ollama.
+
+        Failures are logged, not raised: the server still starts and the
+        first requests pay the loading time instead. Returns seconds per step.
+        """
+        timings = {}
+
+        async def timed(step: str, coro) -> None:
+            start = time.perf_counter()
+            try:
+                await coro
+            except (httpx.HTTPError, OSError) as e:
+                logger.warning("Precarga de %s fallida: %s", step, e)
+            timings[step] = time.perf_counter() - start
+
+        await asyncio.gather(
+            timed("index", asyncio.to_thread(self.vector_store.preload)),
+            # Whatever the pin policy, so the first requests find them loaded
+            timed("models", self.residency.refresh("startup", force=True)),
+        )
+        return timings
+
+    async def aclose(self) -> None:
+        await self.rag_service.aclose()
+        await self.ollama.aclose()
+        await self.health_monitor.stop()
+        await self.residency.stop()
+        await self.ingest_jobs.stop()
+        self.ingest_jobs.close()
+        await close_http_client()
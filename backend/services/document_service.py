@@ -1,38 +1,15 @@
+import asyncio
 import hashlib
+from collections.abc import Callable
 from datetime import datetime, timezone
 from pathlib import Path
 
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
 from config.settings import get_settings
-from backend.services.vector_store import VectorStore
-
-# docx2txt loader imported conditionally
-try:
-    from langchain_community.document_loaders import Docx2txtLoader
-    HAS_DOCX = True
-except ImportError:
-    HAS_DOCX = False
-
-
-SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".docx", ".doc"}
-
-
-def _get_loader(file_path: Path):
-    ext = file_path.suffix.lower()
-    if ext == ".pdf":
-        return PyPDFLoader(str(file_path))
-    if ext == ".txt":
-        return TextLoader(str(file_path), encoding="utf-8")
-    if ext in (".docx", ".doc"):
-        if not HAS_DOCX:
-            raise ImportError("docx2txt no instalado. Ejecuta: pip install docx2txt")
-        return Docx2txtLoader(str(file_path))
-    raise ValueError(f"Formato no soportado: {ext}")
+from backend.services.catalog import DocumentCatalog
+from backend.services.ingest_pipeline import FileTask, IngestPipeline
+from backend.services.loaders import SUPPORTED_EXTENSIONS, ChunkStream, split_file
+from backend.services.metrics import INGEST_FILES, INGEST_STAGE_SECONDS
+from backend.services.vector_store import TAG_PREFIX, VectorStore, normalize_tags
 
 
 def _chunk_id(source: str, chunk_index: int) -> str:
@@ -40,66 +17,238 @@ def _chunk_id(source: str, chunk_index: int) -> str:
     return hashlib.md5(content.encode()).hexdigest()
 
 
+def _file_hash(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 class DocumentService:
-    def __init__(self):
+    def __init__(
+        self,
+        vector_store: VectorStore | None = None,
+        catalog: DocumentCatalog | None = None,
+    ):
         settings = get_settings()
-        self._splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""],
-        )
-        self._vector_store = VectorStore()
+        self._chunk_size = settings.chunk_size
+        self._chunk_overlap = settings.chunk_overlap
+        self._vector_store = vector_store or VectorStore()
+        self.catalog = catalog or DocumentCatalog()
+        if self.catalog.count() == 0 and self._vector_store.chunks_count > 0:
+            self.catalog.rebuild(self._vector_store.get_all_metadatas(), settings.documents_path)
+        # Stores from before the catalog kept their hashes in manifest.json
+        manifest = settings.vectorstore_path / "manifest.json"
+        if manifest.exists():
+            self.catalog.import_manifest(manifest)
 
-    async def ingest_file(self, file_path: Path) -> int:
-        """Ingest a single file. Returns number of chunks created."""
-        loader = _get_loader(file_path)
-        documents = loader.load()
+    async def ingest_file(
+        self,
+        file_path: Path,
+        content_hash: str | None = None,
+        progress: Callable[[str, int, int], None] | None = None,
+        tags: list[str] | None = None,
+    ) -> int:
+        """Ingest (or re-ingest) a single file. Returns number of chunks created.
 
-        chunks = self._splitter.split_documents(documents)
+        Chunks are upserted by ID and any chunk left over from a previous,
+        longer version of the file is deleted. Files of at least
+        ``ingest_stream_min_bytes`` are parsed a page at a time in a thread
+        and embedded in batches as they go, so memory does not grow with
+        their size; smaller ones are split whole first. ``progress(stage,
+        done, total)`` reports the current stage ("parsing", "embedding")
+        and chunk counts; for a streamed file the total is 0 until the
+        whole file has been read.
+        ``tags`` replace the document's tags; by default it keeps those
+        of its previous version.
+        """
+        if progress is not None:
+            progress("parsing", 0, 0)
+        settings = get_settings()
+        stream = None
+        if file_path.stat().st_size >= settings.ingest_stream_min_bytes:
+            stream = ChunkStream(file_path, self._chunk_size, self._chunk_overlap)
+        try:
+            content_hash = content_hash or await asyncio.to_thread(_file_hash, file_path)
+            tags = normalize_tags(tags) if tags is not None else self.tags_of(file_path.name)
+            if stream is None:
+                pieces, timings = await asyncio.to_thread(
+                    split_file, str(file_path), self._chunk_size, self._chunk_overlap,
+                )
+                texts, metadatas, ids = self.build_chunks(file_path, pieces, tags=tags)
+                if progress is not None:
+                    progress("embedding", 0, len(texts))
+                await self._vector_store.add_documents(
+                    texts, metadatas, ids,
+                    progress=(lambda done, total: progress("embedding", done, total)) if progress else None,
+                )
+                pages = {m["page"] for m in metadatas}
+            else:
+                ids = []
+                pages = set()
+                timestamp = datetime.now(timezone.utc).isoformat()
+                while pieces := await stream.read(settings.ingest_embed_batch_size):
+                    texts, metadatas, batch_ids = self.build_chunks(
+                        file_path, pieces, start=len(ids), timestamp=timestamp, tags=tags,
+                    )
+                    await self._vector_store.add_documents(texts, metadatas, batch_ids)
+                    ids.extend(batch_ids)
+                    pages.update(m["page"] for m in metadatas)
+                    if progress is not None:
+                        progress("embedding", len(ids), 0)
+                timings = stream.timings
+            for stage, seconds in timings.items():
+                INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+            self.finalize_file(file_path, content_hash, ids, len(pages), tags)
+        except Exception:
+            # Some batches may have been written
+            self._vector_store.bump_corpus_version()
+            INGEST_FILES.inc(outcome="error")
+            raise
+        finally:
+            if stream is not None:
+                stream.close()
+        INGEST_FILES.inc(outcome="ok")
+        return len(ids)
 
-        if not chunks:
-            return 0
+    def build_chunks(
+        self, file_path: Path, pieces: list[tuple[str, int]],
+        start: int = 0, timestamp: str | None = None, tags: tuple[str, ...] = (),
+    ) -> tuple[list[str], list[dict], list[str]]:
+        """Turn (text, page) pairs into the texts, metadatas and IDs to store.
 
+        ``start`` is the index of the first piece within the file. Each
+        tag becomes a ``tag:<name>: True`` metadata entry.
+        """
         texts = []
         metadatas = []
         ids = []
-        timestamp = datetime.now(timezone.utc).isoformat()
+        timestamp = timestamp or datetime.now(timezone.utc).isoformat()
 
-        for i, chunk in enumerate(chunks):
-            texts.append(chunk.page_content)
+        for i, (text, page) in enumerate(pieces, start):
+            texts.append(text)
             metadatas.append({
                 "source": file_path.name,
                 "format": file_path.suffix.lower(),
-                "page": chunk.metadata.get("page", 0),
+                "page": page,
                 "chunk_index": i,
                 "ingested_at": timestamp,
+                **{TAG_PREFIX + tag: True for tag in tags},
             })
             ids.append(_chunk_id(file_path.name, i))
+        return texts, metadatas, ids
+
+    def finalize_file(
+        self, file_path: Path, content_hash: str, ids: list[str], pages: int, tags: tuple[str, ...] = (),
+    ) -> None:
+        """Drop leftover chunks of a previous version and record the file."""
+        self._delete_stale_chunks(file_path.name, keep=set(ids))
+        self._vector_store.bump_corpus_version()
+        timestamp = datetime.now(timezone.utc).isoformat()
+        self.catalog.set(
+            file_path.name, content_hash, file_path.parent, ids,
+            pages=pages,
+            ingested_at=timestamp,
+            tags=tags,
+        )
 
-        await self._vector_store.add_documents(texts, metadatas, ids)
-        return len(texts)
+    def tags_of(self, name: str) -> tuple[str, ...]:
+        entry = self.catalog.get(name)
+        return tuple(entry["tags"]) if entry else ()
 
-    async def ingest_directory(self, directory: Path | None = None) -> dict:
-        """Ingest all supported files from a directory. Returns stats."""
+    def remove_document(self, name: str) -> None:
+        """Delete every chunk of a document from the vector store."""
+        self._delete_stale_chunks(name, keep=set())
+        self._vector_store.bump_corpus_version()
+        self.catalog.remove(name)
+
+    def reset(self) -> None:
+        self._vector_store.reset()
+        self.catalog.clear()
+
+    def _delete_stale_chunks(self, name: str, keep: set[str]) -> None:
+        entry = self.catalog.get(name)
+        # Documents missing from the catalog: ask the store
+        previous = entry["chunk_ids"] if entry else self._vector_store.get_ids(name)
+        self._vector_store.delete([i for i in previous if i not in keep])
+
+    async def ingest_directory(
+        self,
+        directory: Path | None = None,
+        workers: int | None = None,
+        embed_concurrency: int | None = None,
+        tags: list[str] | None = None,
+    ) -> dict:
+        """Incrementally sync a directory into the vector store. Returns stats.
+
+        Unchanged files (same content hash and tags) are skipped, new and
+        modified files are (re)ingested through the parallel IngestPipeline
+        and files no longer present are removed. Ingested files get
+        ``tags``, or keep their previous ones if it is None; a file whose
+        tags change is re-ingested too, its embeddings coming from the
+        embedding cache.
+        """
         settings = get_settings()
         directory = directory or settings.documents_path
 
-        stats = {"files_processed": 0, "total_chunks": 0, "errors": []}
+        stats = {
+            "files_processed": 0, "total_chunks": 0,
+            "added": 0, "updated": 0, "removed": 0, "skipped": 0,
+            "errors": [],
+        }
 
+        present = set()
+        tasks = []
+        updates = set()
         for file_path in sorted(directory.iterdir()):
             if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
                 continue
             if file_path.name.startswith("."):
                 continue
+            present.add(file_path.name)
 
             try:
-                num_chunks = await self.ingest_file(file_path)
-                stats["files_processed"] += 1
-                stats["total_chunks"] += num_chunks
-                print(f"  {file_path.name}: {num_chunks} chunks")
-            except Exception as e:
+                content_hash = _file_hash(file_path)
+            except OSError as e:
                 stats["errors"].append({"file": file_path.name, "error": str(e)})
                 print(f"  {file_path.name}: ERROR - {e}")
+                continue
+            entry = self.catalog.get(file_path.name)
+            if tags is not None:
+                file_tags = normalize_tags(tags)
+            else:
+                file_tags = tuple(entry["tags"]) if entry else ()
+            if entry and entry["hash"] == content_hash and tuple(entry["tags"]) == file_tags:
+                stats["skipped"] += 1
+                print(f"  {file_path.name}: sin cambios")
+                continue
+            if entry:
+                updates.add(file_path.name)
+            tasks.append(FileTask(file_path, content_hash, file_tags))
+
+        pipeline = IngestPipeline(
+            self, self._vector_store, ollama=self._vector_store.ollama,
+            workers=workers, embed_concurrency=embed_concurrency,
+        )
+        for result in await pipeline.run(tasks):
+            if "error" in result:
+                stats["errors"].append(result)
+                continue
+            stats["files_processed"] += 1
+            stats["total_chunks"] += result["chunks"]
+            stats["updated" if result["file"] in updates else "added"] += 1
+
+        for name in self.catalog.names_in(directory):
+            if name in present:
+                continue
+            try:
+                self.remove_document(name)
+                stats["removed"] += 1
+                print(f"  {name}: eliminado")
+            except Exception as e:
+                stats["errors"].append({"file": name, "error": str(e)})
+                print(f"  {name}: ERROR - {e}")
 
         return stats
 
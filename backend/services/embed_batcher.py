@@ -0,0 +1,116 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+from backend.services.metrics import EMBED_BATCH_SIZE
+from config.settings import get_settings
+
+SendBatch = Callable[[list[str], str], Awaitable[list[list[float]]]]
+
+
+class _Batch:
+    def __init__(self):
+        # Identical texts are sent once and resolve every caller
+        self.waiters: dict[str, list[asyncio.Future]] = {}
+        self.timer: asyncio.TimerHandle | None = None
+
+    def __len__(self) -> int:
+        return len(self.waiters)
+
+
+class EmbeddingBatcher:
+    """Merges concurrent single-text embeddings into one batch request.
+
+    The first request for a model opens a batch that is sent after
+    ``window`` seconds, or as soon as it holds ``max_batch`` distinct
+    texts. Each caller waits on its own future for at most ``timeout``.
+    If the batch request is rejected, texts are retried one by one so a
+    bad input only fails its own caller; a connection error fails them
+    all at once.
+    """
+
+    def __init__(
+        self,
+        send: SendBatch,
+        window: float | None = None,
+        max_batch: int | None = None,
+        timeout: float | None = None,
+    ):
+        settings = get_settings()
+        self._send = send
+        self.window = window if window is not None else settings.embed_batch_window
+        self.max_batch = max_batch or settings.embed_batch_max_size
+        self.timeout = timeout or settings.ollama_embed_timeout
+        self._open: dict[str, _Batch] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, text: str, model: str) -> list[float]:
+        future = asyncio.get_running_loop().create_future()
+        batch = self._open.get(model)
+        if batch is None:
+            batch = self._open[model] = _Batch()
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self._flush, model, batch)
+        batch.waiters.setdefault(text, []).append(future)
+        if len(batch) >= self.max_batch:
+            self._flush(model, batch)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException(f"Embedding sin respuesta tras {self.timeout:g} s") from None
+
+    def _flush(self, model: str, batch: _Batch) -> None:
+        if self._open.get(model) is batch:
+            del self._open[model]
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        task = asyncio.create_task(self._run(model, batch), name="embed-batch")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model: str, batch: _Batch) -> None:
+        # Skip texts whose callers all gave up (timeout, disconnect)
+        texts = [t for t, futures in batch.waiters.items() if not all(f.done() for f in futures)]
+        if not texts:
+            return
+        EMBED_BATCH_SIZE.observe(len(texts))
+        try:
+            embeddings = await self._send(texts, model)
+        except httpx.TransportError as e:
+            for text in texts:
+                _resolve(batch.waiters[text], error=e)
+            return
+        except Exception as e:
+            if len(texts) == 1:
+                _resolve(batch.waiters[texts[0]], error=e)
+            else:
+                await asyncio.gather(*(self._run_one(model, batch, t) for t in texts))
+            return
+        for text, embedding in zip(texts, embeddings):
+            _resolve(batch.waiters[text], result=embedding)
+
+    async def _run_one(self, model: str, batch: _Batch, text: str) -> None:
+        try:
+            embedding = (await self._send([text], model))[0]
+        except Exception as e:
+            _resolve(batch.waiters[text], error=e)
+        else:
+            _resolve(batch.waiters[text], result=embedding)
+
+    async def aclose(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _resolve(
+    futures: list[asyncio.Future], result: list[float] | None = None, error: Exception | None = None,
+) -> None:
+    for future in futures:
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
@@ -0,0 +1,140 @@
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from config.settings import get_settings
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache.
+
+    Two tiers: an in-memory LRU and a SQLite file on disk, both keyed by
+    sha256(embedding model, text). Vectors are stored on disk as float32.
+    """
+
+    def __init__(self, path: Path | None = None, max_memory_items: int = 10_000):
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._max_memory_items = max_memory_items
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+            )
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Look up every text. Returns the cached vector or None per position."""
+        keys = [self.make_key(model, t) for t in texts]
+        results: list[list[float] | None] = [None] * len(texts)
+        disk_lookup: dict[str, list[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._db is not None:
+                found = self._read_disk(list(disk_lookup))
+                for key, vector in found.items():
+                    for i in disk_lookup.pop(key):
+                        results[i] = vector
+                        self.disk_hits += 1
+                    self._remember(key, vector)
+
+            self.misses += sum(len(v) for v in disk_lookup.values())
+        return results
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model, text)
+                self._remember(key, vector)
+                rows.append((key, model, array("f", vector).tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    def put(self, model: str, text: str, vector: list[float]) -> None:
+        self.put_many(model, [text], [vector])
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_items": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        return found
+
+
+@lru_cache
+def get_embedding_cache() -> EmbeddingCache | None:
+    settings = get_settings()
+    if not settings.embedding_cache_enabled:
+        return None
+    return EmbeddingCache(
+        path=settings.embedding_cache_path,
+        max_memory_items=settings.embedding_cache_memory_items,
+    )
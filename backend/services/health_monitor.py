@@ -0,0 +1,94 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from backend.services.catalog import DocumentCatalog
+from backend.services.ollama_client import OllamaClient
+from backend.services.vector_store import VectorStore
+from config.settings import get_settings
+
+
+@dataclass
+class HealthSnapshot:
+    ollama: bool = False
+    models_loaded: list[str] = field(default_factory=list)
+    vector_store: bool = False
+    documents_count: int = 0
+    chunks_count: int = 0
+    error: str | None = None
+    checked_at: datetime | None = None
+    # monotonic clock, for staleness checks
+    checked_monotonic: float | None = None
+
+    def age(self) -> float | None:
+        if self.checked_monotonic is None:
+            return None
+        return time.monotonic() - self.checked_monotonic
+
+
+class HealthMonitor:
+    """Probes Ollama and the vector store in the background.
+
+    Load balancer probes read the last snapshot instead of doing any I/O.
+    The Ollama probe also ejects and re-admits hosts of the client's pools.
+    """
+
+    def __init__(
+        self,
+        ollama: OllamaClient,
+        vector_store: VectorStore,
+        catalog: DocumentCatalog,
+    ):
+        settings = get_settings()
+        self._ollama = ollama
+        self._vector_store = vector_store
+        self._catalog = catalog
+        self.interval = settings.health_probe_interval
+        self.stale_after = settings.health_stale_after
+        self.snapshot = HealthSnapshot()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="health-monitor")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def is_ready(self) -> bool:
+        age = self.snapshot.age()
+        return (
+            age is not None
+            and age <= self.stale_after
+            and self.snapshot.ollama
+            and self.snapshot.vector_store
+        )
+
+    async def probe(self) -> HealthSnapshot:
+        snapshot = HealthSnapshot()
+        errors = []
+        try:
+            snapshot.models_loaded = await self._ollama.running_models()
+            snapshot.ollama = True
+        except Exception as e:
+            errors.append(f"ollama: {e}")
+        try:
+            snapshot.chunks_count = await asyncio.to_thread(lambda: self._vector_store.chunks_count)
+            snapshot.documents_count = await asyncio.to_thread(self._catalog.count)
+            snapshot.vector_store = True
+        except Exception as e:
+            errors.append(f"vector_store: {e}")
+
+        snapshot.error = "; ".join(errors) or None
+        snapshot.checked_at = datetime.now(timezone.utc)
+        snapshot.checked_monotonic = time.monotonic()
+        self.snapshot = snapshot
+        return snapshot
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
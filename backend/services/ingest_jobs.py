@@ -0,0 +1,237 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from backend.services.document_service import DocumentService
+from config.settings import get_settings
+
+RUNNING_STAGES = ("parsing", "embedding")
+_RUNNING = ", ".join(f"'{stage}'" for stage in RUNNING_STAGES)
+# Every process touches its unfinished jobs this often; a job left
+# untouched for _STALE_SECONDS belonged to a process that died
+_HEARTBEAT_SECONDS = 10.0
+_STALE_SECONDS = 60.0
+# How often a job waiting for another one on the same file checks again
+_CLAIM_POLL_SECONDS = 0.5
+
+
+@dataclass
+class IngestJob:
+    id: str
+    filename: str
+    path: Path
+    # None keeps the tags of the document's previous version
+    tags: list[str] | None = None
+    # queued -> parsing -> embedding -> done | error
+    stage: str = "queued"
+    chunks_done: int = 0
+    # 0 until the whole file has been read
+    chunks_total: int = 0
+    error: str | None = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("done", "error")
+
+
+class IngestJobQueue:
+    """Background ingestion of uploaded files by a bounded pool of workers.
+
+    A job runs in the server process that accepted the upload, but its
+    state lives in SQLite next to the catalog, so every process can
+    report it. A job only starts once no other job, in any process, is
+    ingesting a file of the same name.
+    """
+
+    def __init__(self, document_service: DocumentService, workers: int | None = None, path: Path | None = None):
+        settings = get_settings()
+        self._documents = document_service
+        self._workers = max(1, workers or settings.ingest_job_workers)
+        self._history = settings.ingest_job_history
+        self._queue: asyncio.Queue[IngestJob] = asyncio.Queue()
+        # Unfinished jobs of this process
+        self._own: dict[str, IngestJob] = {}
+        self._tasks: list[asyncio.Task] = []
+
+        path = path or settings.vectorstore_path / "ingest_jobs.sqlite3"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " filename TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " tags TEXT,"
+            " stage TEXT NOT NULL,"
+            " chunks_done INTEGER NOT NULL,"
+            " chunks_total INTEGER NOT NULL,"
+            " error TEXT,"
+            " created_at TEXT NOT NULL,"
+            " finished_at TEXT,"
+            " heartbeat REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_filename ON jobs (filename)")
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingest-worker-{i}")
+            for i in range(self._workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._heartbeat(), name="ingest-heartbeat"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._own.values()):
+            self._finish(job, error="El servidor se detuvo antes de terminar")
+
+    def submit(self, path: Path, tags: list[str] | None = None) -> IngestJob:
+        job = IngestJob(id=uuid.uuid4().hex, filename=path.name, path=path, tags=tags)
+        self._own[job.id] = job
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, filename, path, tags, stage, chunks_done, chunks_total,"
+                " created_at, heartbeat) VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)",
+                (
+                    job.id, job.filename, str(path), json.dumps(tags) if tags is not None else None,
+                    job.stage, job.created_at.isoformat(), time.time(),
+                ),
+            )
+            # Forget the oldest finished jobs; queued/running ones are always kept
+            self._db.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL"
+                " ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self._history,),
+            )
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            self._expire_stale()
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def recent(self) -> list[IngestJob]:
+        with self._lock:
+            self._expire_stale()
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC").fetchall()
+        return [_job(r) for r in rows]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestJob) -> None:
+        def progress(stage: str, done: int, total: int) -> None:
+            job.stage = stage
+            job.chunks_done = done
+            job.chunks_total = total
+            self._save(job)
+
+        try:
+            while not self._claim(job):
+                await asyncio.sleep(_CLAIM_POLL_SECONDS)
+            chunks = await self._documents.ingest_file(job.path, progress=progress, tags=job.tags)
+        except Exception as e:
+            self._finish(job, error=str(e))
+        else:
+            job.chunks_done = job.chunks_total = chunks
+            self._finish(job)
+
+    def _claim(self, job: IngestJob) -> bool:
+        """Mark ``job`` as parsing, unless a job on the same file is running."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_stale()
+                busy = self._db.execute(
+                    f"SELECT 1 FROM jobs WHERE filename = ? AND id != ? AND stage IN ({_RUNNING})",
+                    (job.filename, job.id),
+                ).fetchone()
+                if not busy:
+                    job.stage = "parsing"
+                    self._db.execute(
+                        "UPDATE jobs SET stage = ?, heartbeat = ? WHERE id = ?",
+                        (job.stage, time.time(), job.id),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return not busy
+
+    def _save(self, job: IngestJob) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, chunks_done = ?, chunks_total = ?, error = ?,"
+                " finished_at = ?, heartbeat = ? WHERE id = ?",
+                (
+                    job.stage, job.chunks_done, job.chunks_total, job.error,
+                    job.finished_at.isoformat() if job.finished_at else None, time.time(), job.id,
+                ),
+            )
+
+    def _finish(self, job: IngestJob, error: str | None = None) -> None:
+        job.stage = "error" if error is not None else "done"
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+        self._save(job)
+        self._own.pop(job.id, None)
+
+    def _expire_stale(self) -> None:
+        """Fail the unfinished jobs of processes that stopped. Call with the lock held."""
+        self._db.execute(
+            "UPDATE jobs SET stage = 'error', error = ?, finished_at = ?"
+            " WHERE finished_at IS NULL AND heartbeat < ?",
+            (
+                "El proceso que lo ingestaba se detuvo antes de terminar",
+                datetime.now(timezone.utc).isoformat(), time.time() - _STALE_SECONDS,
+            ),
+        )
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(_HEARTBEAT_SECONDS)
+            ids = list(self._own)
+            if ids:
+                with self._lock:
+                    self._db.execute(
+                        f"UPDATE jobs SET heartbeat = ? WHERE id IN ({','.join('?' * len(ids))})",
+                        [time.time(), *ids],
+                    )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _job(row: sqlite3.Row) -> IngestJob:
+    return IngestJob(
+        id=row["id"],
+        filename=row["filename"],
+        path=Path(row["path"]),
+        tags=json.loads(row["tags"]) if row["tags"] is not None else None,
+        stage=row["stage"],
+        chunks_done=row["chunks_done"],
+        chunks_total=row["chunks_total"],
+        error=row["error"],
+        created_at=datetime.fromisoformat(row["created_at"]),
+        finished_at=datetime.fromisoformat(row["finished_at"]) if row["finished_at"] else None,
+    )
@@ -0,0 +1,244 @@
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import httpx
+
+from backend.services.loaders import ChunkStream, split_file
+from backend.services.metrics import INGEST_FILES, INGEST_STAGE_SECONDS
+from backend.services.ollama_client import OllamaClient
+from backend.services.vector_store import VectorStore
+from config.settings import get_settings
+
+if TYPE_CHECKING:
+    from backend.services.document_service import DocumentService
+
+
+ReadChunks = Callable[[int], Awaitable[list[tuple[str, int]]]]
+
+
+@dataclass
+class FileTask:
+    path: Path
+    content_hash: str
+    tags: tuple[str, ...] = ()
+
+
+class AdaptiveBatchSize:
+    """Embedding batch size that follows Ollama's observed latency.
+
+    Doubles while batches finish well under ``target_seconds`` and halves
+    when they are slower than that or fail.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_seconds: float):
+        self.value = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+
+    def record(self, size: int, seconds: float) -> None:
+        if seconds > self.target_seconds:
+            self.shrink()
+        elif seconds < self.target_seconds / 2 and size >= self.value:
+            self.value = min(self.maximum, self.value * 2)
+
+    def shrink(self) -> None:
+        self.value = max(self.minimum, self.value // 2)
+
+
+class IngestPipeline:
+    """Staged ingestion: parse/split -> embed -> write.
+
+    Parsing and splitting run in a process pool, embedding batches run
+    with bounded concurrency and an adaptive size, and every embedded batch
+    is written to the vector store straight away. Files of at least
+    ``ingest_stream_min_bytes`` are instead parsed a page at a time in a
+    thread, each batch read only when an embedding slot is free, so a
+    large manual never sits in memory whole.
+    """
+
+    def __init__(
+        self,
+        document_service: "DocumentService",
+        vector_store: VectorStore,
+        ollama: OllamaClient | None = None,
+        workers: int | None = None,
+        embed_concurrency: int | None = None,
+    ):
+        settings = get_settings()
+        self._settings = settings
+        self._documents = document_service
+        self._vector_store = vector_store
+        self._ollama = ollama or OllamaClient()
+        self.workers = max(1, workers or settings.ingest_workers)
+        self.embed_concurrency = max(1, embed_concurrency or settings.ingest_embed_concurrency)
+        self._batch_size = AdaptiveBatchSize(
+            initial=settings.ingest_embed_batch_size,
+            minimum=settings.ingest_embed_batch_min,
+            maximum=settings.ingest_embed_batch_max,
+            target_seconds=settings.ingest_embed_batch_target_seconds,
+        )
+
+    async def run(self, tasks: list[FileTask]) -> list[dict]:
+        """Ingest every task. Returns one result dict per file, in completion order."""
+        if not tasks:
+            return []
+
+        executor = None
+        if self.workers > 1 and len(tasks) > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, len(tasks)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        embed_slots = asyncio.Semaphore(self.embed_concurrency)
+        write_lock = asyncio.Lock()
+        # Bound how many parsed-but-not-yet-embedded files sit in memory
+        files_in_flight = asyncio.Semaphore(self.workers * 2)
+
+        async def process(task: FileTask) -> dict:
+            async with files_in_flight:
+                try:
+                    chunks = await self._ingest_one(task, executor, embed_slots, write_lock)
+                    INGEST_FILES.inc(outcome="ok")
+                    return {"file": task.path.name, "chunks": chunks}
+                except Exception as e:
+                    # Some batches may have been written
+                    self._vector_store.bump_corpus_version()
+                    INGEST_FILES.inc(outcome="error")
+                    return {"file": task.path.name, "error": str(e)}
+
+        try:
+            results = []
+            for next_done in asyncio.as_completed([process(t) for t in tasks]):
+                result = await next_done
+                if "error" in result:
+                    print(f"  {result['file']}: ERROR - {result['error']}")
+                else:
+                    print(f"  {result['file']}: {result['chunks']} chunks")
+                results.append(result)
+            return results
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    async def _ingest_one(
+        self,
+        task: FileTask,
+        executor: ProcessPoolExecutor | None,
+        embed_slots: asyncio.Semaphore,
+        write_lock: asyncio.Lock,
+    ) -> int:
+        read, close = await self._open(task, executor)
+        ids: list[str] = []
+        pages: set[int] = set()
+        timestamp = datetime.now(timezone.utc).isoformat()
+        pending: list[asyncio.Task] = []
+        try:
+            while True:
+                # Take the slot first so the batch size reflects the latest timings
+                await embed_slots.acquire()
+                try:
+                    pieces = await read(self._batch_size.value)
+                except BaseException:
+                    embed_slots.release()
+                    raise
+                if not pieces:
+                    embed_slots.release()
+                    break
+                texts, metadatas, batch_ids = self._documents.build_chunks(
+                    task.path, pieces, start=len(ids), timestamp=timestamp, tags=task.tags,
+                )
+                ids.extend(batch_ids)
+                pages.update(m["page"] for m in metadatas)
+                batch = asyncio.create_task(self._embed_and_write(texts, metadatas, batch_ids, write_lock))
+                # Released even if the task is cancelled before it starts
+                batch.add_done_callback(lambda _: embed_slots.release())
+                pending.append(batch)
+                # Stop reading the file as soon as a batch has failed
+                for finished in [t for t in pending if t.done()]:
+                    pending.remove(finished)
+                    finished.result()
+            await asyncio.gather(*pending)
+        except BaseException:
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+        finally:
+            close()
+
+        async with write_lock:
+            self._documents.finalize_file(task.path, task.content_hash, ids, len(pages), task.tags)
+        return len(ids)
+
+    async def _open(
+        self, task: FileTask, executor: ProcessPoolExecutor | None,
+    ) -> tuple[ReadChunks, Callable[[], None]]:
+        """``read(count)`` for the file's next chunks, and ``close()``.
+
+        Small files are split whole in the process pool; large ones (and
+        every file when there is no pool) are streamed from a thread.
+        """
+        settings = self._settings
+        if executor is None or task.path.stat().st_size >= settings.ingest_stream_min_bytes:
+            stream = ChunkStream(task.path, settings.chunk_size, settings.chunk_overlap)
+
+            async def read_stream(count: int) -> list[tuple[str, int]]:
+                pieces = await stream.read(count)
+                if not pieces:
+                    for stage, seconds in stream.timings.items():
+                        INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+                return pieces
+
+            return read_stream, stream.close
+
+        loop = asyncio.get_running_loop()
+        pieces, timings = await loop.run_in_executor(
+            executor, split_file, str(task.path), settings.chunk_size, settings.chunk_overlap,
+        )
+        for stage, seconds in timings.items():
+            INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+        remaining = iter(pieces)
+
+        async def read_list(count: int) -> list[tuple[str, int]]:
+            return list(islice(remaining, count))
+
+        return read_list, lambda: None
+
+    async def _embed_and_write(
+        self,
+        texts: list[str],
+        metadatas: list[dict],
+        ids: list[str],
+        write_lock: asyncio.Lock,
+    ) -> None:
+        embeddings = await self._embed(texts)
+        async with write_lock:
+            with INGEST_STAGE_SECONDS.time(stage="write"):
+                await asyncio.to_thread(
+                    self._vector_store.add_embeddings, texts, embeddings, metadatas, ids,
+                )
+
+    async def _embed(self, texts: list[str]) -> list[list[float]]:
+        start = time.perf_counter()
+        try:
+            embeddings = await self._ollama.embed_batch(texts)
+        except httpx.HTTPError:
+            # Retry in halves before giving up on the batch
+            if len(texts) <= self._batch_size.minimum:
+                raise
+            self._batch_size.shrink()
+            mid = len(texts) // 2
+            return await self._embed(texts[:mid]) + await self._embed(texts[mid:])
+        elapsed = time.perf_counter() - start
+        INGEST_STAGE_SECONDS.observe(elapsed, stage="embed")
+        self._batch_size.record(len(texts), elapsed)
+        return embeddings
@@ -0,0 +1,62 @@
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config.settings import get_settings
+
+
+class Lease:
+    """A named lease that one server process at a time can hold.
+
+    Kept in SQLite next to the vector store, so the worker processes of
+    one server agree on who runs background work that should only run
+    once. ``acquire()`` takes or renews the lease for ``ttl`` seconds; a
+    holder that stops renewing it (or dies) loses it when that runs out.
+    """
+
+    def __init__(self, name: str, ttl: float, path: Path | None = None):
+        settings = get_settings()
+        path = path or settings.vectorstore_path / "leases.sqlite3"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.ttl = ttl
+        self.owner = uuid.uuid4().hex
+        self.held = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def acquire(self) -> bool:
+        """Take or renew the lease. Returns whether this process holds it."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT owner, expires_at FROM leases WHERE name = ?", (self.name,),
+                ).fetchone()
+                self.held = row is None or row[0] == self.owner or row[1] < now
+                if self.held:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                        (self.name, self.owner, now + self.ttl),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.held
+
+    def release(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, self.owner))
+            self.held = False
+
+    def close(self) -> None:
+        self._db.close()
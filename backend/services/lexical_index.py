@@ -0,0 +1,140 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections.abc import Collection
+from pathlib import Path
+
+# Keep "-" and "_" inside tokens so part numbers and error codes
+# (RX-9, E-12, P_300) are indexed and matched as a single term.
+_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '-_'"
+_TOKEN_RE = re.compile(r"[\w\-]+")
+
+_STOPWORDS = {
+    "a", "al", "como", "con", "cual", "cuando", "de", "del", "el", "en", "es",
+    "esta", "este", "hay", "la", "las", "lo", "los", "me", "mi", "no", "o",
+    "para", "por", "que", "se", "si", "su", "un", "una", "y",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased, accent-free query terms, mirroring the FTS5 tokenizer."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    tokens = (t.strip("-_") for t in _TOKEN_RE.findall(text))
+    return [t for t in tokens if t and t not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, backed by SQLite FTS5.
+
+    Lives in a SQLite file next to the vector store and is updated
+    incrementally with the same chunk IDs.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_rows ("
+            " row INTEGER PRIMARY KEY AUTOINCREMENT, chunk_id TEXT UNIQUE NOT NULL)"
+        )
+        self._db.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5(text, tokenize="{_TOKENIZER}")'
+        )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+
+    def add(self, ids: list[str], texts: list[str]) -> None:
+        """Insert or replace chunks by ID."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for chunk_id, text in zip(ids, texts):
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO chunk_rows (chunk_id) VALUES (?)", (chunk_id,),
+                    )
+                    row = self._db.execute(
+                        "SELECT row FROM chunk_rows WHERE chunk_id = ?", (chunk_id,),
+                    ).fetchone()[0]
+                    self._db.execute("DELETE FROM chunk_text WHERE rowid = ?", (row,))
+                    self._db.execute(
+                        "INSERT INTO chunk_text (rowid, text) VALUES (?, ?)", (row, text),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for chunk_id in ids:
+                    found = self._db.execute(
+                        "SELECT row FROM chunk_rows WHERE chunk_id = ?", (chunk_id,),
+                    ).fetchone()
+                    if found is None:
+                        continue
+                    self._db.execute("DELETE FROM chunk_text WHERE rowid = ?", found)
+                    self._db.execute("DELETE FROM chunk_rows WHERE row = ?", found)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def reset(self) -> None:
+        with self._lock:
+            self._db.execute("DROP TABLE IF EXISTS chunk_text")
+            self._db.execute("DROP TABLE IF EXISTS chunk_rows")
+            self._create_tables()
+
+    def search(
+        self, query: str, top_k: int, ids: Collection[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Return (chunk_id, bm25 score) pairs, best first.
+
+        With ``ids``, only those chunks are returned: matches are read in
+        rank order until ``top_k`` of them are found.
+        """
+        terms = tokenize(query)
+        if not terms or ids is not None and not ids:
+            return []
+        match = " OR ".join('"' + t.replace('"', '""') + '"' for t in dict.fromkeys(terms))
+        sql = (
+            "SELECT r.chunk_id, bm25(chunk_text) AS rank"
+            " FROM chunk_text JOIN chunk_rows r ON r.row = chunk_text.rowid"
+            " WHERE chunk_text MATCH ? ORDER BY rank"
+        )
+        with self._lock:
+            if ids is None:
+                rows = self._db.execute(sql + " LIMIT ?", (match, top_k)).fetchall()
+            else:
+                rows = []
+                for row in self._db.execute(sql, (match,)):
+                    if row[0] in ids:
+                        rows.append(row)
+                        if len(rows) == top_k:
+                            break
+        # FTS5 returns negated BM25 so that smaller is better
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuse several ranked ID lists: score(id) = sum(1 / (k + rank))."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
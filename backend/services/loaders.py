@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections.abc import Iterator
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+# LangChain loaders and the splitter take most of the server's import
+# time and are only needed to ingest, so they are imported on first use
+if TYPE_CHECKING:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".docx", ".doc"}
+
+# Plain text is read in blocks of about this many characters, cut at a
+# blank line when there is one
+TEXT_BLOCK_CHARS = 64 * 1024
+# Text between pages, so a paragraph never runs on across a page break
+PAGE_SEPARATOR = "\n\n"
+
+
+def get_loader(file_path: Path):
+    ext = file_path.suffix.lower()
+    if ext == ".pdf":
+        from langchain_community.document_loaders import PyPDFLoader
+        return PyPDFLoader(str(file_path))
+    if ext == ".txt":
+        from langchain_community.document_loaders import TextLoader
+        return TextLoader(str(file_path), encoding="utf-8")
+    if ext in (".docx", ".doc"):
+        # docx2txt is optional
+        try:
+            import docx2txt  # noqa: F401
+            from langchain_community.document_loaders import Docx2txtLoader
+        except ImportError:
+            raise ImportError("docx2txt no instalado. Ejecuta: pip install docx2txt") from None
+        return Docx2txtLoader(str(file_path))
+    raise ValueError(f"Formato no soportado: {ext}")
+
+
+@lru_cache
+def make_splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+
+
+def iter_pages(file_path: Path) -> Iterator[tuple[str, int]]:
+    """(text, page) pairs, parsed one page at a time.
+
+    PDFs yield a page each. Plain text yields blocks of about
+    TEXT_BLOCK_CHARS as page 0; DOCX has no pages and is read whole.
+    """
+    if file_path.suffix.lower() == ".txt":
+        yield from ((block, 0) for block in _text_blocks(file_path))
+        return
+    for document in get_loader(file_path).lazy_load():
+        yield document.page_content, document.metadata.get("page", 0)
+
+
+def _text_blocks(file_path: Path) -> Iterator[str]:
+    lines: list[str] = []
+    size = 0
+    with open(file_path, encoding="utf-8") as f:
+        for line in f:
+            # Past the block size, wait for a blank line; past four times
+            # that, cut anyway
+            if size >= TEXT_BLOCK_CHARS and (not line.strip() or size >= 4 * TEXT_BLOCK_CHARS):
+                yield "".join(lines).strip("\n")
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line)
+    if lines:
+        yield "".join(lines).strip("\n")
+
+
+def iter_chunks(
+    pages: Iterator[tuple[str, int]],
+    chunk_size: int,
+    chunk_overlap: int,
+    timings: dict[str, float] | None = None,
+) -> Iterator[tuple[str, int]]:
+    """Split pages as one continuous text into (text, page) chunks.
+
+    Only the last, still growing chunk is carried over to the next page,
+    so chunks span page breaks with the usual overlap and memory does
+    not depend on the document length. A chunk's page is the one it
+    starts on. ``timings`` accumulates the "parse" and "split" seconds.
+    """
+    splitter = make_splitter(chunk_size, chunk_overlap)
+    timings = timings if timings is not None else {}
+    timings.setdefault("parse", 0.0)
+    timings.setdefault("split", 0.0)
+    carry, carry_page = "", 0
+    pages = iter(pages)
+    while True:
+        start = time.perf_counter()
+        page_text = next(pages, None)
+        timings["parse"] += time.perf_counter() - start
+        if page_text is None:
+            break
+        text, page = page_text
+        if not text.strip():
+            continue
+
+        start = time.perf_counter()
+        if carry:
+            buffer = carry + PAGE_SEPARATOR + text
+        else:
+            buffer, carry_page = text, page
+        pieces = splitter.split_text(buffer)
+        # Page of each piece: the carried text's up to where this page starts
+        located, offset = [], 0
+        for piece in pieces:
+            found = buffer.find(piece, offset)
+            position = found if found >= 0 else offset
+            located.append((piece, carry_page if position < len(carry) else page))
+            offset = position + 1
+        timings["split"] += time.perf_counter() - start
+        if not located:
+            continue
+        carry, carry_page = located.pop()
+        yield from located
+    if carry:
+        yield carry, carry_page
+
+
+class ChunkStream:
+    """Chunks of one file, produced a batch at a time in a worker thread."""
+
+    def __init__(self, file_path: Path, chunk_size: int, chunk_overlap: int):
+        self.timings: dict[str, float] = {}
+        self._chunks = iter_chunks(iter_pages(file_path), chunk_size, chunk_overlap, self.timings)
+
+    async def read(self, count: int) -> list[tuple[str, int]]:
+        """Up to ``count`` more chunks; empty at the end of the file."""
+        return await asyncio.to_thread(lambda: list(islice(self._chunks, count)))
+
+    def close(self) -> None:
+        try:
+            self._chunks.close()
+        except ValueError:
+            # A cancelled read is still running in its thread; the file is
+            # closed when the generator is collected
+            pass
+
+
+def split_file(
+    file_path: str, chunk_size: int, chunk_overlap: int,
+) -> tuple[list[tuple[str, int]], dict[str, float]]:
+    """Load and split one file into (text, page) pairs.
+
+    Module-level and free of app state so it can run in a worker process.
+    Also returns the parse and split times, since metrics recorded in a
+    worker process would be lost.
+    """
+    timings: dict[str, float] = {}
+    pages = iter_pages(Path(file_path))
+    return list(iter_chunks(pages, chunk_size, chunk_overlap, timings)), timings
@@ -0,0 +1,296 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+Recording a value is a dict lookup plus a few integer additions under a
+lock, so instrumenting the chat hot path costs well under a microsecond.
+Values are per process.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 100, 150, 200)
+COUNT_BUCKETS = (0, 16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _format_labels(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{self._format_labels(key)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        inf = 'le="+Inf"'
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{self._format_labels(key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{self._format_labels(key, inf)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets=buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+REGISTRY = Registry()
+
+# --- Chat ---
+CHAT_REQUESTS = REGISTRY.counter(
+    "ross_chat_requests_total",
+    "Chat requests by endpoint and outcome (cached: true, false or coalesced).",
+    ("endpoint", "cached"),
+)
+QUERY_EMBED_SECONDS = REGISTRY.histogram(
+    "ross_query_embed_seconds", "Time to embed the user question.",
+)
+RETRIEVAL_SECONDS = REGISTRY.histogram(
+    "ross_retrieval_seconds", "Vector store search time (vector, lexical or hybrid).", ("mode",),
+)
+RERANK_SECONDS = REGISTRY.histogram(
+    "ross_rerank_seconds", "MMR, neighbour merging and context budgeting time.",
+)
+PROMPT_BUILD_SECONDS = REGISTRY.histogram(
+    "ross_prompt_build_seconds", "Time to assemble the context and prompt.",
+)
+TIME_TO_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "ross_time_to_first_token_seconds",
+    "From receiving the question to the first generated token.", ("model",),
+)
+CHAT_DURATION_SECONDS = REGISTRY.histogram(
+    "ross_chat_duration_seconds", "Total chat request duration.", ("model", "cached"),
+)
+GENERATED_TOKENS = REGISTRY.counter(
+    "ross_generated_tokens_total", "Streamed tokens by kind (thinking or response).",
+    ("model", "kind"),
+)
+TOKENS_PER_SECOND = REGISTRY.histogram(
+    "ross_tokens_per_second", "Generation speed reported by Ollama (eval_count / eval_duration).",
+    ("model",), buckets=RATE_BUCKETS,
+)
+
+# --- Generation scheduler ---
+GENERATION_QUEUE_SECONDS = REGISTRY.histogram(
+    "ross_generation_queue_seconds", "Time waiting for a generation slot.", ("model", "priority"),
+)
+GENERATION_REJECTED = REGISTRY.counter(
+    "ross_generation_rejected_total", "Requests refused with 429 because the queue was full.",
+    ("model", "priority"),
+)
+GENERATION_CANCELLED = REGISTRY.counter(
+    "ross_generation_cancelled_total", "Generations abandoned because the client disconnected.",
+    ("model",),
+)
+GENERATION_SLOTS = REGISTRY.gauge(
+    "ross_generation_slots", "Generations running and waiting per model (set when scraped).",
+    ("model", "state"),
+)
+
+EMBED_BATCH_SIZE = REGISTRY.histogram(
+    "ross_embed_batch_size", "Distinct texts per batched query-embedding request.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+# --- Chat sessions ---
+SESSION_CONDENSE_SECONDS = REGISTRY.histogram(
+    "ross_session_condense_seconds", "Time to rewrite a follow-up as a standalone question.",
+)
+SESSION_COMPACTIONS = REGISTRY.counter(
+    "ross_session_compactions_total",
+    "Older session turns folded into the summary (summarized) or discarded (dropped).",
+    ("outcome",),
+)
+SESSIONS_ACTIVE = REGISTRY.gauge("ross_sessions_active", "Chat sessions in memory (set when scraped).")
+
+# --- Ollama-reported generation stats ---
+OLLAMA_DURATION_SECONDS = REGISTRY.histogram(
+    "ross_ollama_duration_seconds",
+    "Durations reported by Ollama: total, load, prompt_eval and eval.", ("model", "phase"),
+)
+OLLAMA_TOKENS = REGISTRY.counter(
+    "ross_ollama_tokens_total", "Tokens reported by Ollama: prompt_eval and eval.",
+    ("model", "phase"),
+)
+OLLAMA_PROMPT_TOKENS = REGISTRY.histogram(
+    "ross_ollama_prompt_tokens", "Prompt size per generation (prompt_eval_count).",
+    ("model",), buckets=COUNT_BUCKETS,
+)
+
+OLLAMA_FAILOVERS = REGISTRY.counter(
+    "ross_ollama_failovers_total", "Requests moved to another host because one was unreachable.",
+    ("pool",),
+)
+OLLAMA_HOSTS = REGISTRY.gauge(
+    "ross_ollama_host", "Per-host state: healthy (0/1) and outstanding requests (set when scraped).",
+    ("pool", "host", "state"),
+)
+
+# --- Model residency ---
+MODEL_EVENTS = REGISTRY.counter(
+    "ross_model_events_total",
+    "Models loaded into or unloaded from Ollama, by what caused it "
+    "(request, pin, ui, startup, external or expired).", ("model", "event", "trigger"),
+)
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "ross_model_load_seconds", "Model load time reported by Ollama (load_duration).",
+    ("model", "trigger"),
+)
+MODEL_RESIDENT = REGISTRY.gauge(
+    "ross_model_resident", "Hosts with the model loaded, as of the last /api/ps poll (set when scraped).",
+    ("model",),
+)
+
+# --- Ingestion ---
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "ross_ingest_stage_seconds", "Ingestion time per stage: parse, split, embed, write.",
+    ("stage",),
+)
+INGEST_CHUNKS = REGISTRY.counter("ross_ingest_chunks_total", "Chunks written to the vector store.")
+INGEST_FILES = REGISTRY.counter(
+    "ross_ingest_files_total", "Ingested files by outcome (ok or error).", ("outcome",),
+)
+
+# --- Process ---
+STARTUP_SECONDS = REGISTRY.gauge(
+    "ross_startup_seconds",
+    "Worker startup time by phase: import, services, warmup and ready (the total).", ("phase",),
+)
+
+# --- Caches (set when /metrics is scraped) ---
+CACHE_EVENTS = REGISTRY.gauge(
+    "ross_cache_events", "Cumulative cache lookups by cache and result.", ("cache", "result"),
+)
+
+
+def observe_ollama_stats(model: str, stats: dict) -> None:
+    """Aggregate the timing/token fields of Ollama's final stream message."""
+    for phase in ("total", "load", "prompt_eval", "eval"):
+        duration = stats.get(f"{phase}_duration")
+        if duration is not None:
+            OLLAMA_DURATION_SECONDS.observe(duration / 1e9, model=model, phase=phase)
+    for phase in ("prompt_eval", "eval"):
+        count = stats.get(f"{phase}_count")
+        if count is not None:
+            OLLAMA_TOKENS.inc(count, model=model, phase=phase)
+    if "prompt_eval_count" in stats:
+        OLLAMA_PROMPT_TOKENS.observe(stats["prompt_eval_count"], model=model)
+    if stats.get("eval_count") and stats.get("eval_duration"):
+        TOKENS_PER_SECOND.observe(stats["eval_count"] / (stats["eval_duration"] / 1e9), model=model)
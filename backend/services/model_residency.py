@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, time as day_time, timedelta, timezone
+
+import httpx
+
+from backend.services.leases import Lease
+from backend.services.metrics import MODEL_EVENTS, MODEL_LOAD_SECONDS
+from backend.services.ollama_client import OllamaClient
+from backend.services.ollama_pool import HostPool, model_name
+from backend.services.prompt_builder import PromptBuilder
+from config.settings import get_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+PIN_POLICIES = ("always", "schedule", "traffic", "off")
+# Ollama reports a few milliseconds of load_duration for a model that is
+# already in memory; anything longer is a real load
+LOAD_THRESHOLD = 0.5
+MAX_EVENTS = 200
+
+
+@dataclass
+class ModelEvent:
+    at: datetime
+    event: str  # loaded | unloaded
+    model: str
+    host: str
+    # request, pin, ui, startup, external (seen in /api/ps, loaded by
+    # another worker or client) or expired
+    trigger: str
+    seconds: float | None = None
+
+
+def parse_hours(hours: str) -> tuple[day_time, day_time]:
+    """"07:00-19:00" -> (07:00, 19:00). The end may be before the start (overnight)."""
+    try:
+        start, end = (day_time.fromisoformat(part.strip()) for part in hours.split("-"))
+    except ValueError:
+        raise ValueError(f"Horario no válido: {hours!r} (usa HH:MM-HH:MM)") from None
+    return start, end
+
+
+def expires_at(value: str | None) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class ModelResidency:
+    """Tracks which models Ollama has loaded and keeps the default ones there.
+
+    Every ``interval`` seconds the hosts' /api/ps is polled; models that
+    appeared or disappeared since the last poll become events, as do the
+    loads reported by responses (``load_duration``). While the pin policy
+    applies, the default LLM and embedding model are warmed on every host
+    where they are missing or due to unload before the next poll, which
+    also refreshes their keep_alive. Outside it they unload on their own.
+
+    With several server workers, only the one holding the residency lease
+    polls and pins; the others report no hosts.
+    """
+
+    def __init__(self, ollama: OllamaClient, prompt_builder: PromptBuilder):
+        settings = get_settings()
+        if settings.model_pin_policy not in PIN_POLICIES:
+            raise ValueError(
+                f"Política de residencia no soportada: {settings.model_pin_policy} (usa {', '.join(PIN_POLICIES)})"
+            )
+        self._ollama = ollama
+        self._prompt_builder = prompt_builder
+        self.interval = settings.model_residency_interval
+        self.policy = settings.model_pin_policy
+        self.hours = parse_hours(settings.model_pin_hours)
+        self.weekdays = set(settings.model_pin_weekdays)
+        self.idle_seconds = settings.model_pin_idle_minutes * 60
+        self.keep_alive = settings.ollama_keep_alive
+        self.llm_model = settings.llm_model
+        self.embedding_model = settings.embedding_model
+        # Host URL -> {model: expires_at} from the last poll, plus the loads
+        # seen since. Unreachable hosts are left out.
+        self.loaded: dict[str, dict[str, str | None]] = {}
+        self.events: deque[ModelEvent] = deque(maxlen=MAX_EVENTS)
+        # Every model seen loaded, so unloaded ones report 0 hosts
+        self._seen: set[str] = set()
+        # (host, model) that appeared in the last poll with no load seen yet;
+        # a request still generating reports its load only when it ends
+        self._unexplained: set[tuple[str, str]] = set()
+        self._warming: dict[str, asyncio.Task] = {}
+        # One poll-and-pin at a time, so startup and the loop don't load twice
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # Renewed on every refresh; outlives a slow one (a model loading)
+        self._lease = Lease("model-residency", ttl=2 * self.interval + settings.ollama_warmup_timeout)
+        ollama.on_load = self.record_load
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="model-residency")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in self._warming.values():
+            task.cancel()
+        await asyncio.gather(*self._warming.values(), return_exceptions=True)
+        self._lease.release()
+        self._lease.close()
+
+    def pinning(self, now: datetime | None = None) -> bool:
+        """Whether the policy wants the default models loaded right now."""
+        if self.policy == "always":
+            return True
+        if self.policy == "schedule":
+            now = now or datetime.now()
+            start, end = self.hours
+            moment = now.time()
+            within = start <= moment < end if start <= end else moment >= start or moment < end
+            return within and now.weekday() in self.weekdays
+        if self.policy == "traffic":
+            last = max(self._ollama.last_used.values(), default=None)
+            return last is not None and time.monotonic() - last <= self.idle_seconds
+        return False
+
+    def record_load(self, host: str, model: str, seconds: float, trigger: str) -> None:
+        model = model_name(model)
+        self._seen.add(model)
+        self._unexplained.discard((host, model))
+        if host in self.loaded:
+            self.loaded[host].setdefault(model, None)
+        if seconds < LOAD_THRESHOLD:
+            return
+        MODEL_LOAD_SECONDS.observe(seconds, model=model, trigger=trigger)
+        self._event("loaded", model, host, trigger, seconds)
+
+    def _event(self, event: str, model: str, host: str, trigger: str, seconds: float | None = None) -> None:
+        self.events.append(ModelEvent(datetime.now(timezone.utc), event, model, host, trigger, seconds))
+        MODEL_EVENTS.inc(model=model, event=event, trigger=trigger)
+        if event == "loaded":
+            logger.info(
+                "Modelo %s cargado en %s (%s%s)", model, host, trigger,
+                f", {seconds:.1f} s" if seconds is not None else "",
+            )
+        else:
+            logger.info("Modelo %s descargado de %s", model, host)
+
+    async def poll(self) -> None:
+        """Read /api/ps from every host and record what changed."""
+        try:
+            loaded = await self._ollama.loaded_models()
+        except httpx.HTTPError as e:
+            logger.warning("No se pudo consultar los modelos cargados: %s", e)
+            return
+        for host, model in self._unexplained:
+            if model in loaded.get(host, ()):
+                self._event("loaded", model, host, "external")
+        self._unexplained = set()
+        for host, models in loaded.items():
+            before = self.loaded.get(host)
+            if before is None:
+                continue
+            self._unexplained.update((host, m) for m in models.keys() - before.keys())
+            for model in before.keys() - models.keys():
+                self._event("unloaded", model, host, "expired")
+        self.loaded = loaded
+        self._seen.update(m for models in loaded.values() for m in models)
+
+    def _stale_hosts(self, model: str, pool: HostPool) -> list[str]:
+        """Reachable hosts of ``pool`` where ``model`` is missing or unloads before the next poll."""
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=2 * self.interval)
+        model = model_name(model)
+        stale = []
+        for host in pool.hosts:
+            models = self.loaded.get(host.url)
+            if models is None:
+                continue
+            if model not in models:
+                stale.append(host.url)
+                continue
+            until = expires_at(models[model])
+            if until is not None and until < horizon:
+                stale.append(host.url)
+        return stale
+
+    async def refresh(self, trigger: str = "pin", force: bool = False) -> None:
+        """Poll the hosts, then warm the default models if the policy (or ``force``) wants them.
+
+        Does nothing in a process that does not hold the residency lease.
+        """
+        async with self._lock:
+            if not self._lease.acquire():
+                return
+            await self.poll()
+            if force or self.pinning():
+                await self.pin(trigger)
+
+    async def pin(self, trigger: str = "pin") -> None:
+        """Warm the default models wherever they are missing or about to unload."""
+
+        async def keep(model: str, pool: HostPool) -> None:
+            if not self._stale_hosts(model, pool):
+                return
+            try:
+                await self._load(model, trigger, all_hosts=True)
+            except httpx.HTTPError as e:
+                logger.warning("No se pudo mantener cargado %s: %s", model, e)
+
+        await asyncio.gather(
+            keep(self.llm_model, self._ollama.generate_pool),
+            keep(self.embedding_model, self._ollama.embed_pool),
+        )
+
+    async def warm(self, model: str, trigger: str = "ui") -> None:
+        """Load ``model`` ahead of use unless a host already has it for a while.
+
+        Concurrent calls for the same model share a single load.
+        """
+        pool = self._ollama.embed_pool if model == self.embedding_model else self._ollama.generate_pool
+        reachable = [h for h in pool.hosts if h.url in self.loaded]
+        if reachable and len(self._stale_hosts(model, pool)) < len(reachable):
+            return
+        task = self._warming.get(model)
+        if task is None:
+            task = asyncio.create_task(self._load(model, trigger))
+            self._warming[model] = task
+            task.add_done_callback(lambda _: self._warming.pop(model, None))
+        await asyncio.shield(task)
+
+    async def _load(self, model: str, trigger: str, all_hosts: bool = False) -> None:
+        if model == self.embedding_model:
+            await self._ollama.warmup_embedding(
+                model, keep_alive=self.keep_alive, all_hosts=all_hosts, trigger=trigger,
+            )
+        else:
+            await self._ollama.warmup(
+                model, keep_alive=self.keep_alive,
+                options={"num_ctx": self._prompt_builder.num_ctx(model)},
+                all_hosts=all_hosts, trigger=trigger,
+            )
+
+    def resident(self) -> dict[str, int]:
+        """Hosts with each model loaded, as last seen."""
+        return {m: sum(m in models for models in self.loaded.values()) for m in sorted(self._seen)}
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            # Whether this server worker is the one tracking and pinning
+            "leader": self._lease.held,
+            "pinning": self.pinning(),
+            "pinned": [model_name(self.llm_model), model_name(self.embedding_model)],
+            "hosts": {
+                host: [{"model": m, "expires_at": until} for m, until in sorted(models.items())]
+                for host, models in self.loaded.items()
+            },
+            # Newest first
+            "events": [asdict(e) for e in reversed(self.events)],
+        }
+
+    async def _run(self) -> None:
+        # Let the startup warm-up, scheduled right after start(), go first
+        await asyncio.sleep(0)
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # A bad /api/ps reply, the lease database... try again next round
+                logger.exception("Fallo al revisar los modelos cargados")
+            await asyncio.sleep(self.interval)
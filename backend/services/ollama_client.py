@@ -1,57 +1,271 @@
+import asyncio
 import json
-from collections.abc import AsyncIterator
+import time
+from collections.abc import AsyncIterator, Callable
 
 import httpx
 
+from backend.services.embed_batcher import EmbeddingBatcher
+from backend.services.embedding_cache import EmbeddingCache, get_embedding_cache
+from backend.services.metrics import OLLAMA_FAILOVERS, observe_ollama_stats
+from backend.services.ollama_pool import FAILOVER_ERRORS, HostPool, OllamaHost, model_name
 from config.settings import get_settings
 
+# HTTP/2 support is optional (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def _no_hosts(pool: HostPool) -> httpx.ConnectError:
+    return httpx.ConnectError(f"No hay hosts de Ollama disponibles ({pool.name})")
+
+
+def _timeout(seconds: float) -> httpx.Timeout:
+    settings = get_settings()
+    return httpx.Timeout(
+        seconds,
+        connect=settings.ollama_connect_timeout,
+        pool=settings.ollama_pool_timeout,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared, pooled HTTP client used for every Ollama call."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        settings = get_settings()
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.ollama_max_connections,
+                max_keepalive_connections=settings.ollama_max_keepalive_connections,
+                keepalive_expiry=settings.ollama_keepalive_expiry,
+            ),
+            timeout=_timeout(settings.ollama_generate_timeout),
+            http2=settings.ollama_http2 and HAS_HTTP2,
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 class OllamaClient:
-    def __init__(self):
+    """Ollama API over one or more hosts.
+
+    Generation and embeddings are routed through separate host pools
+    (``ollama_generate_urls`` / ``ollama_embed_urls``, both defaulting
+    to ``ollama_base_url``). A request that cannot reach a host is
+    retried on the next one; see HostPool for the routing rules.
+    """
+
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+    ):
         settings = get_settings()
-        self.base_url = settings.ollama_base_url
         self.llm_model = settings.llm_model
         self.embedding_model = settings.embedding_model
+        self._settings = settings
+        self._http_client = http_client
+        self.generate_pool = HostPool(
+            "generate", settings.ollama_generate_urls or [settings.ollama_base_url],
+            affinity=settings.ollama_affinity_requests, max_failures=settings.ollama_eject_after_failures,
+        )
+        self.embed_pool = HostPool(
+            "embed", settings.ollama_embed_urls or [settings.ollama_base_url],
+            affinity=settings.ollama_affinity_requests, max_failures=settings.ollama_eject_after_failures,
+        )
+        self.embedding_cache = embedding_cache or get_embedding_cache()
+        # Concurrent query embeddings go to Ollama as one batch
+        self._batcher = EmbeddingBatcher(self._embed_uncached) if settings.embed_batching_enabled else None
+        # Monotonic time of the last generation or embedding request per model
+        self.last_used: dict[str, float] = {}
+        # Called as on_load(host_url, model, seconds, trigger) with the
+        # load_duration of every response (ModelResidency records the loads)
+        self.on_load: Callable[[str, str, float, str], None] | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._http_client or get_http_client()
+
+    async def aclose(self) -> None:
+        """Cancel pending embedding batches. The shared HTTP client stays open."""
+        if self._batcher is not None:
+            await self._batcher.aclose()
+
+    async def _request(
+        self, pool: HostPool, method: str, path: str, timeout: float,
+        model: str | None = None, payload: dict | None = None,
+    ) -> httpx.Response:
+        """Send to the best host of ``pool``, moving on to the next if unreachable.
+
+        The serving host's URL is left in ``resp.extensions["host"]``.
+        """
+        error = None
+        for host in pool.candidates(model):
+            with pool.lease(host):
+                try:
+                    resp = await self.client.request(
+                        method, f"{host.url}{path}", json=payload, timeout=_timeout(timeout),
+                    )
+                except FAILOVER_ERRORS as e:
+                    pool.failed(host)
+                    OLLAMA_FAILOVERS.inc(pool=pool.name)
+                    error = e
+                    continue
+            pool.succeeded(host, model if resp.is_success else None)
+            resp.raise_for_status()
+            resp.extensions["host"] = host.url
+            return resp
+        raise error if error is not None else _no_hosts(pool)
+
+    def _used(self, host: str, model: str, data: dict, trigger: str = "request") -> None:
+        """Note a response from ``host``: when the model was used and its load time."""
+        if trigger == "request":
+            self.last_used[model] = time.monotonic()
+        if self.on_load is not None and "load_duration" in data:
+            self.on_load(host, model, data["load_duration"] / 1e9, trigger)
 
     async def health_check(self) -> bool:
+        """At least one host of each pool answers."""
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{self.base_url}/api/tags", timeout=5.0
-                )
-                return resp.status_code == 200
-        except httpx.ConnectError:
+            await self.running_models()
+        except httpx.HTTPError:
             return False
+        return any(h.healthy for h in self.generate_pool.hosts) and any(
+            h.healthy for h in self.embed_pool.hosts
+        )
 
     async def list_models(self) -> list[dict]:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.base_url}/api/tags", timeout=10.0
-            )
-            resp.raise_for_status()
+        resp = await self._request(
+            self.generate_pool, "GET", "/api/tags", self._settings.ollama_list_timeout,
+        )
+        data = resp.json()
+        THINKING_FAMILIES = {"qwen3", "qwen35"}
+        return [
+            {
+                "name": m["name"],
+                "size": m.get("details", {}).get("parameter_size", ""),
+                "thinks": m.get("details", {}).get("family", "") in THINKING_FAMILIES,
+            }
+            for m in data.get("models", [])
+        ]
+
+    async def running_models(self) -> list[str]:
+        """Names of the models loaded on any host (/api/ps)."""
+        loaded = await self.loaded_models()
+        return sorted({m for models in loaded.values() for m in models})
+
+    async def loaded_models(self) -> dict[str, dict[str, str | None]]:
+        """Models loaded per reachable host, with when each unloads.
+
+        Maps host URL to ``{model: expires_at}`` (ISO time, or None if
+        Ollama does not say). Also the pools' health check: unreachable
+        hosts are ejected, reachable ones re-admitted and their loaded
+        models recorded. Raises if no host answers.
+        """
+        urls = list(dict.fromkeys(h.url for h in self.generate_pool.hosts + self.embed_pool.hosts))
+        results = await asyncio.gather(*(self._ps(url) for url in urls), return_exceptions=True)
+        loaded = dict(zip(urls, results))
+        for pool in (self.generate_pool, self.embed_pool):
+            for host in pool.hosts:
+                result = loaded[host.url]
+                pool.checked(host, None if isinstance(result, BaseException) else list(result))
+
+        if all(isinstance(r, BaseException) for r in results):
+            raise results[0]
+        return {url: r for url, r in loaded.items() if not isinstance(r, BaseException)}
+
+    async def _ps(self, url: str) -> dict[str, str | None]:
+        resp = await self.client.get(f"{url}/api/ps", timeout=_timeout(self._settings.ollama_health_timeout))
+        resp.raise_for_status()
+        return {model_name(m["name"]): m.get("expires_at") for m in resp.json().get("models", [])}
+
+    async def warmup(
+        self, model: str, keep_alive: str = "30m", options: dict | None = None, all_hosts: bool = False,
+        trigger: str = "warmup",
+    ) -> None:
+        """Load a model into Ollama memory without generating anything.
+
+        Pass the same ``num_ctx`` as generation, or Ollama reloads the
+        model on the first real request. Loads it on the host that would
+        serve it next, or on every generation host with ``all_hosts``.
+        ``trigger`` labels the load, if there is one, for ``on_load``.
+        """
+        payload = {
+            "model": model,
+            "messages": [],
+            "stream": False,
+            "keep_alive": keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        await self._warmup(self.generate_pool, "/api/chat", model, payload, all_hosts, trigger)
+
+    async def warmup_embedding(
+        self, model: str | None = None, keep_alive: str = "30m", all_hosts: bool = False,
+        trigger: str = "warmup",
+    ) -> None:
+        """Load the embedding model into Ollama memory."""
+        model = model or self.embedding_model
+        payload = {"model": model, "input": "warmup", "keep_alive": keep_alive}
+        await self._warmup(self.embed_pool, "/api/embed", model, payload, all_hosts, trigger)
+
+    async def _warmup(
+        self, pool: HostPool, path: str, model: str, payload: dict, all_hosts: bool, trigger: str,
+    ) -> None:
+        timeout = self._settings.ollama_warmup_timeout
+
+        def used(host: str, resp: httpx.Response, start: float) -> None:
+            # A load-only chat reply has no load_duration: the request took the load time
             data = resp.json()
-            THINKING_FAMILIES = {"qwen3", "qwen35"}
-            return [
-                {
-                    "name": m["name"],
-                    "size": m.get("details", {}).get("parameter_size", ""),
-                    "thinks": m.get("details", {}).get("family", "") in THINKING_FAMILIES,
-                }
-                for m in data.get("models", [])
-            ]
+            data.setdefault("load_duration", int((time.perf_counter() - start) * 1e9))
+            self._used(host, model, data, trigger)
+
+        if not all_hosts:
+            start = time.perf_counter()
+            resp = await self._request(pool, "POST", path, timeout, model=model, payload=payload)
+            used(resp.extensions["host"], resp, start)
+            return
+
+        async def load(host: OllamaHost) -> None:
+            start = time.perf_counter()
+            resp = await self.client.post(f"{host.url}{path}", json=payload, timeout=_timeout(timeout))
+            resp.raise_for_status()
+            pool.succeeded(host, model)
+            used(host.url, resp, start)
+
+        results = await asyncio.gather(*(load(h) for h in pool.hosts), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if len(errors) == len(results):
+            raise errors[0] if errors else _no_hosts(pool)
 
     async def generate_stream(
         self, prompt: str, system: str = "", model: str | None = None,
-        think: bool = True,
+        think: bool = True, options: dict | None = None, history: list[dict] | None = None,
     ) -> AsyncIterator[dict]:
         """Stream LLM response using Ollama /api/chat.
 
-        Yields dicts: type='thinking' | 'response' | 'stats'.
+        ``history`` messages go between the system prompt and ``prompt``.
+        Yields dicts: type='thinking' | 'response' | 'stats'. Fails over
+        to another host only before the first token.
         """
         model = model or self.llm_model
         messages = []
         if system:
             messages.append({"role": "system", "content": system})
+        messages.extend(history or [])
         messages.append({"role": "user", "content": prompt})
 
         payload = {
@@ -59,71 +273,114 @@ class OllamaClient:
             "messages": messages,
             "stream": True,
             "think": think,
+            "keep_alive": self._settings.ollama_keep_alive,
         }
+        if options:
+            payload["options"] = options
 
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/api/chat",
-                json=payload,
-                timeout=httpx.Timeout(connect=10.0, read=300.0, write=10.0, pool=10.0),
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if not line:
-                        continue
-                    data = json.loads(line)
-                    msg = data.get("message", {})
-                    thinking = msg.get("thinking", "")
-                    token = msg.get("content", "")
-                    if thinking:
-                        yield {"token": thinking, "type": "thinking"}
-                    if token:
-                        yield {"token": token, "type": "response"}
-                    if data.get("done", False):
-                        stats = {}
-                        for key in (
-                            "total_duration", "load_duration",
-                            "prompt_eval_count", "prompt_eval_duration",
-                            "eval_count", "eval_duration",
-                        ):
-                            if key in data:
-                                stats[key] = data[key]
-                        if stats:
-                            yield {"type": "stats", "stats": stats}
+        error = None
+        for host in self.generate_pool.candidates(model):
+            started = False
+            with self.generate_pool.lease(host):
+                try:
+                    async with self.client.stream(
+                        "POST",
+                        f"{host.url}/api/chat",
+                        json=payload,
+                        timeout=_timeout(self._settings.ollama_generate_timeout),
+                    ) as response:
+                        response.raise_for_status()
+                        self.generate_pool.succeeded(host, model)
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            started = True
+                            data = json.loads(line)
+                            msg = data.get("message", {})
+                            thinking = msg.get("thinking", "")
+                            token = msg.get("content", "")
+                            if thinking:
+                                yield {"token": thinking, "type": "thinking"}
+                            if token:
+                                yield {"token": token, "type": "response"}
+                            if data.get("done", False):
+                                stats = {}
+                                for key in (
+                                    "total_duration", "load_duration",
+                                    "prompt_eval_count", "prompt_eval_duration",
+                                    "eval_count", "eval_duration",
+                                ):
+                                    if key in data:
+                                        stats[key] = data[key]
+                                self._used(host.url, model, stats)
+                                if stats:
+                                    observe_ollama_stats(model, stats)
+                                    yield {"type": "stats", "stats": stats}
+                                return
                         return
+                except FAILOVER_ERRORS as e:
+                    if started:
+                        raise
+                    self.generate_pool.failed(host)
+                    OLLAMA_FAILOVERS.inc(pool=self.generate_pool.name)
+                    error = e
+        raise error if error is not None else _no_hosts(self.generate_pool)
 
     async def generate(
-        self, prompt: str, system: str = "", model: str | None = None
+        self, prompt: str, system: str = "", model: str | None = None,
+        think: bool = True, options: dict | None = None, history: list[dict] | None = None,
     ) -> str:
         tokens = []
-        async for chunk in self.generate_stream(prompt, system, model):
+        async for chunk in self.generate_stream(
+            prompt, system, model, think=think, options=options, history=history,
+        ):
             if chunk["type"] == "response":
                 tokens.append(chunk["token"])
         return "".join(tokens)
 
     async def embed(self, text: str, model: str | None = None) -> list[float]:
         model = model or self.embedding_model
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{self.base_url}/api/embed",
-                json={"model": model, "input": text},
-                timeout=30.0,
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(model, text)
+            if cached is not None:
+                return cached
+
+        if self._batcher is not None:
+            embedding = await self._batcher.embed(text, model)
+        else:
+            resp = await self._request(
+                self.embed_pool, "POST", "/api/embed", self._settings.ollama_embed_timeout,
+                model=model, payload={"model": model, "input": text, "keep_alive": self._settings.ollama_keep_alive},
             )
-            resp.raise_for_status()
             data = resp.json()
-            return data["embeddings"][0]
+            self._used(resp.extensions["host"], model, data)
+            embedding = data["embeddings"][0]
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(model, text, embedding)
+        return embedding
 
     async def embed_batch(
         self, texts: list[str], model: str | None = None
     ) -> list[list[float]]:
         model = model or self.embedding_model
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{self.base_url}/api/embed",
-                json={"model": model, "input": texts},
-                timeout=120.0,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["embeddings"]
+        if self.embedding_cache is None:
+            return await self._embed_uncached(texts, model)
+
+        results = self.embedding_cache.get_many(model, texts)
+        # Only send each distinct missing text once
+        missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if missing:
+            embeddings = await self._embed_uncached(missing, model)
+            self.embedding_cache.put_many(model, missing, embeddings)
+            fetched = dict(zip(missing, embeddings))
+            results = [r if r is not None else fetched[t] for t, r in zip(texts, results)]
+        return results
+
+    async def _embed_uncached(self, texts: list[str], model: str) -> list[list[float]]:
+        resp = await self._request(
+            self.embed_pool, "POST", "/api/embed", self._settings.ollama_embed_batch_timeout,
+            model=model, payload={"model": model, "input": texts, "keep_alive": self._settings.ollama_keep_alive},
+        )
+        data = resp.json()
+        self._used(resp.extensions["host"], model, data)
+        return data["embeddings"]
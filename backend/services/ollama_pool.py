@@ -0,0 +1,96 @@
+import itertools
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import httpx
+
+# Errors that mean the host is unreachable or dropped the connection, so
+# the request never ran there and can be sent to another host. Read
+# timeouts are not here: a slow answer may just be a model loading.
+FAILOVER_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+
+def model_name(name: str) -> str:
+    """Name as /api/ps reports it: "bge-m3" is "bge-m3:latest"."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaHost:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        # Models Ollama has in memory here, from /api/ps and recent requests
+        self.models: set[str] = set()
+
+
+class HostPool:
+    """Ollama hosts serving one kind of traffic (generation or embeddings).
+
+    Requests go to the host with the fewest outstanding requests; hosts
+    that already have the model loaded count ``affinity`` requests less,
+    since loading a model costs seconds. A host is ejected after
+    ``max_failures`` connection errors in a row and re-admitted when a
+    health check reaches it. If every host is ejected, all are tried.
+    """
+
+    def __init__(self, name: str, urls: list[str], affinity: int = 2, max_failures: int = 2):
+        self.name = name
+        self.hosts = [OllamaHost(url) for url in dict.fromkeys(urls)]
+        self.affinity = affinity
+        self.max_failures = max_failures
+        self._rotation = itertools.count()
+
+    def candidates(self, model: str | None = None) -> list[OllamaHost]:
+        """Hosts to try, best first: healthy ones ranked, then the ejected."""
+        turn = next(self._rotation)
+        healthy = [h for h in self.hosts if h.healthy] or self.hosts
+
+        def rank(i: int) -> tuple[int, int]:
+            host = healthy[i]
+            penalty = 0 if model is None or model_name(model) in host.models else self.affinity
+            # Rotate ties so idle hosts share the traffic
+            return host.outstanding + penalty, (i - turn) % len(healthy)
+
+        ranked = [healthy[i] for i in sorted(range(len(healthy)), key=rank)]
+        return ranked + [h for h in self.hosts if h not in ranked]
+
+    @contextmanager
+    def lease(self, host: OllamaHost) -> Iterator[OllamaHost]:
+        host.outstanding += 1
+        try:
+            yield host
+        finally:
+            host.outstanding -= 1
+
+    def succeeded(self, host: OllamaHost, model: str | None = None) -> None:
+        host.failures = 0
+        host.healthy = True
+        if model:
+            host.models.add(model_name(model))
+
+    def failed(self, host: OllamaHost) -> None:
+        host.failures += 1
+        if host.failures >= self.max_failures:
+            host.healthy = False
+
+    def checked(self, host: OllamaHost, models: list[str] | None) -> None:
+        """Record a health check: ``models`` loaded, or None if unreachable."""
+        if models is None:
+            host.healthy = False
+            return
+        host.healthy = True
+        host.failures = 0
+        host.models = {model_name(m) for m in models}
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "url": h.url,
+                "healthy": h.healthy,
+                "outstanding": h.outstanding,
+                "models": sorted(h.models),
+            }
+            for h in self.hosts
+        ]
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from backend.prompts.templates import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE
+from config.settings import get_settings
+
+# Characters per token for Spanish text, by model family (name prefix).
+# Conservative: overestimating tokens only costs some context.
+CHARS_PER_TOKEN = {
+    "qwen": 3.4,
+    "deepseek": 3.4,
+    "llama3": 3.5,
+    "gemma": 3.6,
+    "mistral": 2.9,
+    "mixtral": 2.9,
+    "phi": 2.8,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.0
+MIN_CHARS_PER_TOKEN = 2.0
+
+# Role markers and special tokens the chat template adds around messages
+CHAT_TEMPLATE_TOKENS = 32
+# ... and around each extra history message
+MESSAGE_TOKENS = 8
+
+NO_CONTEXT = "No se encontró información relevante en los documentos."
+
+
+class TokenEstimator:
+    """Per-model token counts from a characters-per-token ratio.
+
+    Starts from the model family's ratio and only ever tightens it when
+    Ollama reports more prompt tokens than estimated. Reports of fewer
+    tokens are ignored, since a reused KV cache also lowers
+    prompt_eval_count.
+    """
+
+    def __init__(self, overrides: dict[str, float] | None = None):
+        self._ratios: dict[str, float] = dict(overrides or {})
+
+    def ratio(self, model: str) -> float:
+        ratio = self._ratios.get(model)
+        if ratio is None:
+            name = model.lower()
+            ratio = next(
+                (r for prefix, r in CHARS_PER_TOKEN.items() if name.startswith(prefix)),
+                DEFAULT_CHARS_PER_TOKEN,
+            )
+            self._ratios[model] = ratio
+        return ratio
+
+    def count(self, text: str, model: str) -> int:
+        return int(len(text) / self.ratio(model)) + 1
+
+    def observe(self, model: str, chars: int, prompt_tokens: int | None) -> None:
+        if not prompt_tokens or prompt_tokens <= 0 or chars <= 0:
+            return
+        observed = chars / prompt_tokens
+        if observed < self.ratio(model):
+            self._ratios[model] = max(observed, MIN_CHARS_PER_TOKEN)
+
+
+@dataclass
+class Prompt:
+    system: str
+    user: str
+    sources: set[str]
+    options: dict
+    budget: dict = field(default_factory=dict)
+    history: list[dict] = field(default_factory=list)
+
+    @property
+    def chars(self) -> int:
+        return len(self.system) + len(self.user) + sum(len(m["content"]) for m in self.history)
+
+
+class PromptBuilder:
+    """Fits retrieved chunks into the model's context window.
+
+    The context gets what ``num_ctx`` leaves after the system prompt, the
+    question and the room reserved for the answer, capped at
+    ``context_max_tokens``. Chunks are kept in relevance order until the
+    budget is used up, then laid out so prompts share long prefixes:
+    the system prompt first, then chunks that keep being retrieved in a
+    fixed order, then the rest. Ollama reuses its KV cache for a shared
+    prefix, so a popular chunk is not evaluated again on every question.
+    """
+
+    def __init__(self, estimator: TokenEstimator | None = None):
+        settings = get_settings()
+        self._settings = settings
+        self.estimator = estimator or TokenEstimator(settings.llm_chars_per_token)
+        self.hot_min_hits = settings.prompt_hot_chunk_min_hits
+        self._hits: OrderedDict[str, int] = OrderedDict()
+        self._max_tracked = settings.prompt_hot_chunk_tracked
+
+    def num_ctx(self, model: str) -> int:
+        return self._settings.llm_num_ctx_per_model.get(model, self._settings.llm_num_ctx)
+
+    def build(
+        self, question: str, hits: list[dict], model: str, history: list[dict] | None = None,
+    ) -> Prompt:
+        """``history``: earlier conversation messages, sent before the question."""
+        settings = self._settings
+        count = self.estimator.count
+        history = history or []
+        num_ctx = self.num_ctx(model)
+        system_tokens = count(SYSTEM_PROMPT, model)
+        frame_tokens = count(USER_PROMPT_TEMPLATE.format(context="", question=question), model)
+        history_tokens = sum(count(m["content"], model) + MESSAGE_TOKENS for m in history)
+        available = (
+            num_ctx - settings.prompt_reserve_tokens - system_tokens - frame_tokens
+            - history_tokens - CHAT_TEMPLATE_TOKENS
+        )
+        budget = max(0, min(settings.context_max_tokens, available))
+
+        kept, used, truncated = [], 0, False
+        for hit in hits:
+            part = _format_hit(hit)
+            cost = count(part, model) + 1
+            if used + cost > budget:
+                if not kept and budget > 0:
+                    # The best chunk alone is too big: keep its beginning
+                    chars = int((budget - 1) * self.estimator.ratio(model))
+                    kept.append({**hit, "text": hit["text"][:chars]})
+                    used = budget
+                    truncated = True
+                break
+            kept.append(hit)
+            used += cost
+
+        ordered, hot = self._layout(kept)
+        context = "\n\n".join(_format_hit(h) for h in ordered) if ordered else NO_CONTEXT
+        user = USER_PROMPT_TEMPLATE.format(context=context, question=question)
+        prompt_tokens = system_tokens + history_tokens + count(user, model) + CHAT_TEMPLATE_TOKENS
+        return Prompt(
+            system=SYSTEM_PROMPT,
+            user=user,
+            sources={h["metadata"].get("source", "") for h in ordered},
+            options={
+                "num_ctx": num_ctx,
+                "num_predict": settings.llm_num_predict,
+                # Keep the system prompt if a long answer shifts the window
+                "num_keep": system_tokens + CHAT_TEMPLATE_TOKENS,
+            },
+            budget={
+                "num_ctx": num_ctx,
+                "context_budget": budget,
+                "context_tokens": used,
+                "history_tokens": history_tokens,
+                "prompt_tokens": prompt_tokens,
+                "reserved_tokens": settings.prompt_reserve_tokens,
+                "chunks": len(ordered),
+                "chunks_dropped": len(hits) - len(kept),
+                "hot_chunks": hot,
+                "truncated": truncated,
+            },
+            history=history,
+        )
+
+    def observe(self, model: str, prompt: Prompt, stats: dict) -> None:
+        """Tighten the model's token estimate with what Ollama counted."""
+        prompt_tokens = stats.get("prompt_eval_count")
+        if prompt_tokens:
+            overhead = CHAT_TEMPLATE_TOKENS + MESSAGE_TOKENS * len(prompt.history)
+            self.estimator.observe(model, prompt.chars, prompt_tokens - overhead)
+
+    def _layout(self, hits: list[dict]) -> tuple[list[dict], int]:
+        """Frequently retrieved chunks first, in a fixed order; then by relevance."""
+        hot, rest = [], []
+        for hit in hits:
+            seen = self._hits.pop(hit["id"], 0) + 1
+            self._hits[hit["id"]] = seen
+            (hot if seen >= self.hot_min_hits else rest).append(hit)
+        while len(self._hits) > self._max_tracked:
+            self._hits.popitem(last=False)
+        hot.sort(key=lambda h: (h["metadata"].get("source", ""), h["metadata"].get("chunk_index", 0)))
+        return hot + rest, len(hot)
+
+
+def _format_hit(hit: dict) -> str:
+    return f"[{hit['metadata'].get('source', '')}] {hit['text']}"
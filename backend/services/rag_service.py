@@ -1,71 +1,421 @@
+import asyncio
+import time
 from collections.abc import AsyncIterator
+from contextlib import aclosing
 
-from backend.prompts.templates import SYSTEM_PROMPT, RAG_PROMPT_TEMPLATE, USER_PROMPT_TEMPLATE
+import httpx
+
+from backend.prompts.templates import CONDENSE_PROMPT_TEMPLATE, SUMMARY_PROMPT_TEMPLATE
+from backend.services.answer_cache import AnswerCache, CachedAnswer, get_answer_cache
+from backend.services.catalog import DocumentCatalog
+from backend.services.metrics import (
+    CHAT_DURATION_SECONDS,
+    CHAT_REQUESTS,
+    GENERATED_TOKENS,
+    GENERATION_CANCELLED,
+    PROMPT_BUILD_SECONDS,
+    QUERY_EMBED_SECONDS,
+    RERANK_SECONDS,
+    RETRIEVAL_SECONDS,
+    SESSION_COMPACTIONS,
+    SESSION_CONDENSE_SECONDS,
+    TIME_TO_FIRST_TOKEN_SECONDS,
+)
 from backend.services.ollama_client import OllamaClient
-from backend.services.vector_store import VectorStore
+from backend.services.prompt_builder import PromptBuilder
+from backend.services.reranker import select_context
+from backend.services.scheduler import GenerationScheduler, Priority, QueueFullError, Ticket
+from backend.services.sessions import ChatSession, SessionStore
+from backend.services.single_flight import SingleFlight, normalize_question
+from backend.services.vector_store import RetrievalFilter, VectorStore
+from config.settings import get_settings
 
 
 class RAGService:
-    def __init__(self):
-        self._ollama = OllamaClient()
-        self._vector_store = VectorStore()
+    def __init__(
+        self,
+        ollama: OllamaClient | None = None,
+        vector_store: VectorStore | None = None,
+        answer_cache: AnswerCache | None = None,
+        catalog: DocumentCatalog | None = None,
+        scheduler: GenerationScheduler | None = None,
+        prompt_builder: PromptBuilder | None = None,
+        sessions: SessionStore | None = None,
+    ):
+        self._ollama = ollama or OllamaClient()
+        self._vector_store = vector_store or VectorStore(ollama=self._ollama)
+        self.answer_cache = answer_cache or get_answer_cache()
+        self._catalog = catalog or DocumentCatalog()
+        self.scheduler = scheduler or GenerationScheduler()
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.sessions = sessions or SessionStore()
+        self._inflight = SingleFlight()
+        self._coalesce = get_settings().chat_coalescing_enabled
+        self._background: set[asyncio.Task] = set()
+
+    async def aclose(self) -> None:
+        """Cancel pending session compactions."""
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
 
     async def query_stream(
         self, question: str, model: str | None = None, think: bool = True,
-    ) -> AsyncIterator[str]:
-        """Retrieve context and stream the LLM response."""
-        # 1. Retrieve relevant chunks
-        hits = await self._vector_store.search(question)
-
-        # 2. Build context from retrieved chunks
-        if hits:
-            context_parts = []
-            for hit in hits:
-                source = hit["metadata"].get("source", "")
-                text = hit["text"]
-                context_parts.append(f"[{source}] {text}")
-            context = "\n\n".join(context_parts)
-        else:
-            context = "No se encontró información relevante en los documentos."
+        priority: Priority = Priority.INTERACTIVE, session_id: str | None = None,
+        filters: RetrievalFilter | None = None,
+    ) -> AsyncIterator[dict]:
+        """Retrieve context and stream the LLM response.
+
+        Embeds the question, looks it up in the answer cache and retrieves
+        the context before returning; only then, on a cache miss, does the
+        request take a place in the generation queue. So a cache hit is
+        served even with the queue full, and a full queue raises
+        QueueFullError before anything is streamed. A request identical
+        to one already streaming (same normalized question, model, think
+        flag, filters and corpus version) joins it instead: it gets the
+        chunks produced so far, then the rest live, and its stats are
+        flagged ``coalesced``. Always ``aclose()`` the returned iterator.
+
+        With a ``session_id`` the answer is recorded in that session.
+        Later questions are condensed against it first; only those that
+        condensing changed are follow-ups, answered in the context of the
+        conversation and never coalesced nor cached (they may still be
+        served from the cache, looked up with the condensed question).
+        ``filters`` restricts retrieval to some documents.
+
+        While waiting for a generation slot, yields ``{"type": "queue",
+        "position": n}`` each time the position changes.
+        """
+        start = time.perf_counter()
+        model = model or self._ollama.llm_model
+        session = self.sessions.get(session_id) if session_id else None
+        on_complete = self._turn_recorder(session, question, model) if session else None
+        search_query, follow_up = await self._standalone(session, question, model, priority)
+        corpus_version = self._vector_store.corpus_version
 
-        # 3. Build the prompt
-        user_prompt = USER_PROMPT_TEMPLATE.format(
-            context=context,
-            question=question,
+        key = object() if follow_up else (normalize_question(question), model, think, filters, corpus_version)
+        coalesce = self._coalesce and not follow_up
+        if coalesce and (joined := self._join(key, on_complete)) is not None:
+            return joined
+
+        with QUERY_EMBED_SECONDS.time():
+            query_embedding = await self._ollama.embed(search_query)
+
+        # Replay a cached answer to an equivalent question
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(query_embedding, model, think, corpus_version, filters)
+            if cached is not None:
+                CHAT_REQUESTS.inc(endpoint="chat", cached="true")
+                return self._inflight.start(object(), self._cached_stream(cached, model, start), on_complete)
+
+        hits = await self._retrieve(search_query, query_embedding, filters)
+        # An identical request may have started while this one retrieved
+        if coalesce and (joined := self._join(key, on_complete)) is not None:
+            return joined
+        ticket = self.scheduler.enqueue(model, priority)
+        CHAT_REQUESTS.inc(endpoint="chat", cached="false")
+        return self._inflight.start(
+            key,
+            self._answer_stream(
+                question, model, think, ticket, hits, start,
+                session=session if follow_up else None,
+                # Follow-ups depend on the conversation: not stored for others
+                cache_key=None if follow_up else (query_embedding, corpus_version, filters),
+            ),
+            on_complete, on_abandon=ticket.release,
         )
 
-        # 4. Stream response from LLM
-        async for chunk in self._ollama.generate_stream(
-            user_prompt, system=SYSTEM_PROMPT, model=model, think=think,
-        ):
+    def _join(self, key, on_complete) -> AsyncIterator[dict] | None:
+        joined = self._inflight.join(key, on_complete)
+        if joined is not None:
+            CHAT_REQUESTS.inc(endpoint="chat", cached="coalesced")
+        return joined
+
+    async def _cached_stream(self, cached: CachedAnswer, model: str, start: float) -> AsyncIterator[dict]:
+        for chunk in _replay(cached):
             yield chunk
+        CHAT_DURATION_SECONDS.observe(time.perf_counter() - start, model=model, cached="true")
 
-    async def query(self, question: str, model: str | None = None) -> dict:
-        """Retrieve context and return full response with sources."""
-        hits = await self._vector_store.search(question)
-
-        if hits:
-            context_parts = []
-            sources = set()
-            for hit in hits:
-                source = hit["metadata"].get("source", "")
-                text = hit["text"]
-                context_parts.append(f"[{source}] {text}")
-                sources.add(source)
-            context = "\n\n".join(context_parts)
-        else:
-            context = "No se encontró información relevante en los documentos."
-            sources = set()
+    async def _answer_stream(
+        self, question: str, model: str, think: bool, ticket: Ticket, hits: list[dict], start: float,
+        session: ChatSession | None = None, cache_key: tuple | None = None,
+    ) -> AsyncIterator[dict]:
+        """Generate the answer from the retrieved ``hits``.
 
-        user_prompt = USER_PROMPT_TEMPLATE.format(
-            context=context,
-            question=question,
-        )
+        ``session`` is given for follow-ups only. The complete answer is
+        stored in the cache under ``cache_key`` (query embedding, corpus
+        version, filters), if given.
+        """
+        try:
+            # 1. Fit the chunks and the conversation into the model's context window
+            with PROMPT_BUILD_SECONDS.time():
+                prompt = self.prompt_builder.build(
+                    question, hits, model, history=self._history(session, model),
+                )
 
-        response = await self._ollama.generate(
-            user_prompt, system=SYSTEM_PROMPT, model=model,
-        )
-        return {"response": response, "sources": sorted(sources)}
+            # 2. Wait for a generation slot
+            async for position in ticket.wait():
+                yield {"type": "queue", "position": position}
+
+            # 3. Stream response from LLM. Closing the stream (client gone)
+            # closes the Ollama connection, which stops the generation.
+            produced = []
+            async with aclosing(self._ollama.generate_stream(
+                prompt.user, system=prompt.system, model=model, think=think,
+                options=prompt.options, history=prompt.history,
+            )) as stream:
+                async for chunk in stream:
+                    if chunk["type"] == "stats":
+                        self.prompt_builder.observe(model, prompt, chunk["stats"])
+                        chunk = {"type": "stats", "stats": {**chunk["stats"], "prompt_budget": prompt.budget}}
+                    else:
+                        if not produced:
+                            TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, model=model)
+                        GENERATED_TOKENS.inc(model=model, kind=chunk["type"])
+                    produced.append(chunk)
+                    yield chunk
+            CHAT_DURATION_SECONDS.observe(time.perf_counter() - start, model=model, cached="false")
+        except (asyncio.CancelledError, GeneratorExit):
+            if ticket.granted and not ticket.released:
+                GENERATION_CANCELLED.inc(model=model)
+            raise
+        finally:
+            ticket.release()
+
+        # 4. Only complete answers reach this point; remember them
+        if (
+            self.answer_cache is not None
+            and cache_key is not None
+            and any(c["type"] == "response" for c in produced)
+        ):
+            query_embedding, corpus_version, filters = cache_key
+            self.answer_cache.store(
+                query_embedding, model, think, corpus_version,
+                CachedAnswer(question=question, chunks=produced, sources=sorted(prompt.sources)),
+                filters,
+            )
+
+    async def query(
+        self, question: str, model: str | None = None, session_id: str | None = None,
+        filters: RetrievalFilter | None = None,
+    ) -> dict:
+        """Retrieve context and return full response with sources.
+
+        As with ``query_stream``, only a cache miss takes a place in the
+        generation queue. Raises QueueFullError when it is full.
+        """
+        start = time.perf_counter()
+        model = model or self._ollama.llm_model
+        session = self.sessions.get(session_id) if session_id else None
+        search_query, follow_up = await self._standalone(session, question, model, Priority.SYNC)
+        with QUERY_EMBED_SECONDS.time():
+            query_embedding = await self._ollama.embed(search_query)
+        corpus_version = self._vector_store.corpus_version
+
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(query_embedding, model, True, corpus_version, filters)
+            if cached is not None:
+                CHAT_REQUESTS.inc(endpoint="chat_sync", cached="true")
+                CHAT_DURATION_SECONDS.observe(time.perf_counter() - start, model=model, cached="true")
+                if session is not None:
+                    self._record_turn(session, question, cached.response, model)
+                return {"response": cached.response, "sources": cached.sources}
+
+        hits = await self._retrieve(search_query, query_embedding, filters)
+        ticket = self.scheduler.enqueue(model, Priority.SYNC)
+        CHAT_REQUESTS.inc(endpoint="chat_sync", cached="false")
+        try:
+            with PROMPT_BUILD_SECONDS.time():
+                prompt = self.prompt_builder.build(
+                    question, hits, model, history=self._history(session if follow_up else None, model),
+                )
+
+            await ticket.acquire()
+            # Keep every chunk, not just the text: the cached entry is
+            # replayed to streaming requests too
+            produced = []
+            async with aclosing(self._ollama.generate_stream(
+                prompt.user, system=prompt.system, model=model,
+                options=prompt.options, history=prompt.history,
+            )) as stream:
+                async for chunk in stream:
+                    if chunk["type"] == "stats":
+                        self.prompt_builder.observe(model, prompt, chunk["stats"])
+                        chunk = {"type": "stats", "stats": {**chunk["stats"], "prompt_budget": prompt.budget}}
+                    produced.append(chunk)
+            response = "".join(c["token"] for c in produced if c["type"] == "response")
+            CHAT_DURATION_SECONDS.observe(time.perf_counter() - start, model=model, cached="false")
+        finally:
+            ticket.release()
+
+        if session is not None and response:
+            self._record_turn(session, question, response, model)
+        if self.answer_cache is not None and not follow_up and response:
+            self.answer_cache.store(
+                query_embedding, model, True, corpus_version,
+                CachedAnswer(question=question, chunks=produced, sources=sorted(prompt.sources)),
+                filters,
+            )
+        return {"response": response, "sources": sorted(prompt.sources)}
 
     def get_sources(self) -> list[str]:
-        return self._vector_store.get_document_names()
+        return self._catalog.names()
+
+    async def _retrieve(
+        self, question: str, query_embedding: list[float], filters: RetrievalFilter | None = None,
+    ) -> list[dict]:
+        """Over-fetch candidates, then MMR and merge neighbours.
+
+        The token budget is applied by the prompt builder, which knows the
+        model's context window.
+        """
+        settings = get_settings()
+        if not settings.mmr_enabled:
+            with RETRIEVAL_SECONDS.time(mode=settings.retrieval_mode):
+                return await self._vector_store.search(
+                    question, query_embedding=query_embedding, filters=filters,
+                )
+
+        with RETRIEVAL_SECONDS.time(mode=settings.retrieval_mode):
+            candidates = await self._vector_store.search(
+                question,
+                top_k=max(settings.retrieval_fetch_k, settings.retrieval_top_k),
+                query_embedding=query_embedding,
+                include_embeddings=True,
+                filters=filters,
+            )
+        with RERANK_SECONDS.time():
+            return select_context(
+                candidates,
+                query_embedding,
+                top_k=settings.retrieval_top_k,
+                lambda_mult=settings.mmr_lambda,
+                max_overlap=settings.chunk_overlap * 2,
+            )
+
+    # --- Sessions ---
+
+    def _count(self, model: str):
+        return lambda text: self.prompt_builder.estimator.count(text, model)
+
+    async def _standalone(
+        self, session: ChatSession | None, question: str, model: str, priority: Priority,
+    ) -> tuple[str, bool]:
+        """The question to search with, and whether it is a follow-up.
+
+        A question is a follow-up only if condensing it against the
+        conversation changed it. Anything else is answered as if asked
+        without a session, so repeated and simultaneous questions keep
+        sharing answers. Condensing takes a generation slot of its own.
+        """
+        if session is None or not session.has_history:
+            return question, False
+        if not get_settings().session_condense_questions:
+            return question, True
+        ticket = self.scheduler.enqueue(model, priority)
+        try:
+            await ticket.acquire()
+            condensed = await self._condense(session, question, model)
+        finally:
+            ticket.release()
+        return condensed, normalize_question(condensed) != normalize_question(question)
+
+    def _history(self, session: ChatSession | None, model: str) -> list[dict] | None:
+        if session is None or not session.has_history:
+            return None
+        return session.messages(self._count(model), get_settings().session_history_max_tokens)
+
+    async def _condense(self, session: ChatSession, question: str, model: str) -> str:
+        """Rewrite a follow-up as a standalone question for retrieval.
+
+        Call with the ticket granted. Falls back to the previous question
+        plus this one if the model fails.
+        """
+        settings = get_settings()
+        if not settings.session_condense_questions:
+            return question
+        history = session.transcript(session.turns[-2:], answer_chars=600)
+        if session.summary:
+            history = f"{session.summary}\n\n{history}".strip()
+        try:
+            with SESSION_CONDENSE_SECONDS.time():
+                condensed = await self._ollama.generate(
+                    CONDENSE_PROMPT_TEMPLATE.format(history=history, question=question),
+                    model=model,
+                    think=False,
+                    options={"num_ctx": self.prompt_builder.num_ctx(model), "num_predict": 128},
+                )
+        except httpx.HTTPError:
+            condensed = ""
+        condensed = condensed.strip().strip('"«»').strip()
+        if condensed:
+            return condensed
+        return f"{session.turns[-1].question} {question}" if session.turns else question
+
+    def _turn_recorder(self, session: ChatSession, question: str, model: str):
+        def record(chunks: list[dict]) -> None:
+            answer = "".join(c["token"] for c in chunks if c["type"] == "response")
+            if answer:
+                self._record_turn(session, question, answer, model)
+        return record
+
+    def _record_turn(self, session: ChatSession, question: str, answer: str, model: str) -> None:
+        """Add the turn; past the token threshold, summarize older turns in the background."""
+        settings = get_settings()
+        session.add_turn(question, answer)
+        if (
+            not session.compacting
+            and len(session.turns) > settings.session_keep_turns
+            and session.history_tokens(self._count(model)) > settings.session_history_max_tokens
+        ):
+            session.compacting = True
+            task = asyncio.create_task(self._compact(session, model), name=f"compact-{session.id}")
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _compact(self, session: ChatSession, model: str) -> None:
+        """Fold all but the newest turns into the session's rolling summary.
+
+        Runs at batch priority. If the queue is full or the model fails,
+        the older turns are dropped unsummarized, so memory stays bounded
+        either way.
+        """
+        settings = get_settings()
+        keep = settings.session_keep_turns
+        older = session.turns[:-keep] if keep else list(session.turns)
+        outcome = "summarized"
+        try:
+            ticket = self.scheduler.enqueue(model, Priority.BATCH)
+            try:
+                await ticket.acquire()
+                summary = await self._ollama.generate(
+                    SUMMARY_PROMPT_TEMPLATE.format(
+                        summary=session.summary or "(ninguno)",
+                        conversation=session.transcript(older),
+                    ),
+                    model=model,
+                    think=False,
+                    options={
+                        "num_ctx": self.prompt_builder.num_ctx(model),
+                        "num_predict": settings.session_summary_max_tokens,
+                    },
+                )
+            finally:
+                ticket.release()
+            session.summary = summary.strip() or session.summary
+        except (QueueFullError, httpx.HTTPError):
+            outcome = "dropped"
+        finally:
+            # Turns recorded meanwhile were appended after ``older``
+            del session.turns[:len(older)]
+            session.compacting = False
+        SESSION_COMPACTIONS.inc(outcome=outcome)
+
+
+def _replay(cached: CachedAnswer):
+    """Yield the stored chunks; stats are flagged so the UI can tell."""
+    for chunk in cached.chunks:
+        if chunk["type"] == "stats":
+            yield {"type": "stats", "stats": {**chunk["stats"], "cached": True}}
+        else:
+            yield chunk
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def mmr(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+) -> list[int]:
+    """Maximal marginal relevance over cosine similarity.
+
+    Returns the indices of the ``k`` selected candidates, in selection
+    order. Each step is a single vectorized pass over all candidates.
+    """
+    n = len(candidate_embeddings)
+    if n == 0 or k <= 0:
+        return []
+
+    candidates = _unit_rows(candidate_embeddings)
+    relevance = candidates @ _unit_rows(query_embedding[None, :])[0]
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything already selected
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def merge_adjacent(hits: list[dict], max_overlap: int) -> list[dict]:
+    """Merge hits that are consecutive chunks of the same source.
+
+    Overlapping text shared by neighbouring chunks is kept once. Merged
+    groups take the position of their best-ranked member.
+    """
+    groups: list[list[tuple[int, dict]]] = []
+    by_position: dict[tuple[str, int], list[tuple[int, dict]]] = {}
+    ordered = sorted(
+        enumerate(hits),
+        key=lambda item: (
+            item[1]["metadata"].get("source", ""),
+            item[1]["metadata"].get("chunk_index", -1),
+        ),
+    )
+    for rank, hit in ordered:
+        source = hit["metadata"].get("source", "")
+        index = hit["metadata"].get("chunk_index")
+        previous = by_position.get((source, index - 1)) if index is not None else None
+        group = previous if previous is not None else []
+        if previous is None:
+            groups.append(group)
+        group.append((rank, hit))
+        if index is not None:
+            by_position[(source, index)] = group
+
+    merged = []
+    for group in groups:
+        best_rank = min(rank for rank, _ in group)
+        first = group[0][1]
+        text = first["text"]
+        for _, hit in group[1:]:
+            text = _join_overlapping(text, hit["text"], max_overlap)
+        merged.append((best_rank, {
+            **first,
+            "text": text,
+            "metadata": {
+                **first["metadata"],
+                "chunk_indices": [h["metadata"].get("chunk_index") for _, h in group],
+            },
+        }))
+    return [hit for _, hit in sorted(merged, key=lambda item: item[0])]
+
+
+def select_context(
+    hits: list[dict],
+    query_embedding: list[float],
+    top_k: int,
+    lambda_mult: float,
+    max_overlap: int,
+) -> list[dict]:
+    """Over-fetched hits -> MMR top_k -> merged neighbours.
+
+    The token budget is left to the prompt builder.
+    """
+    if not hits:
+        return []
+    if all(h.get("embedding") is not None for h in hits):
+        order = mmr(
+            np.asarray(query_embedding, dtype=np.float32),
+            np.asarray([h["embedding"] for h in hits], dtype=np.float32),
+            top_k,
+            lambda_mult,
+        )
+        hits = [hits[i] for i in order]
+    else:
+        hits = hits[:top_k]
+    return merge_adjacent(hits, max_overlap)
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _join_overlapping(a: str, b: str, max_overlap: int) -> str:
+    for size in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a.endswith(b[:size]):
+            return a + b[size:]
+    return f"{a}\n{b}"
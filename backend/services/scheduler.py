@@ -0,0 +1,151 @@
+import asyncio
+import bisect
+import itertools
+import time
+from collections.abc import AsyncIterator
+from enum import IntEnum
+
+from backend.services.metrics import GENERATION_QUEUE_SECONDS, GENERATION_REJECTED
+from config.settings import get_settings
+
+
+class Priority(IntEnum):
+    """Lower runs first."""
+    INTERACTIVE = 0  # /chat (SSE)
+    SYNC = 1  # /chat/sync
+    BATCH = 2  # scripts and background work
+
+
+class QueueFullError(Exception):
+    """The wait queue for a model is full; the caller should retry later."""
+
+
+class Ticket:
+    """A place in a model's queue, then a generation slot once granted.
+
+    Always release it (``finally: ticket.release()``), whether or not it
+    was granted; releasing twice is harmless.
+    """
+
+    def __init__(self, scheduler: "GenerationScheduler", model: str, priority: Priority, seq: int):
+        self._scheduler = scheduler
+        self.model = model
+        self.priority = priority
+        self._seq = seq
+        self.position = 0
+        self.granted = False
+        self.released = False
+        self._changed = asyncio.Event()
+        self._enqueued_at = time.perf_counter()
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.priority, self._seq) < (other.priority, other._seq)
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Yield the 1-based queue position whenever it changes, until granted."""
+        reported = None
+        while not self.granted:
+            self._changed.clear()
+            if self.position != reported:
+                reported = self.position
+                yield reported
+                continue
+            await self._changed.wait()
+
+    async def acquire(self) -> None:
+        async for _ in self.wait():
+            pass
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self._scheduler._release(self)
+
+    def _grant(self) -> None:
+        self.granted = True
+        self.position = 0
+        self._changed.set()
+        GENERATION_QUEUE_SECONDS.observe(
+            time.perf_counter() - self._enqueued_at,
+            model=self.model, priority=self.priority.name.lower(),
+        )
+
+    def _move(self, position: int) -> None:
+        if position != self.position:
+            self.position = position
+            self._changed.set()
+
+
+class _ModelQueue:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting: list[Ticket] = []  # sorted by (priority, arrival)
+
+
+class GenerationScheduler:
+    """Admission control in front of LLM generation.
+
+    At most ``max_in_flight`` generations run per model; further requests
+    wait in a bounded queue ordered by priority, then arrival. When the
+    queue is full, ``enqueue`` raises QueueFullError at once instead of
+    letting every request slow down.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int | None = None,
+        max_queue: int | None = None,
+        per_model: dict[str, int] | None = None,
+    ):
+        settings = get_settings()
+        self.max_in_flight = max_in_flight or settings.generation_max_in_flight
+        self.max_queue = max_queue if max_queue is not None else settings.generation_max_queue
+        self._per_model = per_model if per_model is not None else settings.generation_max_in_flight_per_model
+        self._queues: dict[str, _ModelQueue] = {}
+        self._seq = itertools.count()
+
+    def enqueue(self, model: str, priority: Priority = Priority.INTERACTIVE) -> Ticket:
+        """Take a place in the model's queue, or a slot right away if one is free."""
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self._per_model.get(model, self.max_in_flight))
+
+        ticket = Ticket(self, model, priority, next(self._seq))
+        if queue.in_flight < queue.limit and not queue.waiting:
+            queue.in_flight += 1
+            ticket._grant()
+            return ticket
+        if len(queue.waiting) >= self.max_queue:
+            GENERATION_REJECTED.inc(model=model, priority=priority.name.lower())
+            raise QueueFullError(
+                f"Hay demasiadas peticiones en espera para {model}. Inténtalo de nuevo en unos segundos."
+            )
+        bisect.insort(queue.waiting, ticket)
+        self._renumber(queue)
+        return ticket
+
+    def stats(self) -> dict[str, dict]:
+        return {
+            model: {"in_flight": q.in_flight, "queued": len(q.waiting), "limit": q.limit}
+            for model, q in self._queues.items()
+        }
+
+    def _release(self, ticket: Ticket) -> None:
+        queue = self._queues[ticket.model]
+        if ticket.granted:
+            queue.in_flight -= 1
+        else:
+            # Gave up while waiting (client disconnected, cache hit...)
+            index = bisect.bisect_left(queue.waiting, ticket)
+            if index < len(queue.waiting) and queue.waiting[index] is ticket:
+                del queue.waiting[index]
+        while queue.waiting and queue.in_flight < queue.limit:
+            queue.in_flight += 1
+            queue.waiting.pop(0)._grant()
+        self._renumber(queue)
+
+    @staticmethod
+    def _renumber(queue: _ModelQueue) -> None:
+        for position, waiting in enumerate(queue.waiting, start=1):
+            waiting._move(position)
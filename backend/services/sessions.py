@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from backend.prompts.templates import SESSION_SUMMARY_PREFIX
+from config.settings import get_settings
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+class ChatSession:
+    """One conversation: a rolling summary plus the most recent turns."""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.turns: list[Turn] = []
+        self.last_used = time.monotonic()
+        self.compacting = False
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def add_turn(self, question: str, answer: str) -> None:
+        self.turns.append(Turn(question, answer))
+
+    def history_tokens(self, count: Callable[[str], int]) -> int:
+        return count(self.summary) + sum(count(t.question) + count(t.answer) for t in self.turns)
+
+    def messages(self, count: Callable[[str], int], max_tokens: int) -> list[dict]:
+        """Summary and the newest turns that fit ``max_tokens``, as chat messages.
+
+        The cap holds even while a compaction is pending, so the prompt
+        never grows with the length of the conversation.
+        """
+        messages: list[dict] = []
+        used = count(self.summary) if self.summary else 0
+        for turn in reversed(self.turns):
+            cost = count(turn.question) + count(turn.answer)
+            if used + cost > max_tokens:
+                break
+            messages[:0] = [
+                {"role": "user", "content": turn.question},
+                {"role": "assistant", "content": turn.answer},
+            ]
+            used += cost
+        if self.summary:
+            messages.insert(0, {"role": "system", "content": SESSION_SUMMARY_PREFIX + self.summary})
+        return messages
+
+    def transcript(self, turns: list[Turn] | None = None, answer_chars: int | None = None) -> str:
+        lines = []
+        for turn in self.turns if turns is None else turns:
+            answer = turn.answer if answer_chars is None else turn.answer[:answer_chars]
+            lines.append(f"Usuario: {turn.question}\nAsistente: {answer}")
+        return "\n\n".join(lines)
+
+
+class SessionStore:
+    """Chat sessions by ID, bounded in number and evicted after ``ttl``.
+
+    Least recently used sessions are dropped first when the store is full.
+    """
+
+    def __init__(self, max_sessions: int | None = None, ttl: float | None = None):
+        settings = get_settings()
+        self.max_sessions = max_sessions or settings.session_max
+        self.ttl = ttl or settings.session_ttl
+        self._sessions: OrderedDict[str, ChatSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> ChatSession:
+        """The session with this ID, created if missing or expired."""
+        now = time.monotonic()
+        self._evict_expired(now)
+        session = self._sessions.pop(session_id, None) or ChatSession(session_id)
+        session.last_used = now
+        self._sessions[session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _evict_expired(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
@@ -0,0 +1,165 @@
+import asyncio
+import unicodedata
+from collections.abc import AsyncIterator, Callable, Hashable
+from contextlib import aclosing
+
+
+def normalize_question(question: str) -> str:
+    """Case, accents, spacing and surrounding punctuation do not change the answer."""
+    decomposed = unicodedata.normalize("NFKD", question.casefold())
+    text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(text.split()).strip("¿?¡!.,;: ")
+
+
+class Flight:
+    """One upstream stream shared by every caller that asked the same thing.
+
+    A background task drains the source into a buffer; each subscriber
+    reads the buffer from the start, then follows it live. When the last
+    subscriber leaves before the end, the source is cancelled.
+
+    If that happens before the pump task has run, the source generator
+    never starts and its ``finally`` never runs; ``on_abandon`` is then
+    called instead, to release what was taken on its behalf.
+    """
+
+    def __init__(self, source: AsyncIterator[dict], on_close, on_abandon: Callable[[], None] | None = None):
+        self.chunks: list[dict] = []
+        self.done = False
+        self.closing = False
+        self.error: Exception | None = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._on_close = on_close
+        self._on_abandon = on_abandon
+        self._started = False
+        self._task = asyncio.create_task(self._pump(source), name="single-flight")
+        self._task.add_done_callback(self._finished)
+
+    @property
+    def joinable(self) -> bool:
+        return not self.done and not self.closing
+
+    def subscribe(self, joined: bool = False, on_complete=None) -> "Subscription":
+        return Subscription(self, joined, on_complete)
+
+    async def _pump(self, source: AsyncIterator[dict]) -> None:
+        self._started = True
+        try:
+            async with aclosing(source) as stream:
+                async for chunk in stream:
+                    self.chunks.append(chunk)
+                    self._notify()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("La generación se ha cancelado")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            self._on_close(self)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        if not self._started and self._on_abandon is not None:
+            self._on_abandon()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _leave(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            self.closing = True
+            self._on_close(self)
+            self._task.cancel()
+
+
+class Subscription:
+    """Async iterator over a flight's chunks.
+
+    Counts as a subscriber from creation, so ``aclose()`` must be called
+    even if iteration never started. ``on_complete(chunks)`` runs if this
+    subscriber reads the stream to a successful end.
+    """
+
+    def __init__(
+        self,
+        flight: Flight,
+        joined: bool,
+        on_complete: Callable[[list[dict]], None] | None = None,
+    ):
+        self._flight = flight
+        self._joined = joined
+        self._on_complete = on_complete
+        self._left = False
+        flight.subscribers += 1
+        self._iterator = self._iterate()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self._iterator.__anext__()
+
+    async def aclose(self) -> None:
+        await self._iterator.aclose()
+        self._leave()
+
+    async def _iterate(self) -> AsyncIterator[dict]:
+        flight = self._flight
+        backlog = len(flight.chunks)
+        index = 0
+        try:
+            while True:
+                changed = flight._changed
+                while index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    if self._joined and chunk["type"] == "queue" and index <= backlog:
+                        continue  # stale queue positions from before we joined
+                    if self._joined and chunk["type"] == "stats":
+                        chunk = {"type": "stats", "stats": {**chunk["stats"], "coalesced": True}}
+                    yield chunk
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    if self._on_complete is not None:
+                        self._on_complete(flight.chunks)
+                    return
+                await changed.wait()
+        finally:
+            self._leave()
+
+    def _leave(self) -> None:
+        if not self._left:
+            self._left = True
+            self._flight._leave()
+
+
+class SingleFlight:
+    """In-flight streams by key, so identical requests share one."""
+
+    def __init__(self):
+        self._flights: dict[Hashable, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: Hashable, on_complete=None) -> Subscription | None:
+        flight = self._flights.get(key)
+        if flight is None or not flight.joinable:
+            return None
+        return flight.subscribe(joined=True, on_complete=on_complete)
+
+    def start(
+        self, key: Hashable, source: AsyncIterator[dict], on_complete=None,
+        on_abandon: Callable[[], None] | None = None,
+    ) -> Subscription:
+        flight = Flight(source, on_close=lambda f: self._discard(key, f), on_abandon=on_abandon)
+        self._flights[key] = flight
+        return flight.subscribe(on_complete=on_complete)
+
+    def _discard(self, key: Hashable, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
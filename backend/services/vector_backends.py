@@ -0,0 +1,724 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+from config.settings import get_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+NUMPY_DTYPES = ("float16", "int8")
+
+# Rows scored per matrix product, to bound the float32 copy of the store
+_BLOCK_ROWS = 16384
+# SQLite host-parameter limit, with margin
+_MAX_PARAMS = 900
+_FILTER_CACHE_SIZE = 64
+
+
+class VectorBackend(Protocol):
+    """Storage and nearest-neighbour search for chunk embeddings.
+
+    Hits are dicts with ``id``, ``text``, ``metadata`` and ``distance``
+    (cosine distance, ``None`` when not ranked), plus ``embedding`` when
+    requested. ``where`` filters use Chroma's syntax: ``{"source": "a.pdf"}``,
+    ``{"format": {"$in": [".pdf", ".docx"]}}``, ``{"$and": [...]}``.
+    """
+
+    def count(self) -> int: ...
+
+    def upsert(
+        self, ids: list[str], texts: list[str], embeddings: list[list[float]], metadatas: list[dict],
+    ) -> None: ...
+
+    def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+    ) -> list[list[dict]]:
+        """Best ``n_results`` hits for each query embedding, closest first."""
+        ...
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include_documents: bool = True,
+        include_embeddings: bool = False,
+    ) -> list[dict]:
+        """Chunks by ID and/or filter (every chunk if neither), in no particular order."""
+        ...
+
+    def delete(self, ids: list[str]) -> None: ...
+
+    def reset(self) -> None: ...
+
+    def sources(self) -> list[str]: ...
+
+    def preload(self) -> None:
+        """Bring the index into memory so the first search is not slow."""
+        ...
+
+
+def create_backend(path: Path) -> VectorBackend:
+    """The backend chosen by ``vector_backend``, stored under ``path``."""
+    settings = get_settings()
+    if settings.vector_backend == "chroma":
+        return ChromaBackend(path)
+    if settings.vector_backend == "numpy":
+        return NumpyBackend(
+            path / "numpy", dtype=settings.vector_numpy_dtype,
+            partition_cache_bytes=settings.vector_partition_cache_mb * 1024 * 1024,
+        )
+    raise ValueError(
+        f"Backend vectorial no soportado: {settings.vector_backend} (usa {', '.join(VECTOR_BACKENDS)})"
+    )
+
+
+class ChromaBackend:
+    """Chroma persistent collection with an HNSW cosine index.
+
+    There are no per-source partitions: ``where`` is applied by Chroma
+    while it searches the one index, so scoping a query does not make it
+    cheaper.
+    """
+
+    _NAME = "ross_documents"
+
+    def __init__(self, path: Path):
+        # Imported here: chromadb takes a while to import and the numpy
+        # backend does not need it
+        import chromadb
+
+        self._client = chromadb.PersistentClient(path=str(path))
+        self._collection = self._open()
+
+    def _open(self):
+        return self._client.get_or_create_collection(name=self._NAME, metadata={"hnsw:space": "cosine"})
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def upsert(
+        self, ids: list[str], texts: list[str], embeddings: list[list[float]], metadatas: list[dict],
+    ) -> None:
+        self._collection.upsert(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+
+    def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+    ) -> list[list[dict]]:
+        count = self._collection.count()
+        if count == 0:
+            return [[] for _ in embeddings]
+        results = self._collection.query(
+            query_embeddings=embeddings,
+            n_results=min(n_results, count),
+            where=where or None,
+            include=["documents", "metadatas", "distances"]
+            + (["embeddings"] if include_embeddings else []),
+        )
+        batches = []
+        for q in range(len(embeddings)):
+            hits = []
+            for i, chunk_id in enumerate(results["ids"][q]):
+                hit = {
+                    "id": chunk_id,
+                    "text": results["documents"][q][i],
+                    "metadata": results["metadatas"][q][i],
+                    "distance": results["distances"][q][i],
+                }
+                if include_embeddings:
+                    hit["embedding"] = results["embeddings"][q][i]
+                hits.append(hit)
+            batches.append(hits)
+        return batches
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include_documents: bool = True,
+        include_embeddings: bool = False,
+    ) -> list[dict]:
+        include = ["metadatas"]
+        if include_documents:
+            include.append("documents")
+        if include_embeddings:
+            include.append("embeddings")
+        data = self._collection.get(ids=ids, where=where or None, include=include)
+        hits = []
+        for i, chunk_id in enumerate(data["ids"]):
+            hit = {
+                "id": chunk_id,
+                "text": data["documents"][i] if include_documents else None,
+                "metadata": data["metadatas"][i],
+                "distance": None,
+            }
+            if include_embeddings:
+                hit["embedding"] = data["embeddings"][i]
+            hits.append(hit)
+        return hits
+
+    def delete(self, ids: list[str]) -> None:
+        self._collection.delete(ids=ids)
+
+    def reset(self) -> None:
+        self._client.delete_collection(self._NAME)
+        self._collection = self._open()
+
+    def sources(self) -> list[str]:
+        if self._collection.count() == 0:
+            return []
+        data = self._collection.get(include=["metadatas"])
+        return sorted({m.get("source", "unknown") for m in data["metadatas"]})
+
+    def preload(self) -> None:
+        # Chroma loads the HNSW segment on the first query
+        sample = self._collection.peek(1)
+        if len(sample["ids"]):
+            self._collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1, include=[])
+
+
+class NumpyBackend:
+    """Brute-force cosine search over a memory-mapped matrix.
+
+    Unit-normalized embeddings are stored as float16, or as int8 with a
+    scale per row, in ``vectors.bin``; texts and metadata live in SQLite,
+    keyed by row. Opening maps the file and reads the live row numbers,
+    which takes milliseconds, and the OS page cache is shared by every
+    worker process.
+
+    Upserts append rows and deletes leave holes that are compacted once
+    they make up a quarter of the file. Writes hold the SQLite write lock
+    while touching the files, so the ingest script and the server can
+    share a store; a reader notices another process's commit through
+    ``PRAGMA data_version`` and reloads. After its own writes a process
+    only updates the rows it touched.
+
+    Windows cannot resize, replace or delete a file while it is mapped,
+    so writes close this process's map first and remap after. A map held
+    by another process (the ingest script while the server runs) still
+    blocks compaction there; it is skipped and retried on a later delete.
+
+    Queries filtered by source score a cached float32 copy of each
+    source's rows (its partition) instead of gathering them from the
+    map, up to ``partition_cache_bytes`` in total.
+    """
+
+    def __init__(self, path: Path, dtype: str = "float16", partition_cache_bytes: int = 0):
+        if dtype not in NUMPY_DTYPES:
+            raise ValueError(f"Tipo no soportado para el backend numpy: {dtype} (usa {', '.join(NUMPY_DTYPES)})")
+        path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = path / "vectors.bin"
+        self._scales_path = path / "scales.bin"
+        self._default_dtype = dtype
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path / "chunks.sqlite3"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+        self._filters: OrderedDict[str, np.ndarray] = OrderedDict()
+        # source -> (rows, unit float32 vectors of those rows)
+        self._partitions: OrderedDict[str, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._partition_bytes = 0
+        self.partition_cache_bytes = partition_cache_bytes
+        with self._lock:
+            self._load()
+
+    def _create_tables(self) -> None:
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, source TEXT,"
+            " document TEXT, metadata TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    # --- State ---
+
+    def _load(self) -> None:
+        """Map the matrix and read which rows are live. Call with the lock held."""
+        self._version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        meta = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+        self._rows = int(meta.get("rows", 0))
+        self._dimension = int(meta.get("dimension", 0))
+        self._dtype = meta.get("dtype", self._default_dtype)
+        self._live = np.zeros(self._rows, dtype=bool)
+        live_rows = np.fromiter(
+            (r for (r,) in self._db.execute("SELECT row FROM chunks")), dtype=np.int64,
+        )
+        self._live[live_rows] = True
+        self._map()
+        self._filters.clear()
+        self._partitions.clear()
+        self._partition_bytes = 0
+
+    def _map(self) -> None:
+        self._unmap()
+        if self._rows:
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=self._dtype, mode="r", shape=(self._rows, self._dimension),
+            )
+            if self._dtype == "int8":
+                self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(self._rows,))
+
+    def _unmap(self) -> None:
+        # Partitions and query results are copies, so dropping these
+        # references closes the maps
+        self._vectors = self._scales = None
+
+    def _applied(self, removed: list[int], rows: int, sources: set[str]) -> None:
+        """Update the in-memory state after our own committed write.
+
+        ``removed`` rows are no longer live, rows from the old end up to
+        ``rows`` were appended, and ``sources`` had chunks added or removed.
+        Call with the lock held.
+        """
+        live = np.zeros(rows, dtype=bool)
+        live[:self._rows] = self._live
+        live[removed] = False
+        live[self._rows:] = True
+        self._live = live
+        if rows != self._rows or self._vectors is None:
+            self._rows = rows
+            self._map()
+        # Cached masks may miss the new rows; partitions of untouched sources stay valid
+        self._filters.clear()
+        for source in sources & self._partitions.keys():
+            _, vectors = self._partitions.pop(source)
+            self._partition_bytes -= vectors.nbytes
+
+    def _refresh(self) -> None:
+        """Reload if another process committed since we last looked."""
+        if self._db.execute("PRAGMA data_version").fetchone()[0] != self._version:
+            self._load()
+
+    # --- Writes ---
+
+    def upsert(
+        self, ids: list[str], texts: list[str], embeddings: list[list[float]], metadatas: list[dict],
+    ) -> None:
+        if not ids:
+            return
+        # Last occurrence wins for IDs repeated within the batch
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        order = sorted(latest.values())
+        matrix = _unit_rows(np.asarray(embeddings, dtype=np.float32)[order])
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                if self._dimension and matrix.shape[1] != self._dimension:
+                    raise ValueError(
+                        f"Dimensión de embedding {matrix.shape[1]} distinta de la del índice "
+                        f"({self._dimension}). Resetea el vector store tras cambiar de modelo."
+                    )
+                if not self._dimension:
+                    self._dimension = matrix.shape[1]
+                    self._dtype = self._default_dtype
+                removed, sources = self._delete_rows([ids[i] for i in order])
+                start = self._rows
+                self._append(start, matrix)
+                self._db.executemany(
+                    "INSERT INTO chunks (row, id, source, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (start + n, ids[i], metadatas[i].get("source"), texts[i],
+                         json.dumps(metadatas[i], ensure_ascii=False))
+                        for n, i in enumerate(order)
+                    ),
+                )
+                self._set_meta(start + len(order))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                self._load()
+                raise
+            self._applied(removed, start + len(order), sources | {m.get("source") for m in metadatas})
+
+    def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                removed, sources = self._delete_rows(ids)
+                live = int(self._live.sum()) - len(removed)
+                compact = self._rows - live > max(1024, self._rows // 4) and self._compact()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                self._load()
+                raise
+            if compact:
+                # Every row number changed
+                self._load()
+            else:
+                self._applied(removed, self._rows, sources)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM chunks")
+                self._db.execute("DELETE FROM meta")
+                self._unmap()
+                for path in (self._vectors_path, self._scales_path):
+                    path.unlink(missing_ok=True)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            finally:
+                self._load()
+
+    def _delete_rows(self, ids: list[str]) -> tuple[list[int], set[str]]:
+        """Delete chunks by ID. Returns the rows freed and the sources they belonged to."""
+        rows, sources = [], set()
+        for batch in _batches(ids):
+            marks = ",".join("?" * len(batch))
+            for row, source in self._db.execute(f"SELECT row, source FROM chunks WHERE id IN ({marks})", batch):
+                rows.append(row)
+                sources.add(source)
+            self._db.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch)
+        return rows, sources
+
+    def _append(self, start: int, matrix: np.ndarray) -> None:
+        """Write rows from ``start`` on, overwriting leftovers of a failed write."""
+        vectors, scales = self._encode(matrix)
+        self._unmap()
+        _write_at(self._vectors_path, start * vectors[0].nbytes, vectors)
+        if scales is not None:
+            _write_at(self._scales_path, start * scales.itemsize, scales)
+
+    def _encode(self, matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+        if self._dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return matrix.astype(self._dtype), None
+
+    def _compact(self) -> bool:
+        """Rewrite the files without deleted rows. Call inside a write transaction.
+
+        Returns False, having changed nothing, if the files could not be
+        replaced.
+        """
+        live_rows = [r for (r,) in self._db.execute("SELECT row FROM chunks ORDER BY row")]
+        tmp_vectors = self._vectors_path.with_suffix(".tmp")
+        tmp_scales = self._scales_path.with_suffix(".tmp")
+        with open(tmp_vectors, "wb") as f:
+            for i in range(0, len(live_rows), _BLOCK_ROWS):
+                f.write(np.ascontiguousarray(self._vectors[live_rows[i:i + _BLOCK_ROWS]]).tobytes())
+        scaled = self._scales is not None
+        if scaled:
+            np.ascontiguousarray(self._scales[live_rows]).tofile(tmp_scales)
+        self._db.execute("SAVEPOINT compact")
+        # Ascending order: every target row is free by the time it is reused
+        self._db.executemany(
+            "UPDATE chunks SET row = ? WHERE row = ?",
+            ((new, old) for new, old in enumerate(live_rows) if new != old),
+        )
+        self._set_meta(len(live_rows))
+        # Readers in other processes keep their mapping of the old file
+        # until they see this commit
+        self._unmap()
+        try:
+            os.replace(tmp_vectors, self._vectors_path)
+            if scaled:
+                os.replace(tmp_scales, self._scales_path)
+        except OSError as e:
+            # Windows, while another process maps the file
+            logger.warning("No se pudo compactar el índice de vectores, se reintentará: %s", e)
+            self._db.execute("ROLLBACK TO compact")
+            self._db.execute("RELEASE compact")
+            tmp_vectors.unlink(missing_ok=True)
+            tmp_scales.unlink(missing_ok=True)
+            self._map()
+            return False
+        self._db.execute("RELEASE compact")
+        return True
+
+    def _set_meta(self, rows: int) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [("rows", str(rows)), ("dimension", str(self._dimension)), ("dtype", self._dtype)],
+        )
+
+    # --- Reads ---
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return int(self._live.sum())
+
+    def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+    ) -> list[list[dict]]:
+        queries = _unit_rows(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        with self._lock:
+            self._refresh()
+            mask = self._mask(where)
+            if not mask.any():
+                return [[] for _ in queries]
+            if queries.shape[1] != self._dimension:
+                raise ValueError(
+                    f"Dimensión de la consulta {queries.shape[1]} distinta de la del índice ({self._dimension})"
+                )
+            sources = _where_sources(where) if self.partition_cache_bytes else None
+            if sources:
+                candidates, scores = self._partition_scores(queries, sources, mask)
+            else:
+                candidates = np.flatnonzero(mask)
+                scores = self._scores(queries, candidates, whole=candidates.size == self._rows)
+            if not candidates.size:
+                return [[] for _ in queries]
+
+            k = min(n_results, candidates.size)
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            ranked = []
+            for q in range(len(queries)):
+                order = best[q][np.argsort(-scores[q, best[q]])]
+                ranked.append([(int(candidates[i]), float(scores[q, i])) for i in order])
+
+            rows = sorted({row for hits in ranked for row, _ in hits})
+            records = {h["row"]: h for h in self._fetch("row", rows, True, include_embeddings)}
+        return [
+            [{**_public(records[row]), "distance": max(0.0, 1.0 - score)} for row, score in hits if row in records]
+            for hits in ranked
+        ]
+
+    def _scores(self, queries: np.ndarray, candidates: np.ndarray, whole: bool) -> np.ndarray:
+        """Cosine similarity of every query to every candidate row, block by block."""
+        scores = np.empty((len(queries), candidates.size), dtype=np.float32)
+        for i in range(0, candidates.size, _BLOCK_ROWS):
+            rows = slice(i, i + _BLOCK_ROWS) if whole else candidates[i:i + _BLOCK_ROWS]
+            block = np.asarray(self._vectors[rows], dtype=np.float32)
+            block_scores = queries @ block.T
+            if self._scales is not None:
+                block_scores *= self._scales[rows]
+            scores[:, i:i + len(block)] = block_scores
+        return scores
+
+    def _partition_scores(
+        self, queries: np.ndarray, sources: list[str], mask: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Candidate rows and their scores, from the partitions of ``sources``."""
+        parts = [self._partition(source) for source in sources]
+        rows = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([queries @ p[1].T for p in parts], axis=1)
+        # Other conditions of the filter (format, tags)
+        keep = mask[rows]
+        return rows[keep], scores[:, keep]
+
+    def _partition(self, source: str) -> tuple[np.ndarray, np.ndarray]:
+        """Rows of one source and their vectors; cached until the next write."""
+        cached = self._partitions.get(source)
+        if cached is not None:
+            self._partitions.move_to_end(source)
+            return cached
+        rows = np.flatnonzero(self._mask({"source": source}))
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        cached = (rows, vectors)
+        if vectors.nbytes <= self.partition_cache_bytes:
+            self._partitions[source] = cached
+            self._partition_bytes += vectors.nbytes
+            while self._partition_bytes > self.partition_cache_bytes:
+                _, (_, evicted) = self._partitions.popitem(last=False)
+                self._partition_bytes -= evicted.nbytes
+        return cached
+
+    def _mask(self, where: dict | None) -> np.ndarray:
+        """Live rows matching ``where``; cached per filter until the next write."""
+        if not where:
+            return self._live
+        key = json.dumps(where, sort_keys=True)
+        mask = self._filters.get(key)
+        if mask is None:
+            sql, params = _where_sql(where)
+            mask = np.zeros(self._rows, dtype=bool)
+            mask[np.fromiter(
+                (r for (r,) in self._db.execute(f"SELECT row FROM chunks WHERE {sql}", params)),
+                dtype=np.int64,
+            )] = True
+            self._filters[key] = mask
+            while len(self._filters) > _FILTER_CACHE_SIZE:
+                self._filters.popitem(last=False)
+        else:
+            self._filters.move_to_end(key)
+        return mask
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include_documents: bool = True,
+        include_embeddings: bool = False,
+    ) -> list[dict]:
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                records = self._fetch("id", ids, include_documents, include_embeddings, where)
+            else:
+                records = self._fetch(None, None, include_documents, include_embeddings, where)
+        return [_public(r) for r in records]
+
+    def _fetch(
+        self,
+        column: str | None,
+        values: list | None,
+        include_documents: bool,
+        include_embeddings: bool,
+        where: dict | None = None,
+    ) -> list[dict]:
+        fields = "row, id, metadata" + (", document" if include_documents else "")
+        where_sql, where_params = _where_sql(where) if where else ("1", [])
+        if column is None:
+            results = self._db.execute(
+                f"SELECT {fields} FROM chunks WHERE {where_sql}", where_params,
+            ).fetchall()
+        else:
+            results = []
+            for batch in _batches(values):
+                results += self._db.execute(
+                    f"SELECT {fields} FROM chunks"
+                    f" WHERE {column} IN ({','.join('?' * len(batch))}) AND {where_sql}",
+                    [*batch, *where_params],
+                ).fetchall()
+        records = []
+        for result in results:
+            record = {
+                "row": result[0],
+                "id": result[1],
+                "metadata": json.loads(result[2]),
+                "text": result[3] if include_documents else None,
+                "distance": None,
+            }
+            if include_embeddings:
+                record["embedding"] = self._decode(result[0])
+            records.append(record)
+        return records
+
+    def _decode(self, row: int) -> list[float]:
+        vector = np.asarray(self._vectors[row], dtype=np.float32)
+        if self._scales is not None:
+            vector = vector * self._scales[row]
+        return vector.tolist()
+
+    def sources(self) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return [
+                s for (s,) in self._db.execute(
+                    "SELECT DISTINCT source FROM chunks WHERE source IS NOT NULL ORDER BY source"
+                )
+            ]
+
+    def preload(self) -> None:
+        # Read the whole matrix once so it sits in the page cache
+        with self._lock:
+            self._refresh()
+            for i in range(0, self._rows, _BLOCK_ROWS):
+                np.asarray(self._vectors[i:i + _BLOCK_ROWS]).sum()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _where_sql(where: dict) -> tuple[str, list]:
+    """Translate a Chroma-style metadata filter into a SQL condition."""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(w) for w in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params += part_params
+            continue
+        if key == "source":
+            column, column_params = "source", []
+        else:
+            column, column_params = "json_extract(metadata, ?)", [f'$."{key}"']
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in ("$in", "$nin"):
+                values = list(value)
+                if not values:
+                    clauses.append("0" if op == "$in" else "1")
+                    continue
+                negate = " NOT" if op == "$nin" else ""
+                clauses.append(f"{column}{negate} IN ({','.join('?' * len(values))})")
+                params += column_params + values
+            elif op in _OPERATORS:
+                clauses.append(f"{column} {_OPERATORS[op]} ?")
+                params += column_params + [value]
+            else:
+                raise ValueError(f"Operador de filtro no soportado: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+def _where_sources(where: dict | None) -> list[str] | None:
+    """Sources a filter is restricted to, if it has a top-level condition on them."""
+    if not where:
+        return None
+    for clause in [where, *where.get("$and", [])]:
+        condition = clause.get("source")
+        if condition is None:
+            continue
+        if not isinstance(condition, dict):
+            return [condition]
+        if "$eq" in condition:
+            return [condition["$eq"]]
+        if "$in" in condition:
+            return list(dict.fromkeys(condition["$in"]))
+    return None
+
+
+def _public(record: dict) -> dict:
+    return {k: v for k, v in record.items() if k != "row"}
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _batches(values: list, size: int = _MAX_PARAMS):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _write_at(path: Path, offset: int, array: np.ndarray) -> None:
+    data = np.ascontiguousarray(array).tobytes()
+    with open(path, "r+b" if path.exists() else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        # Only shrink when a failed write left bytes past the end: on
+        # Windows that fails while another process maps the file
+        if os.fstat(f.fileno()).st_size > offset + len(data):
+            f.truncate()
@@ -1,83 +1,285 @@
-import chromadb
+import asyncio
+import json
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
 
 from config.settings import get_settings
+from backend.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from backend.services.metrics import INGEST_CHUNKS, INGEST_STAGE_SECONDS
 from backend.services.ollama_client import OllamaClient
+from backend.services.vector_backends import VectorBackend, create_backend
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Chunk metadata key marking a tag; metadata values cannot be lists
+TAG_PREFIX = "tag:"
+# Filters whose allowed chunk IDs are kept for the lexical search
+_SCOPE_CACHE_SIZE = 64
+
+
+def normalize_tags(tags: Iterable[str] | None) -> tuple[str, ...]:
+    """Lower-cased, trimmed, sorted and unique."""
+    return tuple(sorted({t.strip().lower() for t in tags or () if t.strip()}))
+
+
+@dataclass(frozen=True)
+class RetrievalFilter:
+    """Restricts retrieval to some documents.
+
+    A chunk matches if its document is one of ``sources``, has one of
+    ``formats`` and carries any of ``tags``; empty fields match all.
+    Hashable, so it can be part of cache keys.
+    """
+
+    sources: tuple[str, ...] = ()
+    formats: tuple[str, ...] = ()
+    tags: tuple[str, ...] = ()
+
+    @classmethod
+    def create(
+        cls,
+        sources: Iterable[str] | None = None,
+        formats: Iterable[str] | None = None,
+        tags: Iterable[str] | None = None,
+    ) -> "RetrievalFilter | None":
+        """A normalized filter, or None if it would match everything."""
+        scope = cls(
+            sources=tuple(sorted({s.strip() for s in sources or () if s.strip()})),
+            formats=tuple(sorted({"." + f.strip().lower().lstrip(".") for f in formats or () if f.strip()})),
+            tags=normalize_tags(tags),
+        )
+        return scope if scope.sources or scope.formats or scope.tags else None
+
+    def where(self) -> dict:
+        """The filter as a Chroma-style metadata condition."""
+        clauses = []
+        if self.sources:
+            clauses.append({"source": {"$in": list(self.sources)}})
+        if self.formats:
+            clauses.append({"format": {"$in": list(self.formats)}})
+        if self.tags:
+            tags = [{TAG_PREFIX + t: True} for t in self.tags]
+            clauses.append(tags[0] if len(tags) == 1 else {"$or": tags})
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 
 class VectorStore:
-    def __init__(self):
+    """Chunk storage and retrieval: vector, lexical (BM25) or hybrid.
+
+    Embeddings are kept by a VectorBackend chosen with ``vector_backend``
+    (Chroma or a memory-mapped NumPy matrix); the lexical index and the
+    corpus version are shared by both.
+    """
+
+    def __init__(self, ollama: OllamaClient | None = None, backend: VectorBackend | None = None):
         settings = get_settings()
-        self._client = chromadb.PersistentClient(
-            path=str(settings.vectorstore_path)
-        )
-        self._collection = self._client.get_or_create_collection(
-            name="ross_documents",
-            metadata={"hnsw:space": "cosine"},
-        )
-        self._ollama = OllamaClient()
+        self._backend = backend or create_backend(settings.vectorstore_path)
+        self._ollama = ollama or OllamaClient()
+        self._version_path = settings.vectorstore_path / "corpus_version"
+        # (mtime, size) of the version file when last read, and its content
+        self._version_stamp: tuple[int, int] | None = None
+        self._version = "0"
+        self._lexical = LexicalIndex(settings.vectorstore_path / "lexical_index.sqlite3")
+        self._sync_lexical_index()
+        # where (JSON) -> (corpus version, IDs of the chunks it allows)
+        self._scopes: OrderedDict[str, tuple[str, frozenset[str]]] = OrderedDict()
+
+    def _sync_lexical_index(self) -> None:
+        """Rebuild the BM25 index if it is out of step with the collection.
+
+        Covers stores created before the lexical index existed.
+        """
+        if self._lexical.count() == self._backend.count():
+            return
+        self._lexical.reset()
+        chunks = self._backend.get()
+        self._lexical.add([c["id"] for c in chunks], [c["text"] for c in chunks])
+
+    @property
+    def ollama(self) -> OllamaClient:
+        """The client used for embeddings, so ingestion shares its host pool and batcher."""
+        return self._ollama
 
     @property
     def chunks_count(self) -> int:
-        return self._collection.count()
+        return self._backend.count()
+
+    @property
+    def corpus_version(self) -> str:
+        """Opaque token that changes every time the collection is modified.
+
+        Stored on disk so that the ingest script and every server process
+        agree on it; the file is only read again when its mtime or size
+        changes.
+        """
+        try:
+            stat = self._version_path.stat()
+        except FileNotFoundError:
+            return "0"
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._version_stamp:
+            self._version = self._version_path.read_text().strip()
+            self._version_stamp = stamp
+        return self._version
+
+    def bump_corpus_version(self) -> None:
+        """Mark the collection as changed.
+
+        ``add_embeddings`` and ``delete`` leave this to the caller, so a
+        document written in many batches changes the version once.
+        """
+        self._version_path.parent.mkdir(parents=True, exist_ok=True)
+        self._version_path.write_text(uuid.uuid4().hex)
 
     async def add_documents(
         self,
         texts: list[str],
         metadatas: list[dict],
         ids: list[str],
+        progress: Callable[[int, int], None] | None = None,
     ) -> None:
+        """Embed and store chunks batch by batch.
+
+        ``progress(done, total)`` is called after every stored batch.
+        """
         if not texts:
             return
 
         # Embed in batches of 32 to avoid timeouts
         batch_size = 32
-        all_embeddings = []
         for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
-            embeddings = await self._ollama.embed_batch(batch)
-            all_embeddings.extend(embeddings)
-
-        self._collection.add(
-            documents=texts,
-            embeddings=all_embeddings,
-            metadatas=metadatas,
-            ids=ids,
-        )
+            batch = slice(i, i + batch_size)
+            with INGEST_STAGE_SECONDS.time(stage="embed"):
+                embeddings = await self._ollama.embed_batch(texts[batch])
+            with INGEST_STAGE_SECONDS.time(stage="write"):
+                await asyncio.to_thread(
+                    self.add_embeddings, texts[batch], embeddings, metadatas[batch], ids[batch],
+                )
+            if progress is not None:
+                progress(min(i + batch_size, len(texts)), len(texts))
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict],
+        ids: list[str],
+    ) -> None:
+        """Write chunks whose embeddings were already computed.
 
-    async def search(self, query: str, top_k: int | None = None) -> list[dict]:
+        Call ``bump_corpus_version()`` once the document is written.
+        """
+        if not texts:
+            return
+        # Upsert so re-ingesting a changed file overwrites its chunks in place
+        self._backend.upsert(ids, texts, embeddings, metadatas)
+        self._lexical.add(ids, texts)
+        INGEST_CHUNKS.inc(len(ids))
+
+    async def search(
+        self,
+        query: str,
+        top_k: int | None = None,
+        query_embedding: list[float] | None = None,
+        mode: str | None = None,
+        include_embeddings: bool = False,
+        filters: RetrievalFilter | None = None,
+    ) -> list[dict]:
+        """Retrieve the ``top_k`` most relevant chunks.
+
+        ``mode`` is "vector" (cosine), "lexical" (BM25) or "hybrid"
+        (both rankings fused with reciprocal rank fusion). With
+        ``include_embeddings`` every hit also carries its stored vector.
+        ``filters`` goes to the backend as a ``where`` clause, and limits
+        the lexical search to the chunks it allows.
+        """
         settings = get_settings()
         top_k = top_k or settings.retrieval_top_k
+        mode = mode or settings.retrieval_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Modo de búsqueda no soportado: {mode}")
 
-        if self._collection.count() == 0:
+        if self._backend.count() == 0:
             return []
 
-        query_embedding = await self._ollama.embed(query)
+        where = filters.where() if filters else None
+        if mode == "lexical":
+            ranked = self._lexical.search(query, top_k, ids=self._scope_ids(where))
+            return self._get_hits([chunk_id for chunk_id, _ in ranked], include_embeddings)
 
-        results = self._collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k, self._collection.count()),
-            include=["documents", "metadatas", "distances"],
-        )
+        if query_embedding is None:
+            query_embedding = await self._ollama.embed(query)
 
-        hits = []
-        for i in range(len(results["documents"][0])):
-            hits.append({
-                "text": results["documents"][0][i],
-                "metadata": results["metadatas"][0][i],
-                "distance": results["distances"][0][i],
-            })
-        return hits
+        n_results = top_k if mode == "vector" else max(top_k, settings.retrieval_candidates)
+        hits = self._backend.query(
+            [query_embedding], n_results, where=where, include_embeddings=include_embeddings,
+        )[0]
+        if mode == "vector":
+            return hits
+
+        lexical_ids = [
+            chunk_id for chunk_id, _ in self._lexical.search(query, n_results, ids=self._scope_ids(where))
+        ]
+        fused = reciprocal_rank_fusion(
+            [[h["id"] for h in hits], lexical_ids], k=settings.rrf_k,
+        )[:top_k]
+
+        by_id = {h["id"]: h for h in hits}
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+        for hit in self._get_hits(missing, include_embeddings):
+            by_id[hit["id"]] = hit
+        return [
+            {**by_id[chunk_id], "score": score}
+            for chunk_id, score in fused
+            if chunk_id in by_id
+        ]
+
+    def _scope_ids(self, where: dict | None) -> frozenset[str] | None:
+        """IDs of the chunks matching ``where``; cached until the corpus changes."""
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        version = self.corpus_version
+        cached = self._scopes.get(key)
+        if cached is not None and cached[0] == version:
+            self._scopes.move_to_end(key)
+            return cached[1]
+        ids = frozenset(h["id"] for h in self._backend.get(where=where, include_documents=False))
+        self._scopes[key] = (version, ids)
+        self._scopes.move_to_end(key)
+        while len(self._scopes) > _SCOPE_CACHE_SIZE:
+            self._scopes.popitem(last=False)
+        return ids
+
+    def _get_hits(self, ids: list[str], include_embeddings: bool = False) -> list[dict]:
+        """Fetch chunks by ID, preserving the given order."""
+        if not ids:
+            return []
+        found = {h["id"]: h for h in self._backend.get(ids, include_embeddings=include_embeddings)}
+        return [found[i] for i in ids if i in found]
+
+    def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        self._backend.delete(ids)
+        self._lexical.delete(ids)
+
+    def get_ids(self, source: str) -> list[str]:
+        return [h["id"] for h in self._backend.get(where={"source": source}, include_documents=False)]
 
     def reset(self) -> None:
-        self._client.delete_collection("ross_documents")
-        self._collection = self._client.get_or_create_collection(
-            name="ross_documents",
-            metadata={"hnsw:space": "cosine"},
-        )
+        self._backend.reset()
+        self._lexical.reset()
+        self.bump_corpus_version()
+
+    def get_all_metadatas(self) -> dict[str, dict]:
+        """Metadata of every chunk by ID. Scans the whole store."""
+        return {h["id"]: h["metadata"] for h in self._backend.get(include_documents=False)}
+
+    def preload(self) -> None:
+        self._backend.preload()
 
     def get_document_names(self) -> list[str]:
-        if self._collection.count() == 0:
-            return []
-        all_meta = self._collection.get(include=["metadatas"])
-        names = {m.get("source", "unknown") for m in all_meta["metadatas"]}
-        return sorted(names)
+        return self._backend.sources()
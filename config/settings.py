@@ -7,21 +7,163 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Ollama
     ollama_base_url: str = "http://localhost:11434"
+    # Several Ollama hosts (JSON lists), with generation and embeddings on
+    # separate pools. Empty: ollama_base_url serves both.
+    ollama_generate_urls: list[str] = []
+    ollama_embed_urls: list[str] = []
+    # Routing: hosts that already have the model loaded count this many
+    # outstanding requests less
+    ollama_affinity_requests: int = 2
+    # Connection errors in a row before a host is taken out of rotation;
+    # the health probe (health_probe_interval) puts it back
+    ollama_eject_after_failures: int = 2
     llm_model: str = "qwen2.5:7b"
     embedding_model: str = "bge-m3"
 
+    # Ollama HTTP connection pool (shared for the whole app lifetime)
+    ollama_max_connections: int = 20
+    ollama_max_keepalive_connections: int = 10
+    ollama_keepalive_expiry: float = 60.0
+    ollama_http2: bool = False
+
+    # Ollama timeouts (seconds)
+    ollama_connect_timeout: float = 10.0
+    ollama_pool_timeout: float = 10.0
+    ollama_health_timeout: float = 5.0
+    ollama_list_timeout: float = 10.0
+    ollama_generate_timeout: float = 300.0
+    ollama_embed_timeout: float = 30.0
+    ollama_embed_batch_timeout: float = 120.0
+    ollama_warmup_timeout: float = 60.0
+    # How long Ollama keeps a model loaded after each request or warm-up
+    ollama_keep_alive: str = "30m"
+    # Query embeddings requested within embed_batch_window seconds of each
+    # other are sent as a single request of up to embed_batch_max_size texts
+    embed_batching_enabled: bool = True
+    embed_batch_window: float = 0.005
+    embed_batch_max_size: int = 32
+
+    # Background health probe (seconds)
+    health_probe_interval: float = 10.0
+    health_stale_after: float = 30.0
+
+    # Model residency: Ollama's loaded models are polled every
+    # model_residency_interval seconds (0: never) to record load and unload
+    # events. model_pin_policy keeps the default LLM and embedding model
+    # loaded by refreshing their keep_alive before it runs out:
+    # "always", "schedule" (model_pin_hours on model_pin_weekdays,
+    # 0 = Monday, server local time), "traffic" (until
+    # model_pin_idle_minutes without requests) or "off".
+    model_residency_interval: float = 30.0
+    model_pin_policy: str = "always"
+    model_pin_hours: str = "07:00-19:00"
+    model_pin_weekdays: list[int] = [0, 1, 2, 3, 4]
+    model_pin_idle_minutes: float = 60.0
+
+    # Generation admission control: concurrent generations per model, and
+    # how many requests may wait before new ones get 429
+    generation_max_in_flight: int = 2
+    generation_max_in_flight_per_model: dict[str, int] = {}
+    generation_max_queue: int = 16
+    generation_retry_after: int = 5
+    # Identical questions asked while one is being answered share its stream
+    chat_coalescing_enabled: bool = True
+    # SSE output: tokens are sent in frames of up to sse_coalesce_window
+    # seconds or sse_coalesce_max_chars characters (0 = one frame per token)
+    sse_coalesce_window: float = 0.05
+    sse_coalesce_max_chars: int = 512
+
     # RAG
     chunk_size: int = 512
     chunk_overlap: int = 50
     retrieval_top_k: int = 5
+    # vector | lexical | hybrid (vector + BM25 fused with reciprocal rank fusion)
+    retrieval_mode: str = "hybrid"
+    retrieval_candidates: int = 20
+    rrf_k: int = 60
+
+    # Post-retrieval: MMR over retrieval_fetch_k candidates, then a context budget
+    # (also bounded by what the model's num_ctx leaves, see below)
+    mmr_enabled: bool = True
+    mmr_lambda: float = 0.7
+    retrieval_fetch_k: int = 20
+    context_max_tokens: int = 2000
+
+    # LLM context window, sent as num_ctx with every generation. The prompt
+    # is fitted to num_ctx minus prompt_reserve_tokens (room for thinking
+    # and the answer); num_predict -1 lets the answer use all of it.
+    llm_num_ctx: int = 8192
+    llm_num_ctx_per_model: dict[str, int] = {}
+    llm_num_predict: int = -1
+    prompt_reserve_tokens: int = 1024
+    # Characters per token by model name, to override the family estimate
+    llm_chars_per_token: dict[str, float] = {}
+    # Chunks retrieved this many times go first in the prompt, in a fixed
+    # order, so Ollama can reuse the cached prefix across questions
+    prompt_hot_chunk_min_hits: int = 3
+    prompt_hot_chunk_tracked: int = 2000
+
+    # Chat sessions (kept in memory, dropped after session_ttl seconds idle).
+    # Past session_history_max_tokens, all but the last session_keep_turns
+    # turns are folded into a summary, so each prompt stays the same size.
+    session_max: int = 1000
+    session_ttl: float = 3600.0
+    session_history_max_tokens: int = 1000
+    session_keep_turns: int = 2
+    session_summary_max_tokens: int = 256
+    # Rewrite follow-ups ("¿y cuánto pesa?") as standalone questions for retrieval
+    session_condense_questions: bool = True
+
+    # Embedding cache (memory LRU + SQLite file next to the vector store)
+    embedding_cache_enabled: bool = True
+    embedding_cache_memory_items: int = 10_000
+
+    # Semantic answer cache (in memory, invalidated by any ingestion)
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95
+    answer_cache_max_entries: int = 1000
+    answer_cache_ttl: float = 86400.0
+
+    # Ingestion pipeline
+    ingest_workers: int = 4
+    ingest_embed_concurrency: int = 2
+    ingest_embed_batch_size: int = 32
+    ingest_embed_batch_min: int = 4
+    ingest_embed_batch_max: int = 256
+    ingest_embed_batch_target_seconds: float = 10.0
+    # Files at least this large are parsed page by page in a thread and
+    # embedded as they are read, instead of whole (in the process pool, or
+    # a thread for uploads)
+    ingest_stream_min_bytes: int = 8 * 1024 * 1024
+
+    # Background ingestion of uploads
+    ingest_job_workers: int = 2
+    ingest_job_history: int = 200
+    upload_chunk_size: int = 1024 * 1024
 
     # Paths
     documents_dir: str = "./data/documents"
     vectorstore_dir: str = "./data/vectorstore"
+    # "chroma" (HNSW) or "numpy" (memory-mapped matrix, exact search; fast
+    # to open and light on RAM up to ~100k chunks). Switching starts an
+    # empty store: run scripts/ingest.py --reset afterwards.
+    vector_backend: str = "chroma"
+    # numpy backend storage: "float16" or "int8" (half the size, slightly
+    # less precise). Applies when the store is created or reset.
+    vector_numpy_dtype: str = "float16"
+    # numpy backend: memory for per-source copies of the vectors, so
+    # questions scoped to some documents only score their rows. Chroma has
+    # no partitions: it applies the filter inside its single HNSW index
+    vector_partition_cache_mb: int = 256
 
-    # Server
+    # Server. Each worker is a separate process with its own queue limits,
+    # caches and chat sessions; upload jobs are shared through SQLite and
+    # model pinning runs in the worker holding the residency lease.
     host: str = "0.0.0.0"
     port: int = 8000
+    workers: int = 1
+    # Load the vector index and the default models before accepting requests
+    startup_warmup: bool = True
 
     model_config = {
         "env_prefix": "ROSS_",
@@ -37,6 +179,11 @@ class Settings(BaseSettings):
     def vectorstore_path(self) -> Path:
         return Path(self.vectorstore_dir)
 
+    @property
+    def embedding_cache_path(self) -> Path:
+        # Derived data, like the index: kept with it and out of data/
+        return self.vectorstore_path / "embedding_cache.sqlite3"
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -15,6 +15,20 @@ let isGenerating = false;
 let selectedModel = null;
 let thinkingEnabled = true;
 let currentModelThinks = false;
+// One conversation per page load; follow-up questions are answered in its context.
+// crypto.randomUUID only exists on HTTPS/localhost.
+const sessionId = crypto.randomUUID
+  ? crypto.randomUUID()
+  : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+// Product pages scope the questions through the URL, e.g.
+// ?sources=manual-bomba.pdf&tags=bombas&formats=pdf (comma-separated lists)
+const pageParams = new URLSearchParams(location.search);
+const scope = {};
+for (const key of ["sources", "formats", "tags"]) {
+  const values = (pageParams.get(key) || "").split(",").map((v) => v.trim()).filter(Boolean);
+  if (values.length) scope[key] = values;
+}
 
 // --- Debug panel ---
 const debugPanel = document.getElementById("debug-panel");
@@ -180,7 +194,7 @@ function renderModelMenu(models) {
     btn.innerHTML = `
       <div class="model-option-info">
         <span class="model-option-name">${m.name}</span>
-        <span class="model-option-size">${m.size}</span>
+        <span class="model-option-size">${m.size}${m.loaded ? " · en memoria" : ""}</span>
       </div>
       <svg class="model-option-check" width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2.5">
         <polyline points="20 6 9 17 4 12"/>
@@ -239,10 +253,15 @@ function selectModel(model) {
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ model }),
   })
-    .then(() => {
+    .then((resp) => resp.json())
+    .then((data) => {
       modelToggle.classList.remove("loading");
       setDebugState("done", "Modelo listo");
       debugLogEntry("done", `${model} cargado en memoria`);
+      if (data.ok && info && !info.loaded) {
+        info.loaded = true;
+        renderModelMenu(modelList);
+      }
     })
     .catch(() => {
       modelToggle.classList.remove("loading");
@@ -367,9 +386,15 @@ async function sendMessage(text) {
     const resp = await fetch("/api/chat", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ message: text, model: selectedModel, think: useThinking }),
+      body: JSON.stringify({
+        message: text, model: selectedModel, think: useThinking, session_id: sessionId, ...scope,
+      }),
     });
 
+    if (resp.status === 429) {
+      const body = await resp.json().catch(() => ({}));
+      throw new Error(body.detail || "Servidor ocupado, inténtalo de nuevo en unos segundos");
+    }
     if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
 
     setDebugState("thinking", "Procesando prompt...");
@@ -399,6 +424,10 @@ async function sendMessage(text) {
         const jsonStr = line.slice(6);
         try {
           const data = JSON.parse(jsonStr);
+          if (data.type === "queue") {
+            setDebugState("thinking", `En cola (posición ${data.position})`);
+            debugLogEntry("info", `En cola, posición ${data.position}`);
+          }
           if (data.type === "thinking" && data.token) {
             if (!thinkingEl) {
               thinkingEl = document.createElement("details");
@@ -410,7 +439,7 @@ async function sendMessage(text) {
               debugLogEntry("thinking", "Fase de razonamiento iniciada");
             }
             fullThinking += data.token;
-            debugThinkingCount++;
+            debugThinkingCount += data.count || 1;
             dbg.thinkingTokens.textContent = debugThinkingCount;
             updateDebugBars();
             thinkingEl.querySelector(".thinking-content").innerHTML = formatText(fullThinking);
@@ -430,7 +459,7 @@ async function sendMessage(text) {
               debugLogEntry("response", "Generando respuesta");
             }
             fullResponse += data.token;
-            debugResponseCount++;
+            debugResponseCount += data.count || 1;
             dbg.responseTokens.textContent = debugResponseCount;
             updateDebugBars();
             const target = assistantBubble.querySelector(".response-text") || assistantBubble;
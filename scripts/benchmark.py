@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Pruebas de carga del asistente.
+
+Arranca un Ollama falso (scripts/fake_ollama.py) y el servidor en un
+directorio temporal, genera documentos sintéticos y mide cada escenario
+con la concurrencia indicada. El resultado (throughput, tiempo hasta el
+primer token y latencias p50/p95/p99) se escribe en JSON para comparar
+ejecuciones entre cambios.
+
+Escenarios:
+    ingest     scripts/ingest.py --reset sobre los documentos sintéticos
+    chat       POST /api/chat (SSE)
+    chat-sync  POST /api/chat/sync
+    upload     POST /api/documents/upload hasta que el trabajo termina
+
+Uso:
+    python scripts/benchmark.py                                # Todos los escenarios
+    python scripts/benchmark.py --scenarios chat --requests 200 --concurrency 16
+    python scripts/benchmark.py --tokens-per-second 30 --latency 0.5 --output bench.json
+    python scripts/benchmark.py --ollama-url http://localhost:11434   # Ollama real
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from config.settings import get_settings
+
+SCENARIOS = ("ingest", "chat", "chat-sync", "upload")
+
+VOCABULARY = (
+    "máquina sensor motor presión temperatura válvula bomba filtro aceite correa "
+    "turno operario revisión limpieza calibración alarma código error fallo pieza "
+    "repuesto manual procedimiento seguridad parada arranque mantenimiento preventivo "
+    "correctivo lubricación tornillo rodamiento husillo cabezal boquilla molde"
+).split()
+
+
+def log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def summarize(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    data = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(data, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean": round(float(data.mean()), 4),
+        "min": round(float(data.min()), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(data.max()), 4),
+    }
+
+
+def synthetic_text(rng: random.Random, words: int) -> str:
+    lines = []
+    for start in range(0, words, 12):
+        line = " ".join(rng.choice(VOCABULARY) for _ in range(min(12, words - start)))
+        lines.append(f"{line.capitalize()}. Código RX-{rng.randint(100, 999)}.")
+    return "\n".join(lines)
+
+
+def write_documents(directory: Path, count: int, words: int, seed: int) -> list[Path]:
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = directory / f"bench_{i:04d}.txt"
+        path.write_text(synthetic_text(rng, words), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def questions(count: int, pool: int) -> list[str]:
+    """``pool`` distinct questions cycled over ``count`` requests.
+
+    With pool == count every question is new and the answer cache never
+    hits; a small pool measures the cached path.
+    """
+    rng = random.Random(7)
+    distinct = [
+        f"¿Qué significa el código de error E{i} en la {rng.choice(VOCABULARY)} "
+        f"y cómo se revisa el {rng.choice(VOCABULARY)}?"
+        for i in range(pool)
+    ]
+    return [distinct[i % pool] for i in range(count)]
+
+
+async def run_load(func, items: list, concurrency: int) -> tuple[list[dict], float]:
+    """Call ``func(item)`` for every item with at most ``concurrency`` in flight."""
+    results: list[dict] = [None] * len(items)
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(items):
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                result = await func(items[index])
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            result["latency"] = time.perf_counter() - start
+            results[index] = result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(items))))))
+    return results, time.perf_counter() - start
+
+
+def report(results: list[dict], wall: float, concurrency: int, **extra) -> dict:
+    ok = [r for r in results if "error" not in r]
+    errors = [r["error"] for r in results if "error" in r]
+    summary = {
+        "requests": len(results),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else None,
+        "latency": summarize([r["latency"] for r in ok]),
+        **extra,
+    }
+    if errors:
+        summary["error_samples"] = sorted(set(errors))[:5]
+    return summary
+
+
+# --- Scenarios ---
+
+async def bench_chat(client: httpx.AsyncClient, args) -> dict:
+    async def one(question: str) -> dict:
+        start = time.perf_counter()
+        ttft = None
+        tokens = 0
+        cached = False
+        async with client.stream(
+            "POST", "/api/chat", json={"message": question, "think": args.think},
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = json.loads(line[6:])
+                if "error" in data:
+                    raise RuntimeError(data["error"])
+                if data.get("token"):
+                    tokens += data.get("count", 1)
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                elif data.get("type") == "stats":
+                    cached = bool(data["stats"].get("cached"))
+        return {"ttft": ttft, "tokens": tokens, "cached": cached}
+
+    results, wall = await run_load(
+        one, questions(args.requests, args.question_pool or args.requests), args.concurrency,
+    )
+    ok = [r for r in results if "error" not in r]
+    tokens = sum(r["tokens"] for r in ok)
+    return report(
+        results, wall, args.concurrency,
+        ttft=summarize([r["ttft"] for r in ok if r["ttft"] is not None]),
+        tokens=tokens,
+        tokens_per_second=round(tokens / wall, 2) if wall else None,
+        cached=sum(r["cached"] for r in ok),
+    )
+
+
+async def bench_chat_sync(client: httpx.AsyncClient, args) -> dict:
+    async def one(question: str) -> dict:
+        response = await client.post("/api/chat/sync", json={"message": question})
+        response.raise_for_status()
+        return {}
+
+    # Offset the question set so sync requests miss the cache filled by the SSE run
+    items = [f"{q} (sync)" for q in questions(args.requests, args.question_pool or args.requests)]
+    results, wall = await run_load(one, items, args.concurrency)
+    return report(results, wall, args.concurrency)
+
+
+async def bench_upload(client: httpx.AsyncClient, args) -> dict:
+    rng = random.Random(args.seed + 1)
+    files = [
+        (f"upload_{i:04d}.txt", synthetic_text(rng, args.doc_words).encode("utf-8"))
+        for i in range(args.uploads)
+    ]
+
+    async def one(item: tuple[str, bytes]) -> dict:
+        name, content = item
+        start = time.perf_counter()
+        response = await client.post("/api/documents/upload", files={"file": (name, content)})
+        response.raise_for_status()
+        body = response.json()
+        if "job_id" not in body:
+            raise RuntimeError(body.get("error", body))
+        accepted = time.perf_counter() - start
+        while True:
+            job = (await client.get(f"/api/documents/jobs/{body['job_id']}")).json()
+            if job["stage"] == "error":
+                raise RuntimeError(job.get("error"))
+            if job["stage"] == "done":
+                return {"accepted": accepted, "chunks": job.get("chunks_total", 0)}
+            await asyncio.sleep(0.05)
+
+    results, wall = await run_load(one, files, args.concurrency)
+    ok = [r for r in results if "error" not in r]
+    chunks = sum(r["chunks"] for r in ok)
+    return report(
+        results, wall, args.concurrency,
+        accept_latency=summarize([r["accepted"] for r in ok]),
+        chunks=chunks,
+        chunks_per_second=round(chunks / wall, 2) if wall else None,
+    )
+
+
+async def bench_ingest(env: dict, documents_dir: Path, args) -> dict:
+    command = [
+        sys.executable, str(PROJECT_DIR / "scripts" / "ingest.py"),
+        "--reset", "--dir", str(documents_dir),
+    ]
+    if args.ingest_workers:
+        command += ["--workers", str(args.ingest_workers)]
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *command, cwd=PROJECT_DIR, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    output, _ = await process.communicate()
+    wall = time.perf_counter() - start
+    text = output.decode("utf-8", "replace")
+    chunks = next(
+        (int(line.split(":")[1]) for line in text.splitlines() if "Chunks creados" in line), 0,
+    )
+    result = {
+        "files": args.docs,
+        "exit_code": process.returncode,
+        "wall_seconds": round(wall, 3),
+        "chunks": chunks,
+        "chunks_per_second": round(chunks / wall, 2) if wall else None,
+        "files_per_second": round(args.docs / wall, 2) if wall else None,
+    }
+    if process.returncode != 0:
+        result["output_tail"] = text[-2000:]
+    return result
+
+
+# --- Processes ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until(url: str, timeout: float, process: asyncio.subprocess.Process) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.returncode is not None:
+                raise RuntimeError(f"El proceso terminó antes de estar listo: {url}")
+            try:
+                if (await client.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Sin respuesta de {url} tras {timeout}s")
+
+
+async def start_process(command: list[str], env: dict, ready_url: str) -> asyncio.subprocess.Process:
+    process = await asyncio.create_subprocess_exec(
+        *command, cwd=PROJECT_DIR, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        await wait_until(ready_url, 60, process)
+    except Exception:
+        await stop_process(process)
+        raise
+    return process
+
+
+async def stop_process(process: asyncio.subprocess.Process | None) -> None:
+    if process is None or process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), 10)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Pruebas de carga del asistente RÖS'S")
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS),
+        help=f"Escenarios separados por comas ({', '.join(SCENARIOS)})",
+    )
+    parser.add_argument("--requests", type=int, default=50, help="Peticiones de chat por escenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Peticiones simultáneas")
+    parser.add_argument(
+        "--question-pool", type=int,
+        help="Preguntas distintas (por defecto todas distintas; menos = aciertos de caché)",
+    )
+    parser.add_argument("--no-think", dest="think", action="store_false", help="Chat sin razonamiento")
+    parser.add_argument("--docs", type=int, default=20, help="Documentos sintéticos a ingestar")
+    parser.add_argument("--doc-words", type=int, default=2000, help="Palabras por documento")
+    parser.add_argument("--uploads", type=int, default=10, help="Documentos a subir en el escenario upload")
+    parser.add_argument("--ingest-workers", type=int, help="--workers para scripts/ingest.py")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--ollama-url",
+        help="Usa este Ollama en lugar del falso (los parámetros del falso se ignoran)",
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Ollama falso: velocidad")
+    parser.add_argument("--latency", type=float, default=0.2, help="Ollama falso: segundos hasta el primer token")
+    parser.add_argument("--response-tokens", type=int, default=64, help="Ollama falso: tokens por respuesta")
+    parser.add_argument("--thinking-tokens", type=int, default=16, help="Ollama falso: tokens de razonamiento")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Ollama falso: segundos por embedding")
+    parser.add_argument("--dimension", type=int, default=1024, help="Ollama falso: dimensión de los embeddings")
+    parser.add_argument("--output", type=str, help="Fichero JSON de salida (por defecto, stdout)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    settings = get_settings()
+    workdir = Path(tempfile.mkdtemp(prefix="ross-bench-"))
+    documents_dir = workdir / "documents"
+    write_documents(documents_dir, args.docs, args.doc_words, args.seed)
+
+    fake = server = None
+    try:
+        ollama_url = args.ollama_url
+        if ollama_url is None:
+            port = free_port()
+            ollama_url = f"http://127.0.0.1:{port}"
+            log(f"Ollama falso en {ollama_url}")
+            fake = await start_process(
+                [
+                    sys.executable, str(PROJECT_DIR / "scripts" / "fake_ollama.py"),
+                    "--port", str(port),
+                    "--models", f"{settings.llm_model},{settings.embedding_model}",
+                    "--tokens-per-second", str(args.tokens_per_second),
+                    "--latency", str(args.latency),
+                    "--response-tokens", str(args.response_tokens),
+                    "--thinking-tokens", str(args.thinking_tokens),
+                    "--embed-latency", str(args.embed_latency),
+                    "--dimension", str(args.dimension),
+                ],
+                os.environ.copy(),
+                f"{ollama_url}/api/tags",
+            )
+
+        # Everything the server writes stays in the temporary directory
+        env = {
+            **os.environ,
+            "ROSS_OLLAMA_BASE_URL": ollama_url,
+            "ROSS_DOCUMENTS_DIR": str(documents_dir),
+            "ROSS_VECTORSTORE_DIR": str(workdir / "vectorstore"),
+        }
+        results: dict = {}
+
+        # Ingest runs before the server opens the vector store
+        if "ingest" in scenarios:
+            log(f"ingest: {args.docs} documentos")
+            results["ingest"] = await bench_ingest(env, documents_dir, args)
+
+        http_scenarios = [s for s in scenarios if s != "ingest"]
+        if http_scenarios:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            log(f"Servidor en {base_url}")
+            server = await start_process(
+                [
+                    sys.executable, "-m", "uvicorn", "backend.main:app",
+                    "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+                ],
+                env,
+                f"{base_url}/api/health/ready",
+            )
+            limits = httpx.Limits(max_connections=args.concurrency * 2)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600) as client:
+                for name, bench in (
+                    ("chat", bench_chat),
+                    ("chat-sync", bench_chat_sync),
+                    ("upload", bench_upload),
+                ):
+                    if name in http_scenarios:
+                        log(f"{name}: concurrencia {args.concurrency}")
+                        results[name] = await bench(client, args)
+                metrics = await client.get("/metrics")
+                if metrics.status_code == 200:
+                    (workdir / "metrics.txt").write_text(metrics.text, encoding="utf-8")
+    finally:
+        await stop_process(server)
+        await stop_process(fake)
+
+    output = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "workdir": str(workdir),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output",)
+        },
+        "ollama": "real" if args.ollama_url else "fake",
+        "llm_model": settings.llm_model,
+        "embedding_model": settings.embedding_model,
+        "results": results,
+    }
+    text = json.dumps(output, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        log(f"Resultados en {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Servidor falso de Ollama para pruebas de carga sin GPU.
+
+Implementa /api/tags, /api/ps, /api/chat (con y sin streaming, con tokens
+de razonamiento si se pide ``think``) y /api/embed, con velocidad de
+generación, latencias y dimensión de embedding configurables. Los
+embeddings son deterministas: el mismo texto da siempre el mismo vector.
+/fake/stats cuenta las peticiones recibidas, para comprobar el reparto
+entre varias instancias. Los modelos se descargan al vencer su
+``keep_alive`` (5 minutos si la petición no lo indica) y /api/ps informa
+de cuándo; cargar uno tarda ``--load-seconds``.
+
+Uso:
+    python scripts/fake_ollama.py                          # Puerto 11500
+    python scripts/fake_ollama.py --port 11500 --tokens-per-second 40 \\
+        --latency 0.3 --dimension 1024
+    python scripts/fake_ollama.py --instances 3 --cold     # Puertos 11500-11502,
+                                                           # modelos cargados al usarlos
+    python scripts/fake_ollama.py --cold --load-seconds 3  # Cargas en frío lentas
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+WORDS = (
+    "la máquina debe revisarse antes de cada turno según el manual de "
+    "mantenimiento y el código de error indica un fallo del sensor"
+).split()
+KEEP_ALIVE_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def keep_alive_seconds(value) -> float | None:
+    """Seconds a model stays loaded after a request; None is forever (negative keep_alive)."""
+    if value is None:
+        return 300.0
+    if isinstance(value, str) and value[-1:] in KEEP_ALIVE_UNITS:
+        seconds = float(value[:-1]) * KEEP_ALIVE_UNITS[value[-1]]
+    else:
+        seconds = float(value)
+    return None if seconds < 0 else seconds
+
+
+def create_app(
+    models: list[str],
+    tokens_per_second: float,
+    latency: float,
+    response_tokens: int,
+    thinking_tokens: int,
+    embed_latency: float,
+    embed_item_latency: float,
+    dimension: int,
+    cold: bool = False,
+    load_seconds: float = 0.0,
+) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+    token_interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+    # Model -> when it unloads (time.time(), None: never). With ``cold``,
+    # a model shows in /api/ps only once it has been used
+    loaded: dict[str, float | None] = {} if cold else dict.fromkeys(models)
+    requests = {"chat": 0, "embed": 0, "loads": 0}
+
+    def expire() -> None:
+        now = time.time()
+        for name, until in list(loaded.items()):
+            if until is not None and until <= now:
+                del loaded[name]
+
+    async def load(model: str, keep_alive) -> float:
+        """Load ``model`` if needed and renew its keep_alive; returns load seconds."""
+        expire()
+        took = 0.0
+        if model not in loaded:
+            requests["loads"] += 1
+            await asyncio.sleep(load_seconds)
+            took = load_seconds
+        seconds = keep_alive_seconds(keep_alive)
+        loaded[model] = None if seconds is None else time.time() + seconds
+        return took
+
+    def embedding(text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    @app.get("/api/tags")
+    async def tags():
+        return {
+            "models": [
+                {"name": name, "model": name, "details": {"parameter_size": "7B", "family": "fake"}}
+                for name in models
+            ]
+        }
+
+    @app.get("/api/ps")
+    async def ps():
+        expire()
+        entries = []
+        for name, until in loaded.items():
+            tagged = name if ":" in name else f"{name}:latest"
+            entry = {"name": tagged, "model": tagged}
+            if until is not None:
+                entry["expires_at"] = datetime.fromtimestamp(until, timezone.utc).isoformat()
+            entries.append(entry)
+        return {"models": entries}
+
+    @app.get("/fake/stats")
+    async def fake_stats():
+        expire()
+        return {"requests": requests, "loaded": sorted(loaded)}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        requests["embed"] += 1
+        took = await load(body.get("model"), body.get("keep_alive"))
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        await asyncio.sleep(embed_latency + embed_item_latency * len(texts))
+        return {
+            "model": body.get("model"),
+            "embeddings": [embedding(t) for t in texts],
+            "load_duration": int(took * 1e9),
+        }
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        requests["chat"] += 1
+        start = time.perf_counter()
+        took = await load(body.get("model"), body.get("keep_alive"))
+        messages = body.get("messages") or []
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        thinking = thinking_tokens if body.get("think") else 0
+
+        def stats(start: float) -> dict:
+            total = time.perf_counter() - start
+            return {
+                "done": True,
+                "total_duration": int(total * 1e9),
+                "load_duration": int(took * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(latency * 1e9),
+                "eval_count": thinking + response_tokens,
+                "eval_duration": int(max(total - latency, 0) * 1e9),
+            }
+
+        if not body.get("stream", True):
+            # Warm-up requests (no messages) return immediately
+            if messages:
+                await asyncio.sleep(latency + token_interval * (thinking + response_tokens))
+            text = " ".join(WORDS[i % len(WORDS)] for i in range(response_tokens if messages else 0))
+            return {"message": {"role": "assistant", "content": text}, **stats(start)}
+
+        async def lines():
+            await asyncio.sleep(latency)
+            for i in range(thinking + response_tokens):
+                await asyncio.sleep(token_interval)
+                word = WORDS[i % len(WORDS)] + " "
+                key = "thinking" if i < thinking else "content"
+                yield json.dumps({"message": {"role": "assistant", key: word}, "done": False}) + "\n"
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, **stats(start)}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso de Ollama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument(
+        "--models", default="qwen2.5:7b,bge-m3",
+        help="Modelos que se anuncian en /api/tags, separados por comas",
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Velocidad de generación")
+    parser.add_argument("--latency", type=float, default=0.2, help="Segundos hasta el primer token")
+    parser.add_argument("--response-tokens", type=int, default=64, help="Tokens por respuesta")
+    parser.add_argument(
+        "--thinking-tokens", type=int, default=16,
+        help="Tokens de razonamiento cuando la petición usa think",
+    )
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Segundos por petición de embedding")
+    parser.add_argument(
+        "--embed-item-latency", type=float, default=0.002,
+        help="Segundos adicionales por texto embebido",
+    )
+    parser.add_argument("--dimension", type=int, default=1024, help="Dimensión de los embeddings")
+    parser.add_argument(
+        "--instances", type=int, default=1,
+        help="Servidores independientes en puertos consecutivos, como varias máquinas con Ollama",
+    )
+    parser.add_argument(
+        "--cold", action="store_true",
+        help="Los modelos no aparecen en /api/ps hasta que se usan",
+    )
+    parser.add_argument(
+        "--load-seconds", type=float, default=0.0,
+        help="Segundos que tarda en cargarse un modelo que no está en memoria",
+    )
+    args = parser.parse_args()
+
+    servers = []
+    for i in range(args.instances):
+        app = create_app(
+            models=[m.strip() for m in args.models.split(",") if m.strip()],
+            tokens_per_second=args.tokens_per_second,
+            latency=args.latency,
+            response_tokens=args.response_tokens,
+            thinking_tokens=args.thinking_tokens,
+            embed_latency=args.embed_latency,
+            embed_item_latency=args.embed_item_latency,
+            dimension=args.dimension,
+            cold=args.cold,
+            load_seconds=args.load_seconds,
+        )
+        config = uvicorn.Config(app, host=args.host, port=args.port + i, log_level="warning")
+        servers.append(uvicorn.Server(config))
+
+    async def serve() -> None:
+        await asyncio.gather(*(s.serve() for s in servers))
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,17 @@
 """
 Ingesta de documentos RÖS'S al vector store.
 
+Solo se procesan los ficheros nuevos o modificados; los eliminados de la
+carpeta se borran del vector store.
+
 Uso:
-    python scripts/ingest.py              # Ingesta desde data/documents/
-    python scripts/ingest.py --reset      # Borra el vector store y reingesta
+    python scripts/ingest.py              # Ingesta incremental desde data/documents/
+    python scripts/ingest.py --reset      # Borra el vector store y reingesta todo
     python scripts/ingest.py --dir /ruta  # Ingesta desde directorio específico
+    python scripts/ingest.py --workers 8 --embed-concurrency 4
+                                          # Procesos de parseo y peticiones de embedding en paralelo
+    python scripts/ingest.py --dir /ruta/bombas --tags bombas,serie-x
+                                          # Etiqueta los ficheros nuevos o modificados
 """
 import argparse
 import asyncio
@@ -17,6 +24,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from backend.services.document_service import DocumentService
+from backend.services.ollama_client import close_http_client
 from backend.services.vector_store import VectorStore
 
 
@@ -24,9 +32,20 @@ async def main():
     parser = argparse.ArgumentParser(description="Ingesta documentos RÖS'S")
     parser.add_argument("--dir", type=str, help="Directorio con documentos")
     parser.add_argument("--reset", action="store_true", help="Borra el vector store antes de ingestar")
+    parser.add_argument("--workers", type=int, help="Procesos para leer y trocear documentos")
+    parser.add_argument(
+        "--embed-concurrency", type=int,
+        help="Peticiones de embedding simultáneas a Ollama",
+    )
+    parser.add_argument(
+        "--tags", type=str,
+        help="Etiquetas separadas por comas para todos los ficheros del directorio; los que "
+             "tenían otras se reindexan (por defecto conservan las que tenían)",
+    )
     args = parser.parse_args()
 
-    doc_service = DocumentService()
+    vector_store = VectorStore()
+    doc_service = DocumentService(vector_store=vector_store)
     directory = Path(args.dir) if args.dir else None
 
     # List available files
@@ -46,19 +65,23 @@ async def main():
     # Reset if requested
     if args.reset:
         print("\nReseteando vector store...")
-        vector_store = VectorStore()
-        vector_store.reset()
+        doc_service.reset()
 
     # Ingest
     print("\nProcesando documentos...\n")
     start = time.time()
-    stats = await doc_service.ingest_directory(directory)
+    stats = await doc_service.ingest_directory(
+        directory, workers=args.workers, embed_concurrency=args.embed_concurrency,
+        tags=args.tags.split(",") if args.tags is not None else None,
+    )
     elapsed = time.time() - start
 
     # Report
     print(f"\n{'=' * 50}")
     print(f"  Resultado:")
     print(f"  - Ficheros procesados: {stats['files_processed']}")
+    print(f"    (nuevos: {stats['added']}, actualizados: {stats['updated']}, "
+          f"eliminados: {stats['removed']}, sin cambios: {stats['skipped']})")
     print(f"  - Chunks creados: {stats['total_chunks']}")
     print(f"  - Tiempo: {elapsed:.1f}s")
     if stats["errors"]:
@@ -68,5 +91,12 @@ async def main():
     print(f"{'=' * 50}")
 
 
+async def run():
+    try:
+        await main()
+    finally:
+        await close_http_client()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
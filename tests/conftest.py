@@ -0,0 +1,38 @@
+import pytest
+
+from backend.services.embedding_cache import get_embedding_cache
+from config.settings import get_settings
+from scripts.fake_ollama import create_app
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def settings(tmp_path, monkeypatch):
+    """Settings read afresh for each test, with every store under ``tmp_path``."""
+    monkeypatch.setenv("ROSS_VECTORSTORE_DIR", str(tmp_path / "vectorstore"))
+    monkeypatch.setenv("ROSS_DOCUMENTS_DIR", str(tmp_path / "documents"))
+    monkeypatch.setenv("ROSS_EMBEDDING_CACHE_ENABLED", "false")
+    get_settings.cache_clear()
+    get_embedding_cache.cache_clear()
+    yield get_settings()
+    get_settings.cache_clear()
+    get_embedding_cache.cache_clear()
+
+
+@pytest.fixture
+def fake_ollama():
+    """The fake Ollama app, to mount with ``httpx.ASGITransport``."""
+    return create_app(
+        models=["qwen2.5:7b", "bge-m3"],
+        tokens_per_second=0,
+        latency=0,
+        response_tokens=8,
+        thinking_tokens=0,
+        embed_latency=0,
+        embed_item_latency=0,
+        dimension=16,
+    )
@@ -0,0 +1,59 @@
+import time
+
+from backend.services.answer_cache import AnswerCache, CachedAnswer
+
+
+def answer(text: str) -> CachedAnswer:
+    return CachedAnswer(question=text, chunks=[{"type": "response", "token": text}])
+
+
+def test_similar_question_hits_in_same_scope():
+    cache = AnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "m", False, "v1", answer("filtro"))
+    hit = cache.lookup([0.99, 0.05], "m", False, "v1")
+    assert hit is not None and hit.response == "filtro"
+    assert cache.lookup([0.0, 1.0], "m", False, "v1") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_are_scoped():
+    cache = AnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "m", False, "v1", answer("todo"))
+    cache.store([1.0, 0.0], "m", False, "v1", answer("bombas"), filters=("bombas",))
+
+    assert cache.lookup([1.0, 0.0], "m", False, "v1").response == "todo"
+    assert cache.lookup([1.0, 0.0], "m", False, "v1", filters=("bombas",)).response == "bombas"
+    assert cache.lookup([1.0, 0.0], "m", False, "v1", filters=("otro",)) is None
+    assert cache.lookup([1.0, 0.0], "other", False, "v1") is None
+    assert cache.lookup([1.0, 0.0], "m", True, "v1") is None
+
+
+def test_expired_entry_is_dropped():
+    cache = AnswerCache(threshold=0.9, ttl=60)
+    old = answer("viejo")
+    old.created_at = time.monotonic() - 120
+    cache.store([1.0, 0.0], "m", False, "v1", old)
+    assert cache.lookup([1.0, 0.0], "m", False, "v1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_new_corpus_version_drops_older_entries():
+    cache = AnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "m", False, "v1", answer("a"))
+    cache.store([0.0, 1.0], "m", False, "v1", answer("b"), filters=("x",))
+    assert cache.stats()["entries"] == 2
+
+    assert cache.lookup([1.0, 0.0], "m", False, "v2") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted_across_scopes():
+    cache = AnswerCache(threshold=0.9, max_entries=2)
+    cache.store([1.0, 0.0], "m", False, "v1", answer("a"))
+    cache.store([0.0, 1.0], "m", False, "v1", answer("b"), filters=("x",))
+    assert cache.lookup([1.0, 0.0], "m", False, "v1") is not None
+    cache.store([0.7, 0.7], "m", False, "v1", answer("c"))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup([1.0, 0.0], "m", False, "v1").response == "a"
+    assert cache.lookup([0.0, 1.0], "m", False, "v1", filters=("x",)) is None
@@ -0,0 +1,99 @@
+import httpx
+import pytest
+
+from backend.services.document_service import DocumentService
+from backend.services.ollama_client import OllamaClient
+from backend.services.vector_store import RetrievalFilter, VectorStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def documents(fake_ollama, settings, monkeypatch):
+    monkeypatch.setattr(settings, "vector_backend", "numpy")
+    monkeypatch.setattr(settings, "ollama_base_url", "http://ollama")
+    monkeypatch.setattr(settings, "chunk_size", 200)
+    monkeypatch.setattr(settings, "chunk_overlap", 40)
+    settings.documents_path.mkdir()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_ollama)) as http:
+        yield DocumentService(vector_store=VectorStore(ollama=OllamaClient(http_client=http)))
+
+
+def write(directory, name: str, paragraphs: int) -> None:
+    text = "\n\n".join(f"Paso {i}: revisar el filtro de aceite de la bomba." for i in range(paragraphs))
+    (directory / name).write_text(text, encoding="utf-8")
+
+
+async def test_small_upload_reports_its_total(documents, settings):
+    write(settings.documents_path, "manual.txt", 40)
+    progress = []
+    chunks = await documents.ingest_file(
+        settings.documents_path / "manual.txt", progress=lambda *p: progress.append(p), tags=["Bombas"],
+    )
+
+    assert chunks > 1
+    assert progress[0] == ("parsing", 0, 0)
+    assert progress[1] == ("embedding", 0, chunks)
+    assert progress[-1] == ("embedding", chunks, chunks)
+    assert documents.catalog.get("manual.txt")["tags"] == ["bombas"]
+
+
+async def test_large_upload_is_streamed(documents, settings, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_stream_min_bytes", 1)
+    monkeypatch.setattr(settings, "ingest_embed_batch_size", 2)
+    write(settings.documents_path, "manual.txt", 40)
+    progress = []
+    chunks = await documents.ingest_file(
+        settings.documents_path / "manual.txt", progress=lambda *p: progress.append(p),
+    )
+
+    embedding = [p for p in progress if p[0] == "embedding"]
+    # One report per batch of two chunks, with no total until the end
+    assert len(embedding) == (chunks + 1) // 2
+    assert embedding[-1] == ("embedding", chunks, 0)
+
+
+async def test_directory_sync(documents, settings):
+    directory = settings.documents_path
+    write(directory, "a.txt", 20)
+    write(directory, "b.txt", 5)
+    stats = await documents.ingest_directory(directory, workers=1)
+    assert (stats["added"], stats["skipped"]) == (2, 0)
+
+    stats = await documents.ingest_directory(directory, workers=1)
+    assert (stats["added"], stats["updated"], stats["skipped"]) == (0, 0, 2)
+
+    # New tags re-ingest files whose content did not change
+    stats = await documents.ingest_directory(directory, workers=1, tags=["bombas"])
+    assert (stats["updated"], stats["skipped"]) == (2, 0)
+    store = documents._vector_store
+    tagged = await store.search("filtro", top_k=50, mode="lexical", filters=RetrievalFilter.create(tags=["bombas"]))
+    assert len(tagged) == store.chunks_count
+
+    (directory / "b.txt").unlink()
+    write(directory, "a.txt", 3)
+    stats = await documents.ingest_directory(directory, workers=1)
+    assert (stats["updated"], stats["removed"]) == (1, 1)
+    assert store.get_document_names() == ["a.txt"]
+    assert set(store.get_ids("a.txt")) == set(documents.catalog.get("a.txt")["chunk_ids"])
+
+
+async def test_corpus_version_changes_once_per_document(documents, settings, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_stream_min_bytes", 1)
+    monkeypatch.setattr(settings, "ingest_embed_batch_size", 2)
+    write(settings.documents_path, "manual.txt", 40)
+    store = documents._vector_store
+    bumps = []
+    bump = store.bump_corpus_version
+    monkeypatch.setattr(store, "bump_corpus_version", lambda: bumps.append(1) or bump())
+
+    before = store.corpus_version
+    chunks = await documents.ingest_file(settings.documents_path / "manual.txt")
+    assert chunks > 2
+    assert len(bumps) == 1
+    after = store.corpus_version
+    assert after != before
+
+    # Read from memory until another process rewrites the file
+    monkeypatch.setattr(type(store._version_path), "read_text", lambda *a, **k: pytest.fail("re-read"))
+    assert store.corpus_version == after
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.services.embed_batcher import EmbeddingBatcher
+
+pytestmark = pytest.mark.anyio
+
+
+class Sender:
+    """Records each batch and embeds a text as [len(text)]."""
+
+    def __init__(self, reject: str | None = None, error: Exception | None = None):
+        self.batches: list[list[str]] = []
+        self.reject = reject
+        self.error = error
+
+    async def __call__(self, texts: list[str], model: str) -> list[list[float]]:
+        self.batches.append(texts)
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        if self.reject in texts:
+            raise httpx.HTTPStatusError(
+                "400", request=httpx.Request("POST", "http://ollama"), response=httpx.Response(400),
+            )
+        return [[float(len(t))] for t in texts]
+
+
+async def test_concurrent_requests_share_one_batch():
+    send = Sender()
+    batcher = EmbeddingBatcher(send, window=0.01, max_batch=32, timeout=5)
+    results = await asyncio.gather(*(batcher.embed(t, "m") for t in ("a", "bb", "ccc", "bb")))
+    assert results == [[1.0], [2.0], [3.0], [2.0]]
+    # Identical texts are sent once
+    assert send.batches == [["a", "bb", "ccc"]]
+
+
+async def test_models_are_batched_apart():
+    send = Sender()
+    batcher = EmbeddingBatcher(send, window=0.01, max_batch=32, timeout=5)
+    await asyncio.gather(batcher.embed("a", "m1"), batcher.embed("b", "m2"))
+    assert sorted(send.batches) == [["a"], ["b"]]
+
+
+async def test_full_batch_is_sent_without_waiting():
+    send = Sender()
+    batcher = EmbeddingBatcher(send, window=10, max_batch=2, timeout=5)
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.embed("a", "m"), batcher.embed("bb", "m")), timeout=1,
+    )
+    assert results == [[1.0], [2.0]]
+    assert send.batches == [["a", "bb"]]
+
+
+async def test_rejected_batch_is_retried_one_by_one():
+    send = Sender(reject="malo")
+    batcher = EmbeddingBatcher(send, window=0.01, max_batch=32, timeout=5)
+    results = await asyncio.gather(
+        batcher.embed("bueno", "m"), batcher.embed("malo", "m"), return_exceptions=True,
+    )
+    assert results[0] == [5.0]
+    assert isinstance(results[1], httpx.HTTPStatusError)
+    assert send.batches[0] == ["bueno", "malo"]
+    assert sorted(send.batches[1:]) == [["bueno"], ["malo"]]
+
+
+async def test_connection_error_fails_every_caller():
+    send = Sender(error=httpx.ConnectError("connection refused"))
+    batcher = EmbeddingBatcher(send, window=0.01, max_batch=32, timeout=5)
+    results = await asyncio.gather(batcher.embed("a", "m"), batcher.embed("b", "m"), return_exceptions=True)
+    assert all(isinstance(r, httpx.ConnectError) for r in results)
+    assert send.batches == [["a", "b"]]
+
+
+async def test_timeout():
+    async def stuck(texts, model):
+        await asyncio.sleep(10)
+
+    batcher = EmbeddingBatcher(stuck, window=0, max_batch=32, timeout=0.05)
+    with pytest.raises(httpx.TimeoutException):
+        await batcher.embed("a", "m")
+    await batcher.aclose()
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services import ingest_jobs
+from backend.services.ingest_jobs import IngestJobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeDocuments:
+    """Ingests a file once released, recording which files are being ingested."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.active: list[str] = []
+        self.overlapped = False
+
+    async def ingest_file(self, path, progress=None, tags=None):
+        if path.name in self.active:
+            self.overlapped = True
+        self.active.append(path.name)
+        progress("embedding", 1, 3)
+        await self.release.wait()
+        self.active.remove(path.name)
+        return 3
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def queues(tmp_path, monkeypatch):
+    """Two job queues sharing one database, as two server workers would."""
+    monkeypatch.setattr(ingest_jobs, "_CLAIM_POLL_SECONDS", 0.01)
+    documents = FakeDocuments()
+    pair = [IngestJobQueue(documents, workers=1, path=tmp_path / "jobs.sqlite3") for _ in range(2)]
+    for queue in pair:
+        await queue.start()
+    yield documents, pair
+    documents.release.set()
+    for queue in pair:
+        await queue.stop()
+        queue.close()
+
+
+async def test_job_is_visible_from_another_worker(queues, tmp_path):
+    documents, (first, second) = queues
+    job = first.submit(tmp_path / "manual.pdf", tags=["rrhh"])
+
+    await wait_for(lambda: second.get(job.id).stage == "embedding")
+    seen = second.get(job.id)
+    assert (seen.filename, seen.tags, seen.chunks_done, seen.chunks_total) == ("manual.pdf", ["rrhh"], 1, 3)
+
+    documents.release.set()
+    await wait_for(lambda: second.get(job.id).finished)
+    assert second.get(job.id).stage == "done"
+    assert [j.id for j in second.recent()] == [job.id]
+
+
+async def test_same_file_is_not_ingested_by_two_workers_at_once(queues, tmp_path):
+    documents, (first, second) = queues
+    a = first.submit(tmp_path / "manual.pdf")
+    await wait_for(lambda: first.get(a.id).stage == "embedding")
+    b = second.submit(tmp_path / "manual.pdf")
+    await asyncio.sleep(0.1)
+    assert second.get(b.id).stage == "queued"
+
+    documents.release.set()
+    await wait_for(lambda: first.get(b.id).finished)
+    assert first.get(a.id).stage == first.get(b.id).stage == "done"
+    assert not documents.overlapped
+
+
+async def test_jobs_of_a_dead_worker_expire(tmp_path, monkeypatch):
+    queue = IngestJobQueue(FakeDocuments(), path=tmp_path / "jobs.sqlite3")
+    # Submitted but never run, and no heartbeat for longer than the limit
+    job = queue.submit(tmp_path / "manual.pdf")
+    monkeypatch.setattr(ingest_jobs.time, "time", lambda: 10.0**10)
+
+    expired = queue.get(job.id)
+    assert expired.stage == "error"
+    assert expired.error == "El proceso que lo ingestaba se detuvo antes de terminar"
+    queue.close()
@@ -0,0 +1,26 @@
+from backend.services import leases
+from backend.services.leases import Lease
+
+
+def test_one_process_holds_the_lease_until_it_expires(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(leases.time, "time", lambda: now[0])
+    first, second = (Lease("residency", ttl=30, path=tmp_path / "leases.sqlite3") for _ in range(2))
+
+    assert first.acquire()
+    assert not second.acquire()
+    now[0] += 20
+    # Renewing keeps it
+    assert first.acquire()
+    now[0] += 20
+    assert not second.acquire()
+
+    # The holder stopped renewing it
+    now[0] += 31
+    assert second.acquire()
+    assert not first.acquire()
+
+    second.release()
+    assert first.acquire()
+    first.close()
+    second.close()
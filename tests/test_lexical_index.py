@@ -0,0 +1,35 @@
+import pytest
+
+from backend.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["c"] == pytest.approx(1 / 63)
+    assert fused["d"] == pytest.approx(1 / 62)
+
+
+def test_rrf_ranks_items_found_by_both_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "a"], ["b"]], k=1)
+    assert fused[0][0] == "b"
+    assert dict(fused)["a"] == pytest.approx(dict(fused)["c"])
+
+
+def test_rrf_of_nothing():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_index_search_and_scope(tmp_path):
+    index = LexicalIndex(tmp_path / "lexical.sqlite3")
+    index.add(["1", "2", "3"], ["cambiar el filtro de aceite", "código de error E42", "filtro de aire"])
+    assert [chunk_id for chunk_id, _ in index.search("error E42", 5)] == ["2"]
+    assert {chunk_id for chunk_id, _ in index.search("filtro", 5)} == {"1", "3"}
+    assert [chunk_id for chunk_id, _ in index.search("filtro", 5, ids=frozenset({"3"}))] == ["3"]
+
+    index.delete(["3"])
+    assert [chunk_id for chunk_id, _ in index.search("filtro", 5)] == ["1"]
+    assert index.count() == 2
+    index.close()
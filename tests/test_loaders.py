@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+from backend.services.loaders import PAGE_SEPARATOR, ChunkStream, iter_chunks, iter_pages, make_splitter
+
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_overlap_carries_across_page_breaks():
+    pages = [("uno dos\n\ntres cuatro", 1), ("cinco seis\n\nsiete ocho", 2), ("nueve diez", 3)]
+    chunks = list(iter_chunks(iter(pages), chunk_size=25, chunk_overlap=12))
+
+    # The same chunks as splitting the whole document at once
+    whole = make_splitter(25, 12).split_text(PAGE_SEPARATOR.join(text for text, _ in pages))
+    assert [text for text, _ in chunks] == whole
+    # The last chunk repeats the end of page 2 and runs on into page 3
+    assert chunks[-1] == ("siete ocho\n\nnueve diez", 2)
+
+
+def test_chunk_page_is_where_it_starts():
+    pages = [(words("a", 30), 1), (words("b", 30), 2), (words("c", 5), 3)]
+    chunks = list(iter_chunks(iter(pages), chunk_size=60, chunk_overlap=20))
+
+    assert all(len(text) <= 60 for text, _ in chunks)
+    spanning = [(text, page) for text, page in chunks if "b29" in text and "c0" in text]
+    assert spanning == [("b22 b23 b24 b25 b26 b27 b28 b29\n\nc0 c1 c2 c3 c4", 2)]
+    # Consecutive chunks of a page overlap
+    assert chunks[1][0].startswith("a12")
+    # Nothing is lost
+    seen = {w for text, _ in chunks for w in text.split()}
+    assert seen == {w for text, _ in pages for w in text.split()}
+
+
+def test_blank_pages_are_skipped():
+    pages = [("hola mundo", 0), ("   ", 1), ("adiós", 2)]
+    timings = {}
+    assert list(iter_chunks(iter(pages), 100, 10, timings)) == [("hola mundo\n\nadiós", 0)]
+    assert set(timings) == {"parse", "split"}
+
+
+def test_text_file_is_read_in_blocks(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr("backend.services.loaders.TEXT_BLOCK_CHARS", 50)
+    path = tmp_path / "manual.txt"
+    path.write_text("\n\n".join(words(f"p{i}w", 10) for i in range(6)), encoding="utf-8")
+
+    blocks = list(iter_pages(path))
+    assert len(blocks) > 1
+    assert all(page == 0 for _, page in blocks)
+    assert "\n\n".join(text for text, _ in blocks) == path.read_text(encoding="utf-8")
+
+
+async def read_all(stream: ChunkStream) -> list[tuple[str, int]]:
+    chunks = []
+    while batch := await stream.read(3):
+        chunks += batch
+    return chunks
+
+
+@pytest.mark.anyio
+async def test_chunk_stream_reads_in_batches(tmp_path: Path):
+    path = tmp_path / "manual.txt"
+    path.write_text(words("w", 200), encoding="utf-8")
+    stream = ChunkStream(path, 80, 20)
+    try:
+        chunks = await read_all(stream)
+    finally:
+        stream.close()
+    assert [text for text, _ in chunks] == make_splitter(80, 20).split_text(path.read_text(encoding="utf-8"))
+    assert stream.timings["split"] > 0
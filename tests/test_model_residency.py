@@ -0,0 +1,31 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services.model_residency import ModelResidency
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_loop_survives_a_failed_refresh(settings, monkeypatch):
+    monkeypatch.setattr(settings, "model_residency_interval", 0.01)
+    residency = ModelResidency(SimpleNamespace(), prompt_builder=None)
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("models")
+
+    monkeypatch.setattr(residency, "refresh", refresh)
+    await residency.start()
+    try:
+        for _ in range(100):
+            if len(calls) >= 3:
+                break
+            await asyncio.sleep(0.01)
+        assert len(calls) >= 3
+        assert not residency._task.done()
+    finally:
+        await residency.stop()
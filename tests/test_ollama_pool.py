@@ -0,0 +1,142 @@
+import json
+
+import httpx
+import pytest
+
+from backend.services.ollama_client import OllamaClient
+from backend.services.ollama_pool import HostPool, model_name
+
+DOWN = "http://down:11434"
+UP = "http://up:11434"
+
+
+def test_model_name():
+    assert model_name("bge-m3") == "bge-m3:latest"
+    assert model_name("qwen2.5:7b") == "qwen2.5:7b"
+
+
+def test_fewest_outstanding_first():
+    pool = HostPool("generate", ["http://a", "http://b", "http://a"])
+    assert [h.url for h in pool.hosts] == ["http://a", "http://b"]
+    a, b = pool.hosts
+    with pool.lease(a):
+        assert pool.candidates()[0] is b
+    assert a.outstanding == 0
+
+
+def test_idle_hosts_take_turns():
+    pool = HostPool("generate", ["http://a", "http://b"])
+    assert {pool.candidates()[0].url for _ in range(4)} == {"http://a", "http://b"}
+
+
+def test_loaded_model_is_preferred():
+    pool = HostPool("generate", ["http://a", "http://b"], affinity=2)
+    a, b = pool.hosts
+    pool.succeeded(b, "qwen")
+    with pool.lease(b):
+        assert pool.candidates("qwen")[0] is b
+        assert pool.candidates()[0] is a
+        with pool.lease(b), pool.lease(b):
+            # More requests ahead than a load is worth
+            assert pool.candidates("qwen")[0] is a
+
+
+def test_eject_and_readmit():
+    pool = HostPool("embed", ["http://a", "http://b"], max_failures=2)
+    a, b = pool.hosts
+    pool.failed(a)
+    assert a.healthy
+    pool.failed(a)
+    assert not a.healthy
+    assert [pool.candidates()[0] for _ in range(3)] == [b, b, b]
+    # Still tried last
+    assert pool.candidates()[-1] is a
+
+    pool.checked(a, ["bge-m3"])
+    assert a.healthy and a.failures == 0
+    assert a.models == {"bge-m3:latest"}
+
+    pool.checked(b, None)
+    assert not b.healthy
+
+
+def test_all_ejected_tries_them_all():
+    pool = HostPool("embed", ["http://a", "http://b"], max_failures=1)
+    for host in pool.hosts:
+        pool.failed(host)
+    assert set(pool.candidates()) == set(pool.hosts)
+
+
+class FlakyTransport(httpx.AsyncBaseTransport):
+    """The fake Ollama app on every host; connections to hosts in ``down`` fail."""
+
+    def __init__(self, app):
+        self._app = httpx.ASGITransport(app=app)
+        self.down = {DOWN}
+        self.hosts: list[str] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = f"{request.url.scheme}://{request.url.netloc.decode()}"
+        self.hosts.append(url)
+        if url in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        return await self._app.handle_async_request(request)
+
+
+@pytest.fixture
+def transport(fake_ollama, monkeypatch):
+    monkeypatch.setenv("ROSS_OLLAMA_EMBED_URLS", json.dumps([DOWN, UP]))
+    monkeypatch.setenv("ROSS_OLLAMA_GENERATE_URLS", json.dumps([UP]))
+    monkeypatch.setenv("ROSS_EMBED_BATCHING_ENABLED", "false")
+    monkeypatch.setenv("ROSS_OLLAMA_EJECT_AFTER_FAILURES", "1")
+    from config.settings import get_settings
+
+    get_settings.cache_clear()
+    return FlakyTransport(fake_ollama)
+
+
+@pytest.mark.anyio
+async def test_failover_ejects_and_health_check_readmits(transport):
+    async with httpx.AsyncClient(transport=transport) as http:
+        client = OllamaClient(http_client=http)
+        pool = client.embed_pool
+        down, up = pool.hosts
+
+        for _ in range(3):
+            embedding = await client.embed_batch(["filtro de aceite"])
+            assert len(embedding[0]) == 16
+        # The first request moved on after the connection error; then the
+        # host was out of rotation
+        assert transport.hosts == [DOWN, UP, UP, UP]
+        assert not down.healthy and up.healthy
+
+        transport.down.clear()
+        loaded = await client.loaded_models()
+        assert set(loaded) == {DOWN, UP}
+        assert down.healthy
+        assert "bge-m3:latest" in down.models
+
+
+@pytest.mark.anyio
+async def test_every_host_down_raises(transport):
+    transport.down.add(UP)
+    async with httpx.AsyncClient(transport=transport) as http:
+        client = OllamaClient(http_client=http)
+        with pytest.raises(httpx.ConnectError):
+            await client.embed_batch(["hola"])
+
+
+@pytest.mark.anyio
+async def test_no_hosts_raises_a_connection_error(transport):
+    async with httpx.AsyncClient(transport=transport) as http:
+        client = OllamaClient(http_client=http)
+        client.embed_pool.hosts = []
+        client.generate_pool.hosts = []
+        with pytest.raises(httpx.ConnectError, match="No hay hosts de Ollama disponibles"):
+            await client.embed_batch(["hola"])
+        with pytest.raises(httpx.ConnectError, match="No hay hosts de Ollama disponibles"):
+            async for _ in client.generate_stream("hola"):
+                pass
+        with pytest.raises(httpx.ConnectError, match="No hay hosts de Ollama disponibles"):
+            await client.warmup_embedding(all_hosts=True)
+        assert transport.hosts == []
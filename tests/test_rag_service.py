@@ -0,0 +1,100 @@
+import httpx
+import pytest
+
+from backend.services.answer_cache import AnswerCache
+from backend.services.ollama_client import OllamaClient
+from backend.services.rag_service import RAGService
+from backend.services.scheduler import GenerationScheduler, QueueFullError
+from backend.services.vector_store import VectorStore
+
+pytestmark = pytest.mark.anyio
+
+QUESTION = "¿Cada cuánto se cambia el filtro de aceite?"
+
+
+@pytest.fixture
+async def rag(fake_ollama, settings, monkeypatch):
+    monkeypatch.setattr(settings, "vector_backend", "numpy")
+    monkeypatch.setattr(settings, "ollama_base_url", "http://ollama")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_ollama)) as http:
+        ollama = OllamaClient(http_client=http)
+        service = RAGService(
+            ollama=ollama,
+            vector_store=VectorStore(ollama=ollama),
+            answer_cache=AnswerCache(),
+            scheduler=GenerationScheduler(max_in_flight=1, max_queue=4, per_model={}),
+        )
+        yield service
+        await service.aclose()
+
+
+async def chat_requests(rag: RAGService) -> int:
+    resp = await rag._ollama.client.get("http://ollama/fake/stats")
+    return resp.json()["requests"]["chat"]
+
+
+async def ask(rag: RAGService, question: str, **kwargs) -> list[dict]:
+    stream = await rag.query_stream(question, **kwargs)
+    try:
+        return [chunk async for chunk in stream]
+    finally:
+        await stream.aclose()
+
+
+def stats(chunks: list[dict]) -> dict:
+    return next(c["stats"] for c in chunks if c["type"] == "stats")
+
+
+async def test_repeated_question_in_a_session_is_served_from_cache(rag, monkeypatch):
+    async def unchanged(session, question, model):
+        return question
+
+    # The model finds the question already standalone
+    monkeypatch.setattr(rag, "_condense", unchanged)
+    first = await ask(rag, QUESTION, session_id="s1")
+    assert "cached" not in stats(first)
+    generated = await chat_requests(rag)
+
+    second = await ask(rag, QUESTION, session_id="s1")
+    assert stats(second)["cached"] is True
+    assert await chat_requests(rag) == generated
+    assert len(rag.sessions.get("s1").turns) == 2
+
+    result = await rag.query(QUESTION, session_id="s1")
+    assert result["response"]
+    assert await chat_requests(rag) == generated
+
+
+async def test_follow_up_is_answered_with_the_conversation(rag, monkeypatch):
+    condensed = []
+
+    async def rewrite(session, question, model):
+        condensed.append(question)
+        return "¿Cada cuánto se cambia el filtro de aire?"
+
+    monkeypatch.setattr(rag, "_condense", rewrite)
+    await ask(rag, QUESTION, session_id="s1")
+    follow_up = await ask(rag, "¿Y el de aire?", session_id="s1")
+
+    assert condensed == ["¿Y el de aire?"]
+    assert "cached" not in stats(follow_up)
+    # Follow-ups depend on the conversation: not stored for other users
+    assert rag.answer_cache.stats()["entries"] == 1
+
+
+async def test_cache_hit_is_served_while_the_queue_is_full(rag):
+    await ask(rag, QUESTION)
+    model = rag._ollama.llm_model
+    # One generation running and every queue place taken
+    tickets = [rag.scheduler.enqueue(model) for _ in range(1 + rag.scheduler.max_queue)]
+    try:
+        with pytest.raises(QueueFullError):
+            await ask(rag, "¿Qué presión llevan los neumáticos?")
+
+        replayed = await ask(rag, QUESTION)
+        assert stats(replayed)["cached"] is True
+        assert (await rag.query(QUESTION))["response"]
+        assert rag.scheduler.stats()[model]["queued"] == rag.scheduler.max_queue
+    finally:
+        for ticket in tickets:
+            ticket.release()
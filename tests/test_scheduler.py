@@ -0,0 +1,85 @@
+import pytest
+
+from backend.services.scheduler import GenerationScheduler, Priority, QueueFullError
+
+pytestmark = pytest.mark.anyio
+
+
+def scheduler(max_in_flight=1, max_queue=4):
+    return GenerationScheduler(max_in_flight=max_in_flight, max_queue=max_queue, per_model={})
+
+
+async def test_free_slot_is_granted_at_once():
+    s = scheduler(max_in_flight=2)
+    first, second = s.enqueue("m"), s.enqueue("m")
+    assert first.granted and second.granted
+    assert s.stats()["m"] == {"in_flight": 2, "queued": 0, "limit": 2}
+
+
+async def test_waiting_tickets_run_by_priority_then_arrival():
+    s = scheduler()
+    running = s.enqueue("m")
+    batch = s.enqueue("m", Priority.BATCH)
+    sync = s.enqueue("m", Priority.SYNC)
+    interactive_1 = s.enqueue("m", Priority.INTERACTIVE)
+    interactive_2 = s.enqueue("m", Priority.INTERACTIVE)
+    assert [t.position for t in (interactive_1, interactive_2, sync, batch)] == [1, 2, 3, 4]
+
+    granted = []
+    current = running
+    for _ in range(4):
+        current.release()
+        current = next(t for t in (batch, sync, interactive_1, interactive_2) if t.granted and not t.released)
+        granted.append(current)
+    assert granted == [interactive_1, interactive_2, sync, batch]
+
+
+async def test_full_queue_is_rejected():
+    s = scheduler(max_queue=1)
+    s.enqueue("m")
+    s.enqueue("m")
+    with pytest.raises(QueueFullError):
+        s.enqueue("m")
+    # Other models have their own queue
+    assert s.enqueue("other").granted
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    s = scheduler()
+    running = s.enqueue("m")
+    gave_up = s.enqueue("m")
+    waiting = s.enqueue("m")
+    assert waiting.position == 2
+
+    gave_up.release()
+    assert waiting.position == 1
+    assert s.stats()["m"]["queued"] == 1
+
+    running.release()
+    assert waiting.granted and not gave_up.granted
+    assert s.stats()["m"] == {"in_flight": 1, "queued": 0, "limit": 1}
+
+
+async def test_release_is_idempotent():
+    s = scheduler(max_in_flight=2)
+    ticket = s.enqueue("m")
+    ticket.release()
+    ticket.release()
+    assert s.stats()["m"]["in_flight"] == 0
+
+
+async def test_wait_reports_positions_until_granted():
+    s = scheduler()
+    running = s.enqueue("m")
+    ahead = s.enqueue("m")
+    ticket = s.enqueue("m")
+    positions = ticket.wait()
+    assert await anext(positions) == 2
+
+    running.release()
+    assert await anext(positions) == 1
+
+    ahead.release()
+    with pytest.raises(StopAsyncIteration):
+        await anext(positions)
+    assert ticket.granted
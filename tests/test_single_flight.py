@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from backend.services.single_flight import SingleFlight, normalize_question
+
+pytestmark = pytest.mark.anyio
+
+
+class Source:
+    """A chat stream that yields ``tokens`` once each is released."""
+
+    def __init__(self, tokens: list[str]):
+        self.tokens = tokens
+        self.gate = asyncio.Semaphore(0)
+        self.closed = False
+
+    async def __call__(self):
+        try:
+            yield {"type": "queue", "position": 1}
+            for token in self.tokens:
+                await self.gate.acquire()
+                yield {"type": "response", "token": token}
+            yield {"type": "stats", "stats": {"tokens": len(self.tokens)}}
+        finally:
+            self.closed = True
+
+    def release(self, n: int = 1) -> None:
+        for _ in range(n):
+            self.gate.release()
+
+
+async def collect(subscription) -> list[dict]:
+    return [chunk async for chunk in subscription]
+
+
+def test_normalize_question():
+    assert normalize_question("  ¿Cómo  CAMBIO el filtro? ") == "como cambio el filtro"
+
+
+async def test_joiner_gets_backlog_and_live_tokens():
+    flights = SingleFlight()
+    source = Source(["a", "b", "c"])
+    first = flights.start("q", source())
+    reader = asyncio.create_task(collect(first))
+    source.release()
+    await asyncio.sleep(0.01)
+
+    joined = flights.join("q")
+    assert joined is not None
+    late = asyncio.create_task(collect(joined))
+    source.release(2)
+    chunks, joined_chunks = await asyncio.gather(reader, late)
+
+    tokens = [c["token"] for c in joined_chunks if c["type"] == "response"]
+    assert tokens == ["a", "b", "c"]
+    # Queue positions from before joining are not replayed; stats are marked
+    assert [c["type"] for c in joined_chunks] == ["response"] * 3 + ["stats"]
+    assert joined_chunks[-1]["stats"]["coalesced"] is True
+    assert "coalesced" not in chunks[-1]["stats"]
+    assert len(flights) == 0
+
+
+async def test_fan_out_to_many_subscribers():
+    flights = SingleFlight()
+    source = Source(["x", "y"])
+    completed = []
+    subscriptions = [flights.start("q", source(), on_complete=completed.append)]
+    subscriptions += [flights.join("q", on_complete=completed.append) for _ in range(4)]
+    readers = [asyncio.create_task(collect(s)) for s in subscriptions]
+    source.release(2)
+    results = await asyncio.gather(*readers)
+
+    for chunks in results:
+        assert [c["token"] for c in chunks if c["type"] == "response"] == ["x", "y"]
+    assert len(completed) == 5
+
+
+async def test_finished_flight_is_not_joinable():
+    flights = SingleFlight()
+    source = Source([])
+    await collect(flights.start("q", source()))
+    assert flights.join("q") is None
+
+
+async def test_leaving_subscriber_keeps_the_flight_for_the_others():
+    flights = SingleFlight()
+    source = Source(["a", "b"])
+    first = flights.start("q", source())
+    second = flights.join("q")
+    await anext(first)
+    await first.aclose()
+
+    reader = asyncio.create_task(collect(second))
+    source.release(2)
+    chunks = await reader
+    assert [c["token"] for c in chunks if c["type"] == "response"] == ["a", "b"]
+    assert source.closed
+
+
+async def test_last_subscriber_leaving_cancels_the_source():
+    flights = SingleFlight()
+    source = Source(["a", "b"])
+    subscription = flights.start("q", source())
+    await anext(subscription)
+    await subscription.aclose()
+    await asyncio.sleep(0.01)
+
+    assert source.closed
+    assert len(flights) == 0
+    assert flights.join("q") is None
+
+
+async def test_abandoned_before_start_calls_on_abandon():
+    flights = SingleFlight()
+    abandoned = []
+    subscription = flights.start("q", Source(["a"])(), on_abandon=lambda: abandoned.append(True))
+    # Left before the pump task ever ran: the source's finally cannot run
+    await subscription.aclose()
+    await asyncio.sleep(0.01)
+    assert abandoned == [True]
+
+
+async def test_source_error_reaches_every_subscriber():
+    async def failing():
+        yield {"type": "response", "token": "a"}
+        raise RuntimeError("sin conexión")
+
+    flights = SingleFlight()
+    subscriptions = [flights.start("q", failing()), flights.join("q")]
+    for subscription in subscriptions:
+        with pytest.raises(RuntimeError, match="sin conexión"):
+            await collect(subscription)
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.api.sse import sse_stream
+
+pytestmark = pytest.mark.anyio
+
+
+async def chat(*chunks: dict, delay: float = 0.0):
+    for chunk in chunks:
+        if delay:
+            await asyncio.sleep(delay)
+        yield chunk
+
+
+def token(text: str, kind: str = "response") -> dict:
+    return {"type": kind, "token": text}
+
+
+async def events(stream) -> list[list[dict]]:
+    """Each write to the client as the list of SSE events it carried."""
+    writes = []
+    async for data in stream:
+        frames = [f for f in data.split(b"\n\n") if f]
+        writes.append([json.loads(f.removeprefix(b"data: ")) for f in frames])
+    return writes
+
+
+async def test_first_token_alone_then_coalesced():
+    writes = await events(sse_stream(
+        chat(token("Ho"), token("la"), token(" qué"), token(" tal")), window=10, max_chars=1000,
+    ))
+    assert writes == [
+        [{"type": "response", "token": "Ho"}],
+        [{"type": "response", "token": "la qué tal", "count": 3}, {"done": True}],
+    ]
+
+
+async def test_window_closes_the_frame():
+    writes = await events(sse_stream(
+        chat(token("a"), token("b"), token("c"), delay=0.05), window=0.01, max_chars=1000,
+    ))
+    tokens = [e["token"] for write in writes for e in write if "token" in e]
+    assert tokens == ["a", "b", "c"]
+    assert writes[-1][-1] == {"done": True}
+
+
+async def test_max_chars_flushes_early():
+    writes = await events(sse_stream(
+        chat(token("a"), token("bb"), token("cc"), token("d")), window=10, max_chars=4,
+    ))
+    assert [e for write in writes for e in write] == [
+        {"type": "response", "token": "a"},
+        {"type": "response", "token": "bbcc", "count": 2},
+        {"type": "response", "token": "d"},
+        {"done": True},
+    ]
+
+
+async def test_other_chunks_and_type_changes_flush_pending_tokens():
+    writes = await events(sse_stream(
+        chat(
+            token("pienso", "thinking"), token(" más", "thinking"), token(" aún", "thinking"),
+            token("Respuesta"), {"type": "sources", "sources": ["a.pdf"]},
+        ),
+        window=10, max_chars=1000,
+    ))
+    assert [e for write in writes for e in write] == [
+        {"type": "thinking", "token": "pienso"},
+        {"type": "thinking", "token": " más aún", "count": 2},
+        {"type": "response", "token": "Respuesta"},
+        {"type": "sources", "sources": ["a.pdf"]},
+        {"done": True},
+    ]
+
+
+async def test_zero_window_sends_every_token():
+    writes = await events(sse_stream(chat(token("a"), token("b"), token("c")), window=0, max_chars=1000))
+    assert [e for write in writes for e in write] == [
+        token("a"), token("b"), token("c"), {"done": True},
+    ]
+
+
+async def test_error_ends_the_stream_after_pending_tokens():
+    async def failing():
+        yield token("a")
+        yield token("b")
+        raise RuntimeError("Ollama no responde")
+
+    writes = await events(sse_stream(failing(), window=10, max_chars=1000))
+    assert [e for write in writes for e in write] == [
+        token("a"), token("b"), {"error": "Ollama no responde"},
+    ]
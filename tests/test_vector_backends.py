@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+
+from backend.services import vector_backends
+from backend.services.vector_backends import NumpyBackend
+
+
+def unit(*values: float) -> list[float]:
+    vector = np.asarray(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def chunk(source: str, index: int, fmt: str = ".pdf", **extra) -> dict:
+    return {"source": source, "format": fmt, "page": 1, "chunk_index": index, **extra}
+
+
+@pytest.fixture(params=["float16", "int8"])
+def store(request, tmp_path):
+    backend = NumpyBackend(tmp_path / "numpy", dtype=request.param, partition_cache_bytes=1024 * 1024)
+    backend.upsert(
+        ["a0", "a1", "b0", "c0"],
+        ["bomba uno", "bomba dos", "compresor", "válvula"],
+        [unit(1, 0, 0), unit(0.9, 0.1, 0), unit(0, 1, 0), unit(0, 0, 1)],
+        [chunk("a.pdf", 0, **{"tag:bombas": True}), chunk("a.pdf", 1, **{"tag:bombas": True}),
+         chunk("b.docx", 0, ".docx"), chunk("c.txt", 0, ".txt")],
+    )
+    yield backend
+    backend.close()
+
+
+def ids(hits: list[dict]) -> list[str]:
+    return [h["id"] for h in hits]
+
+
+def test_query_ranks_by_cosine(store):
+    hits = store.query([unit(1, 0, 0)], n_results=2)[0]
+    assert ids(hits) == ["a0", "a1"]
+    assert hits[0]["distance"] == pytest.approx(0.0, abs=0.01)
+    assert hits[0]["text"] == "bomba uno"
+    assert hits[0]["metadata"]["source"] == "a.pdf"
+
+
+def test_upsert_replaces_by_id(store):
+    store.upsert(["a0"], ["bomba nueva"], [unit(0, 0, 1)], [chunk("a.pdf", 0)])
+    assert store.count() == 4
+    assert set(ids(store.query([unit(0, 0, 1)], n_results=2)[0])) == {"a0", "c0"}
+    assert store.get(["a0"])[0]["text"] == "bomba nueva"
+
+
+def test_delete(store):
+    store.delete(["a0", "missing"])
+    assert store.count() == 3
+    assert "a0" not in ids(store.query([unit(1, 0, 0)], n_results=4)[0])
+    assert store.get(["a0"]) == []
+    assert store.sources() == ["a.pdf", "b.docx", "c.txt"]
+    store.delete(["a1"])
+    assert store.sources() == ["b.docx", "c.txt"]
+
+
+def test_where_filters(store):
+    query = [unit(1, 1, 1)]
+    assert set(ids(store.query(query, 10, where={"source": "b.docx"})[0])) == {"b0"}
+    assert set(ids(store.query(query, 10, where={"format": {"$in": [".docx", ".txt"]}})[0])) == {"b0", "c0"}
+    assert set(ids(store.query(query, 10, where={"tag:bombas": True})[0])) == {"a0", "a1"}
+    assert set(ids(store.query(query, 10, where={"$and": [
+        {"source": {"$in": ["a.pdf", "b.docx"]}}, {"format": {"$in": [".pdf"]}},
+    ]})[0])) == {"a0", "a1"}
+    assert store.query(query, 10, where={"source": "none.pdf"})[0] == []
+    assert {h["id"] for h in store.get(where={"source": "a.pdf"}, include_documents=False)} == {"a0", "a1"}
+
+
+def test_partitions_follow_writes(store):
+    query = [unit(1, 0, 0)]
+    where = {"source": "a.pdf"}
+    assert ids(store.query(query, 10, where=where)[0]) == ["a0", "a1"]
+    store.upsert(["a2"], ["bomba tres"], [unit(1, 0.01, 0)], [chunk("a.pdf", 2)])
+    assert ids(store.query(query, 10, where=where)[0])[:2] == ["a0", "a2"]
+    store.delete(["a0"])
+    assert ids(store.query(query, 10, where=where)[0]) == ["a2", "a1"]
+
+
+def test_embeddings_round_trip(store):
+    [hit] = store.get(["b0"], include_embeddings=True)
+    assert hit["embedding"] == pytest.approx(unit(0, 1, 0), abs=0.01)
+
+
+def test_reload_from_disk(store, tmp_path):
+    store.delete(["c0"])
+    reopened = NumpyBackend(tmp_path / "numpy")
+    try:
+        assert reopened.count() == 3
+        assert ids(reopened.query([unit(1, 0, 0)], n_results=1)[0]) == ["a0"]
+    finally:
+        reopened.close()
+
+
+def test_reader_sees_another_writer(store, tmp_path):
+    other = NumpyBackend(tmp_path / "numpy")
+    try:
+        assert other.count() == 4
+        store.upsert(["d0"], ["motor"], [unit(1, 1, 0)], [chunk("d.pdf", 0)])
+        store.delete(["c0"])
+        assert other.count() == 4
+        assert ids(other.query([unit(1, 1, 0)], n_results=1)[0]) == ["d0"]
+        assert other.sources() == ["a.pdf", "b.docx", "d.pdf"]
+    finally:
+        other.close()
+
+
+def test_compaction_keeps_the_survivors(tmp_path):
+    backend = NumpyBackend(tmp_path / "numpy")
+    rng = np.random.default_rng(0)
+    count = 3000
+    vectors = rng.standard_normal((count, 8)).astype(np.float32)
+    names = [f"id{i}" for i in range(count)]
+    backend.upsert(names, names, vectors.tolist(), [chunk(f"{i % 3}.pdf", i) for i in range(count)])
+    backend.delete(names[:2000])
+    assert backend.count() == 1000
+    assert backend._rows == 1000
+
+    hit = backend.query([vectors[2500].tolist()], n_results=1)[0][0]
+    assert hit["id"] == "id2500" and hit["text"] == "id2500"
+    backend.close()
+
+
+def test_compaction_waits_while_another_process_maps_the_file(tmp_path, monkeypatch):
+    backend = NumpyBackend(tmp_path / "numpy", dtype="int8")
+    rng = np.random.default_rng(0)
+    count = 3000
+    vectors = rng.standard_normal((count, 8)).astype(np.float32)
+    names = [f"id{i}" for i in range(count)]
+    backend.upsert(names, names, vectors.tolist(), [chunk(f"{i % 3}.pdf", i) for i in range(count)])
+
+    def locked(src, dst):
+        # Our own map is closed first; Windows refuses while another process maps it
+        assert backend._vectors is None
+        raise PermissionError(dst)
+
+    monkeypatch.setattr(vector_backends.os, "replace", locked)
+    backend.delete(names[:2000])
+    assert backend.count() == 1000
+    assert backend._rows == count
+    assert backend.query([vectors[2500].tolist()], n_results=1)[0][0]["id"] == "id2500"
+    assert not list((tmp_path / "numpy").glob("*.tmp"))
+
+    monkeypatch.undo()
+    backend.delete(names[2000:2100])
+    assert backend._rows == 900
+    assert backend.query([vectors[2500].tolist()], n_results=1)[0][0]["id"] == "id2500"
+    backend.close()
+
+
+def test_dimension_mismatch_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.upsert(["x"], ["x"], [[1.0, 0.0]], [chunk("x.pdf", 0)])
+
+
+def test_reset(store):
+    store.reset()
+    assert store.count() == 0
+    assert store.query([unit(1, 0, 0)], n_results=3) == [[]]
+    store.upsert(["z"], ["z"], [[1.0, 0.0]], [chunk("z.pdf", 0)])
+    assert store.count() == 1